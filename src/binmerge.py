@@ -24,102 +24,606 @@
 #
 #  This code has been modified by LoGi26 (2021) for use with the psio-assist script
 
-from os import access, R_OK, name
-from os.path import exists, join, dirname, isfile, getsize
-from re import search, match
-from typing import List, Union
-from shutil import copyfileobj
+import os
+from os import name, fstat, fsync, lseek, remove, replace, stat, SEEK_SET
+from os.path import exists, join, isfile, abspath, normcase, basename, dirname, ismount, getsize, realpath
+from hashlib import md5, sha1
+from mmap import mmap
+from struct import pack, unpack_from
+from typing import List, NamedTuple, Optional, Union
+from queue import Queue
+from threading import Thread, Lock, Event
+from time import perf_counter
+from sys import platform
+from zlib import crc32
 import subprocess
 
+try:
+    from fcntl import ioctl
+except ImportError:
+    ioctl = None
+
+# fallocate(2) is only called on Linux, posix_fallocate writes zeros on file systems that can not reserve space natively
+try:
+    from ctypes import CDLL, c_int, c_longlong, get_errno
+    from ctypes.util import find_library
+    _LIBC = CDLL(find_library('c'), use_errno=True) if platform.startswith('linux') else None
+except (ImportError, OSError):
+    _LIBC = None
+
+from cue_parser import CueSheetData, parse_cue_sheet, sectors_to_cuestamp
+
 # Global variables
 ERROR_LOG_PATH = None
 
+# ioctl request for FS_IOC_FIEMAP (Linux), gets the extents (contiguous runs of blocks) a file is stored in
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_FLAG_SYNC = 0x00000001
+
+# A merged bin is reported as fragmented if it has more extents than one per 128 MB (the largest ext4 extent),
+# with a minimum of FRAGMENTED_EXTENT_COUNT
+FRAGMENTATION_EXTENT_SIZE = 128 * 1024 * 1024
+FRAGMENTED_EXTENT_COUNT = 8
+
+# fallocate mode that reserves the space without changing the file size, so nothing is written until the data is
+FALLOC_FL_KEEP_SIZE = 0x01
+
+# File systems where the space is not preallocated, on FAT/exFAT the reserved clusters are zero filled, which
+# doubles the data written to an SD card
+NO_PREALLOCATE_FILESYSTEMS = ('vfat', 'msdos', 'exfat', 'fuseblk')
+
+# The file system type of each mount point, read from /proc/self/mounts
+_FILESYSTEM_TYPES = {}
+
+# ioctl request for FICLONERANGE (Linux), clones a range of one file into another on btrfs/XFS without copying any data
+FICLONERANGE = 0x4020940D
+
+# Cloned ranges must start on a file system block boundary
+REFLINK_ALIGNMENT = 4096
+
+# Maximum bytes copied by the kernel in each copy_file_range or sendfile call
+ZERO_COPY_CHUNK_SIZE = 256 * 1024 * 1024
+
+# Size of each buffer, and the number of buffers, used by the reader and writer threads of the Python copy
+PIPELINE_BLOCK_SIZE = 8 * 1024 * 1024
+PIPELINE_QUEUE_DEPTH = 4
+
+# Page cache hints (posix_fadvise), each source track is read once and the merged file is not read again,
+# so the data is dropped from the page cache once it has been used instead of evicting everything else
+PAGE_CACHE_HINTS = True
+
+# Read the source tracks with O_DIRECT (Linux), bypassing the page cache completely
+DIRECT_IO = False
+DIRECT_IO_ALIGNMENT = 4096
+
+# The written data is flushed to the disk and dropped from the page cache after each interval
+DONTNEED_INTERVAL = 64 * 1024 * 1024
+
+# The merge strategies, in order of preference when they are equally fast
+MERGE_STRATEGIES = ('zero_copy', 'native', 'pipeline')
+
+# Size of the sample merged by the calibration, and the block sizes tried for the pipelined copy
+CALIBRATION_SAMPLE_SIZE = 4 * 1024 * 1024
+
+# Calibration writes test data to each file system, so it is only run when enabled with set_merge_calibration
+CALIBRATE_MERGES = False
+CALIBRATION_BLOCK_SIZES = (1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
 
+# The calibrated merge strategy of each file system, keyed by its mount point (with a suffix for hashed merges)
+_MERGE_STRATEGIES = {}
+_MERGE_STRATEGIES_LOCK = Lock()
+
+# The file systems being calibrated, keyed by mount point, other merges on the same file system wait on the event
+_CALIBRATIONS = {}
+
+# Suffix of the strategy key of hashed merges, which always copy the data through Python
+HASHED_STRATEGY_SUFFIX = '#hashed'
+
+
+# ************************************************************************************
+class TrackDigest(NamedTuple):
+    """The size and hashes of one track (input file) of a merged image, the hashes are lower case hex strings"""
+    file_name: str
+    size: int
+    crc32: str
+    md5: str
+    sha1: str
 # ************************************************************************************
-class Track:
-    """A track within a binary file"""
-    globalBlocksize = None
 
-    def __init__(self, num, track_type):
-        self.num = num
-        self.indexes = []
-        self.track_type = track_type
-        self.sectors = None
-        self.file_offset = None
 
-        # All possible blocksize types. You cannot mix types on a disc, so we will use the first one we see and lock it in.
-        if not Track.globalBlocksize:
-            if track_type in ['AUDIO', 'MODE1/2352', 'MODE2/2352', 'CDI/2352']:
-                Track.globalBlocksize = 2352
-            elif track_type == 'CDG':
-                Track.globalBlocksize = 2448
-            elif track_type == 'MODE1/2048':
-                Track.globalBlocksize = 2048
-            elif track_type in ['MODE2/2336', 'CDI/2336']:
-                Track.globalBlocksize = 2336
+# ************************************************************************************
+class MergeResult(NamedTuple):
+    """
+    The files written by a merge, along with the size and hashes of the merged bin file and each of its tracks
+    verified is True or False when the tracks were compared against the expected hashes, otherwise None
+    extents is the number of extents the merged bin file is stored in, or None if it could not be read
+    """
+    bin_path: str
+    cue_path: str
+    size: int
+    crc32: str
+    md5: str
+    sha1: str
+    tracks: tuple
+    verified: Optional[bool]
+    extents: Optional[int] = None
 # ************************************************************************************
 
 
 # ************************************************************************************
-class File:
-    """A binary file with its associated tracks and indexes"""
-    def __init__(self, filename):
-        self.filename = filename
-        self.tracks = []
-        self.size = getsize(filename)
+class MergeStrategy(NamedTuple):
+    """How to merge the files on a file system, one of MERGE_STRATEGIES and the block size of the pipelined copy"""
+    name: str
+    block_size: int
 # ************************************************************************************
 
 
 # ************************************************************************************
-class BinFilesMissingException(Exception):
-    """Exception raised when one or more binary files referenced in the cue sheet are missing"""
-    pass
+class MergeHasher:
+    """Hashes the merged image, and each track in it, as the data is written"""
+
+    # ************************************************************************************
+    def __init__(self):
+        self._image_hashes = (md5(), sha1())
+        self._image_crc = 0
+        self._image_size = 0
+        self._tracks = []
+        self._track = None
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def start_track(self, file_name: str):
+        """Start hashing a new track"""
+        self._track = [file_name, 0, 0, md5(), sha1()]
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def update(self, data):
+        """Add a block of data to the image and current track hashes"""
+        track = self._track
+        track[1] += len(data)
+        track[2] = crc32(data, track[2])
+        track[3].update(data)
+        track[4].update(data)
+
+        self._image_size += len(data)
+        self._image_crc = crc32(data, self._image_crc)
+        for image_hash in self._image_hashes:
+            image_hash.update(data)
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def end_track(self):
+        """Finish hashing the current track"""
+        file_name, size, track_crc, track_md5, track_sha1 = self._track
+        self._tracks.append(TrackDigest(file_name, size, f'{track_crc:08x}', track_md5.hexdigest(), track_sha1.hexdigest()))
+        self._track = None
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def result(self, bin_path: str, cue_path: str, expected_tracks: list = None) -> MergeResult:
+        """Get the merge result, comparing the tracks against the expected (name, size, crc, md5, sha1) tuples if given"""
+        verified = _compare_tracks(self._tracks, expected_tracks) if expected_tracks else None
+        return MergeResult(bin_path, cue_path, self._image_size, f'{self._image_crc:08x}', self._image_hashes[0].hexdigest(),
+                           self._image_hashes[1].hexdigest(), tuple(self._tracks), verified)
+    # ************************************************************************************
 # ************************************************************************************
 
 
 # ************************************************************************************
-def _sectors_to_cuestamp(sectors):
-    """Convert sectors to a cue sheet timestamp (MM:SS:FF)"""
-    minutes = sectors / 4500
-    fields = sectors % 4500
-    seconds = fields / 75
-    fields = sectors % 75
-    return '%02d:%02d:%02d' % (minutes, seconds, fields)
+def _compare_tracks(tracks: list, expected_tracks: list) -> bool:
+    """Compare the track digests against the expected tracks in order, only the values that are known are compared"""
+    if len(tracks) != len(expected_tracks):
+        _log_error('WARNING', f'Merged {len(tracks)} tracks but expected {len(expected_tracks)}')
+        return False
+
+    matched = True
+    for track, (name, size, track_crc, track_md5, track_sha1) in zip(tracks, expected_tracks):
+        for label, value, expected in (('size', track.size, size), ('CRC32', track.crc32, track_crc),
+                                       ('MD5', track.md5, track_md5), ('SHA-1', track.sha1, track_sha1)):
+            if expected is not None and str(value) != str(expected).lower():
+                _log_error('WARNING', f'{track.file_name} does not match {name} ({label} {value} expected {expected})')
+                matched = False
+    return matched
 # ************************************************************************************
 
 
 # ************************************************************************************
-def _cuestamp_to_sectors(stamp):
-    """Convert a cue sheet timestamp (MM:SS:FF) to sectors"""
-    m = match('(\d+):(\d+):(\d+)', stamp)
-    minutes = int(m.group(1))
-    seconds = int(m.group(2))
-    fields = int(m.group(3))
-    return fields + (seconds * 75) + (minutes * 60 * 75)
+def _filesystem_type(path: str) -> Optional[str]:
+    """Get the type of the file system a path is on (e.g. ext4 or vfat) from /proc/self/mounts, or None if unknown"""
+    key = filesystem_key(path)
+    if key in _FILESYSTEM_TYPES:
+        return _FILESYSTEM_TYPES[key]
+
+    filesystem_type = None
+    try:
+        with open('/proc/self/mounts', 'r', encoding='utf-8', errors='replace') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) > 2 and normcase(fields[1].replace('\\040', ' ')) == normcase(realpath(key)):
+                    filesystem_type = fields[2]
+    except OSError:
+        pass
+
+    _FILESYSTEM_TYPES[key] = filesystem_type
+    return filesystem_type
 # ************************************************************************************
 
 
 # ************************************************************************************
-def _gen_merged_cuesheet(basename, files):
+def _preallocate(out_file, offset: int, length: int):
+    """
+    Reserve the space for data that is about to be written to a file, so the file system can allocate it in one piece
+    fallocate is called with FALLOC_FL_KEEP_SIZE, so only file systems that can reserve the space natively do it
+    and nothing is written. It is skipped on FAT/exFAT, which zero fill the reserved space, and on other platforms
+    """
+    if length <= 0 or _LIBC is None or _filesystem_type(dirname(abspath(out_file.name))) in NO_PREALLOCATE_FILESYSTEMS:
+        return
+    if _LIBC.fallocate(c_int(out_file.fileno()), c_int(FALLOC_FL_KEEP_SIZE), c_longlong(offset), c_longlong(length)) != 0:
+        # Not supported by the file system, the data is written without the preallocation
+        _log_error('INFO', f'Unable to preallocate {out_file.name}: {os.strerror(get_errno())}')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _open_output_file(file_path: str, size: int, preallocate: bool = True):
+    """Create an output file of a known size, with the space for it preallocated unless preallocate is not set"""
+    out_file = open(file_path, 'wb')
+    if preallocate:
+        _preallocate(out_file, 0, size)
+    return out_file
+# ************************************************************************************
+
+
+# ************************************************************************************
+def file_extent_count(file_path: str) -> Optional[int]:
+    """Get the number of extents a file is stored in with FIEMAP (Linux), or None if the file system can not report it"""
+    if ioctl is None:
+        return None
+
+    # struct fiemap: fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count (0 only counts them), fm_reserved
+    request = bytearray(pack('QQIIII', 0, 0xFFFFFFFFFFFFFFFF, FIEMAP_FLAG_SYNC, 0, 0, 0))
+    try:
+        with open(file_path, 'rb') as in_file:
+            ioctl(in_file.fileno(), FS_IOC_FIEMAP, request)
+    except OSError:
+        return None
+    return unpack_from('I', request, 20)[0]
+# ************************************************************************************
+
+
+# ************************************************************************************
+def is_fragmented(size: int, extents: Optional[int]) -> bool:
+    """Check if a file of the given size is stored in more extents than expected"""
+    if extents is None:
+        return False
+    return extents > max(FRAGMENTED_EXTENT_COUNT, -(-size // FRAGMENTATION_EXTENT_SIZE))
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _advise(fd: int, offset: int, length: int, advice: str):
+    """Give the OS a page cache hint for part of a file (a length of 0 is to the end of the file), where supported"""
+    if not PAGE_CACHE_HINTS or not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+    except (OSError, AttributeError):
+        pass
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _drop_written_data(out_file):
+    """Flush the data written to a file to the disk, then drop it from the page cache"""
+    if not PAGE_CACHE_HINTS or not hasattr(os, 'posix_fadvise'):
+        return
+    out_file.flush()
+    if hasattr(os, 'fdatasync'):
+        os.fdatasync(out_file.fileno())
+    _advise(out_file.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _allocate_buffer(size: int):
+    """Allocate a copy buffer, page aligned (and a multiple of the alignment) when O_DIRECT is used"""
+    if DIRECT_IO:
+        return mmap(-1, -(-size // DIRECT_IO_ALIGNMENT) * DIRECT_IO_ALIGNMENT)
+    return bytearray(size)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _open_source_file(file_path: str, direct: bool = True):
+    """Open a source file for reading, with O_DIRECT if enabled (and direct is set) and the file system supports it"""
+    if direct and DIRECT_IO and hasattr(os, 'O_DIRECT'):
+        try:
+            return open(os.open(file_path, os.O_RDONLY | os.O_DIRECT), 'rb', buffering=0)
+        except OSError:
+            pass
+    return open(file_path, 'rb')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _is_wave_file(source) -> bool:
+    """Check if a merge source is a WAVE file from a cue sheet"""
+    return getattr(source, 'file_type', 'BINARY') == 'WAVE'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _source_path(source) -> str:
+    """Get the path of a merge source, either a path or a CueFile"""
+    return source.filename if hasattr(source, 'filename') else source
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _source_size(source) -> int:
+    """Get the number of bytes a merge source takes up in the merged file"""
+    return source.size if _is_wave_file(source) else getsize(_source_path(source))
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _source_range(source) -> tuple:
+    """
+    Get the path, data offset, data length (None to the end of the file) and zero padding of a merge source
+    The PCM data of a WAVE file starts after its header and is padded with silence to a whole number of sectors
+    """
+    if _is_wave_file(source):
+        return source.filename, source.data_offset, source.data_size, source.size - source.data_size
+    return _source_path(source), 0, None, 0
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _read_files(sources: list, free_buffers: Queue, filled_buffers: Queue, errors: list):
+    """
+    Reader thread of the pipelined copy, fills the free buffers from each source in turn and queues them for the writer
+    A file name is queued before the data of each source, and None once all of the sources have been read (or on an error)
+    """
+    try:
+        for source in sources:
+            file_path, offset, length, padding = _source_range(source)
+            with _open_source_file(file_path, direct=offset == 0) as in_file:
+                fd = in_file.fileno()
+                _advise(fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+                filled_buffers.put(basename(file_path))
+                if offset:
+                    in_file.seek(offset)
+
+                remaining = length
+                while remaining is None or remaining > 0:
+                    buffer = free_buffers.get()
+
+                    # The writer has failed, so there is no point reading any more
+                    if buffer is None:
+                        return
+                    with memoryview(buffer) as view:
+                        count = in_file.readinto(view if remaining is None else view[:remaining])
+                    if not count:
+                        free_buffers.put(buffer)
+                        break
+
+                    # The block is in the buffer now, so it is dropped from the page cache and the next blocks are read ahead
+                    _advise(fd, offset, count, 'POSIX_FADV_DONTNEED')
+                    offset += count
+                    _advise(fd, offset, len(buffer) * PIPELINE_QUEUE_DEPTH, 'POSIX_FADV_WILLNEED')
+                    if remaining is not None:
+                        remaining -= count
+                    filled_buffers.put((buffer, count))
+
+            # Pad the source to its size in the merged file, including any data missing from a truncated WAVE file
+            padding += remaining or 0
+            while padding > 0:
+                buffer = free_buffers.get()
+                if buffer is None:
+                    return
+                count = min(len(buffer), padding)
+                buffer[:count] = bytes(count)
+                padding -= count
+                filled_buffers.put((buffer, count))
+    except Exception as error:
+        # Any error is passed to the writer, which raises it, so a failed read never ends as a short merged file
+        errors.append(error)
+    finally:
+        filled_buffers.put(None)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _pipelined_copy(sources: list, out_file, hasher: MergeHasher = None, block_size: int = None):
+    """
+    Copy the sources (paths or CueFiles) one after another into the output file, hashing the data if there is a hasher
+    A reader thread and this (writer) thread share a fixed set of large buffers, so the next block is being read while
+    the last one is written. On a single SD card or USB stick this keeps the reads and writes in long sequential runs
+    Without an output file the files are only read and hashed
+    The source data is dropped from the page cache as it is read, and the written data after each DONTNEED_INTERVAL
+    """
+    free_buffers = Queue()
+    filled_buffers = Queue()
+    for _ in range(max(1, PIPELINE_QUEUE_DEPTH)):
+        free_buffers.put(_allocate_buffer(block_size or PIPELINE_BLOCK_SIZE))
+
+    errors = []
+    reader = Thread(target=_read_files, args=(sources, free_buffers, filled_buffers, errors), daemon=True)
+    reader.start()
+
+    track_open = False
+    unflushed = 0
+    try:
+        while True:
+            item = filled_buffers.get()
+            if item is None:
+                break
+
+            if isinstance(item, str):
+                if hasher is not None:
+                    if track_open:
+                        hasher.end_track()
+                    hasher.start_track(item)
+                    track_open = True
+                continue
+
+            buffer, count = item
+            with memoryview(buffer) as view:
+                if hasher is not None:
+                    hasher.update(view[:count])
+                if out_file is not None:
+                    out_file.write(view[:count])
+            free_buffers.put(buffer)
+
+            # Keep the amount of merged data waiting in the page cache bounded
+            unflushed += count
+            if out_file is not None and unflushed >= DONTNEED_INTERVAL:
+                _drop_written_data(out_file)
+                unflushed = 0
+
+        if out_file is not None and unflushed:
+            _drop_written_data(out_file)
+    except BaseException:
+        # Stop the reader, it may be waiting for a free buffer
+        free_buffers.put(None)
+        raise
+    finally:
+        reader.join()
+
+    if errors:
+        raise errors[0]
+    if track_open:
+        hasher.end_track()
+# ************************************************************************************
+
+
+# ************************************************************************************
+class BinFilesMissingException(Exception):
+    """Exception raised when one or more binary files referenced in the cue sheet are missing"""
+    pass
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _gen_merged_cuesheet(basename, cue_data: CueSheetData):
     """generates a 'merged' cue sheet, that is, one bin file with tracks indexed within"""
     cue_sheet = f'FILE "{basename}.bin" BINARY\n'
 
-    # One sector is (BLOCKSIZE) bytes
-    sector_pos = 0
-    for f in files:
+    # Each file starts at the sector following the end of the previous file
+    for f, file_start in zip(cue_data.files, cue_data.file_start_sectors()):
         for t in f.tracks:
-            cue_sheet += f'   TRACK {t.num} {t.track_type}\n'
+            cue_sheet += f'   TRACK {t.number:02d} {t.track_type}\n'
             for i in t.indexes:
-                cue_sheet += f'   INDEX {i["id"]} {_sectors_to_cuestamp(sector_pos + i["file_offset"])}\n'
-            sector_pos += f.size / Track.globalBlocksize
+                cue_sheet += f'   INDEX {i.number:02d} {sectors_to_cuestamp(file_start + i.file_offset)}\n'
 
     return cue_sheet
 # ************************************************************************************
 
 
 # ************************************************************************************
-def _merge_files(merged_filename: str, files: List[Union[str, object]], use_native: bool = True, memory_merge: bool = False) -> bool:
-    """Merge multiple binary files into a single output file"""
+def _zero_copy_supported() -> bool:
+    """Check if the OS can copy data between files inside the kernel"""
+    return name != 'nt' and (hasattr(os, 'copy_file_range') or hasattr(os, 'sendfile'))
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _reflink_file(src_fd: int, dst_fd: int, dest_offset: int) -> bool:
+    """Clone a whole file into the output file with FICLONERANGE, returning False if the file system cannot do it"""
+    if ioctl is None or dest_offset % REFLINK_ALIGNMENT:
+        return False
+
+    try:
+        # struct file_clone_range: src_fd, src_offset, src_length (0 = to the end of the file), dest_offset
+        ioctl(dst_fd, FICLONERANGE, pack('qQQQ', src_fd, 0, 0, dest_offset))
+        return True
+    except OSError:
+        return False
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _zero_copy_file(src_fd: int, dst_fd: int, length: int, dest_offset: int):
+    """
+    Copy a whole file into the output file at dest_offset, without the data passing through Python
+    Tries a reflink first, then copy_file_range, then sendfile. Each method continues from where the last one stopped
+    """
+    if length and _reflink_file(src_fd, dst_fd, dest_offset):
+        return
+
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < length:
+                count = os.copy_file_range(src_fd, dst_fd, min(length - copied, ZERO_COPY_CHUNK_SIZE), copied, dest_offset + copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError:
+            pass
+
+    if copied < length and hasattr(os, 'sendfile'):
+        # sendfile writes at the current position of the output file
+        lseek(dst_fd, dest_offset + copied, SEEK_SET)
+        try:
+            while copied < length:
+                count = os.sendfile(dst_fd, src_fd, copied, min(length - copied, ZERO_COPY_CHUNK_SIZE))
+                if count == 0:
+                    break
+                copied += count
+        except OSError:
+            pass
+
+    if copied < length:
+        raise OSError(f'Unable to copy the file in the kernel, copied {copied} of {length} bytes')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _zero_copy_merge(merged_filename: str, file_paths: List[str]):
+    """
+    Merge the files by copying each one into place inside the kernel
+    The space is not preallocated, a reflink or copy_file_range can share the blocks of the source files instead
+    """
+    with _open_output_file(merged_filename, sum(getsize(file_path) for file_path in file_paths), preallocate=False) as out_file:
+        dest_offset = 0
+        for file_path in file_paths:
+            with open(file_path, 'rb') as in_file:
+                length = fstat(in_file.fileno()).st_size
+                _advise(in_file.fileno(), 0, 0, 'POSIX_FADV_SEQUENTIAL')
+                _zero_copy_file(in_file.fileno(), out_file.fileno(), length, dest_offset)
+                _advise(in_file.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+                dest_offset += length
+        _drop_written_data(out_file)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _remove_partial_file(file_path: str):
+    """Remove a partly written output file after a failed merge"""
+    try:
+        if exists(file_path):
+            remove(file_path)
+    except OSError as error:
+        print(f"Error removing partly merged file {file_path}: {error}")
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _merge_files(merged_filename: str, files: List[Union[str, object]], use_native: bool = True, memory_merge: bool = False, zero_copy: bool = True,
+                 hasher: MergeHasher = None, block_size: int = None) -> bool:
+    """
+    Merge multiple binary files into a single output file
+    The zero-copy merge is used where the OS supports it, the native and Python merges are used as fallbacks
+    With a hasher the data is copied through Python and hashed as it is written, instead of being copied by the OS
+    WAVE files (CueFiles from a cue sheet) are always copied through Python, as their header is skipped and their data padded
+    The space for the merged file is preallocated, so that it is stored in as few pieces as possible
+    """
 
     # Validate target file
     if exists(merged_filename):
@@ -129,21 +633,40 @@ def _merge_files(merged_filename: str, files: List[Union[str, object]], use_nati
     # Validate and collect file paths
     file_paths = []
     for f in files:
-        path = f.filename if hasattr(f, 'filename') else f
+        path = _source_path(f)
         if not isfile(path):
             print(f"Error: Input file does not exist or is not a file: {path}")
             raise FileNotFoundError(f"Input file does not exist or is not a file: {path}")
         file_paths.append(path)
+    merged_size = sum(_source_size(f) for f in files)
+
+    if hasher is not None or any(_is_wave_file(f) for f in files):
+        try:
+            with _open_output_file(merged_filename, merged_size) as out_file:
+                _pipelined_copy(list(files), out_file, hasher, block_size)
+            return True
+        except Exception as error:
+            print(f"Error merging files: {error}")
+            _remove_partial_file(merged_filename)
+            return False
+
+    if zero_copy and _zero_copy_supported():
+        try:
+            _zero_copy_merge(merged_filename, file_paths)
+            return True
+        except OSError as error:
+            print(f"Zero-copy merge failed, using the fallback merge: {error}")
+            _remove_partial_file(merged_filename)
 
     try:
         if use_native:
             # Use native OS commands for fastest merging
-            if name == 'nt':  	# Windows
+            if name == 'nt':  # Windows (file names can not contain quotes on Windows)
                 cmd = 'copy /b ' + ' + '.join(f'"{path}"' for path in file_paths) + f' "{merged_filename}"'
                 subprocess.run(cmd, shell=True, check=True)
-            else:  				# Unix/Linux/macOS
-                cmd = ['cat'] + file_paths + ['>', merged_filename]
-                subprocess.run(' '.join(cmd), shell=True, check=True)
+            else:  # Unix/Linux/macOS (no shell, so any characters in the file names are safe)
+                with _open_output_file(merged_filename, merged_size) as out_file:
+                    subprocess.run(['cat', '--'] + file_paths, stdout=out_file, check=True)
         else:
             # Fallback to memory-based or file-based merging
             if memory_merge:
@@ -152,20 +675,279 @@ def _merge_files(merged_filename: str, files: List[Union[str, object]], use_nati
                 for file_path in file_paths:
                     with open(file_path, 'rb') as in_file:
                         data.extend(in_file.read())
-                with open(merged_filename, 'wb') as out_file:
+                with _open_output_file(merged_filename, merged_size) as out_file:
                     out_file.write(data)
             else:
-                # Sequential merging with shutil (faster than chunk-based)
-                with open(merged_filename, 'wb') as out_file:
-                    for file_path in file_paths:
-                        with open(file_path, 'rb') as in_file:
-                            copyfileobj(in_file, out_file)
+                # Pipelined merging, the next block is read while the last one is written
+                with _open_output_file(merged_filename, merged_size) as out_file:
+                    _pipelined_copy(file_paths, out_file, block_size=block_size)
 
         return True
 
     except (subprocess.CalledProcessError, IOError, OSError) as error:
         print(f"Error merging files: {error}")
+        _remove_partial_file(merged_filename)
+        return False
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _append_files(first_file: str, sources: list, zero_copy: bool = True, hasher: MergeHasher = None, block_size: int = None):
+    """
+    Append the sources (paths or CueFiles) onto the end of the first file, without rewriting the data already in it
+    If anything fails the first file is truncated back to its original size and the error is raised again
+    With a hasher the first file is read (but not written) to hash it, and the other files are copied through the hasher
+    """
+    with open(first_file, 'r+b') as out_file:
+        original_size = fstat(out_file.fileno()).st_size
+        try:
+            # The space is not preallocated here, the appended tracks are small next to the data track
+            if hasher is not None:
+                _pipelined_copy([first_file], None, hasher, block_size)
+
+            if hasher is not None:
+                out_file.seek(original_size)
+                _pipelined_copy(sources, out_file, hasher, block_size)
+                out_file.flush()
+                return original_size
+
+            dest_offset = original_size
+            for source in sources:
+                with open(_source_path(source), 'rb') as in_file:
+                    length = _source_size(source)
+                    if zero_copy and _zero_copy_supported() and not _is_wave_file(source):
+                        try:
+                            _advise(in_file.fileno(), 0, 0, 'POSIX_FADV_SEQUENTIAL')
+                            _zero_copy_file(in_file.fileno(), out_file.fileno(), length, dest_offset)
+                            _advise(in_file.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+                            dest_offset += length
+                            continue
+                        except OSError:
+                            pass
+
+                    # Fallback to a Python copy, starting again from the beginning of this file
+                    out_file.seek(dest_offset)
+                    out_file.truncate()
+                    _pipelined_copy([source], out_file, block_size=block_size)
+                    out_file.flush()
+                    dest_offset += length
+            _drop_written_data(out_file)
+        except Exception:
+            _truncate_file(out_file, original_size)
+            raise
+    return original_size
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _truncate_file(out_file, size: int):
+    """Truncate an open file back to the given size and flush it to disk"""
+    out_file.seek(size)
+    out_file.truncate()
+    out_file.flush()
+    fsync(out_file.fileno())
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _can_append_in_place(cue_data: CueSheetData, out_dir: str) -> bool:
+    """
+    Check if the remaining tracks can be appended onto the first bin file in place
+    The first file has to be on the same file system as the output directory, so it can be renamed into place
+    """
+    if len(cue_data.files) < 2:
         return False
+
+    first_file = cue_data.files[0].filename
+    if _is_wave_file(cue_data.files[0]) or any(_same_path(first_file, f.filename) for f in cue_data.files[1:]):
+        return False
+
+    try:
+        return stat(first_file).st_dev == stat(out_dir).st_dev
+    except OSError:
+        return False
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _append_merge(cue_data: CueSheetData, new_bin_fn: str, new_cue_fn: str, cue_sheet: str, hasher: MergeHasher = None,
+                  strategy: MergeStrategy = None) -> bool:
+    """
+    Merge the tracks by appending them onto the first bin file, then rename it and write the merged cue file
+    The first bin file is truncated back to its original size, and renamed back, if any step fails
+    """
+    first_file = cue_data.files[0].filename
+    partial_cue_fn = new_cue_fn + '.partial'
+
+    try:
+        with open(partial_cue_fn, 'w', encoding='utf-8', newline='\r\n') as f:
+            f.write(cue_sheet)
+    except OSError as error:
+        _log_error('ERROR', f'Unable to write the merged cue file: {error}')
+        _remove_partial_file(partial_cue_fn)
+        return False
+
+    original_size = None
+    bin_renamed = False
+    try:
+        flags = _strategy_flags(strategy)
+        original_size = _append_files(first_file, list(cue_data.files[1:]), flags['zero_copy'], hasher, flags['block_size'])
+
+        # The bin file is renamed first, so a complete cue file never points at a missing bin file
+        replace(first_file, new_bin_fn)
+        bin_renamed = True
+        replace(partial_cue_fn, new_cue_fn)
+        return True
+    except Exception as error:
+        _log_error('ERROR', f'Unable to append the tracks onto {first_file}: {error}')
+        try:
+            if bin_renamed:
+                replace(new_bin_fn, first_file)
+            if original_size is not None:
+                with open(first_file, 'r+b') as out_file:
+                    _truncate_file(out_file, original_size)
+        except OSError as rollback_error:
+            _log_error('ERROR', f'Unable to restore {first_file}: {rollback_error}')
+        _remove_partial_file(partial_cue_fn)
+        return False
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _strategy_flags(strategy: Optional[MergeStrategy]) -> dict:
+    """Get the _merge_files arguments for a merge strategy"""
+    if strategy is None:
+        return {'zero_copy': True, 'use_native': True, 'block_size': None}
+    return {'zero_copy': strategy.name == 'zero_copy', 'use_native': strategy.name != 'pipeline', 'block_size': strategy.block_size}
+# ************************************************************************************
+
+
+# ************************************************************************************
+def filesystem_key(path: str) -> str:
+    """Get the mount point of the file system a path is on, used as the key of its calibrated merge strategy"""
+    path = abspath(path)
+    while not ismount(path):
+        parent = dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return normcase(path)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _time_merge(strategy: MergeStrategy, sample_paths: List[str], out_path: str, hashed: bool = False) -> float:
+    """Time merging the sample files with a strategy, including flushing the merged file to the disk"""
+    start = perf_counter()
+    try:
+        hasher = MergeHasher() if hashed else None
+        if not _merge_files(out_path, sample_paths, hasher=hasher, **_strategy_flags(strategy)):
+            return float('inf')
+        with open(out_path, 'r+b') as out_file:
+            fsync(out_file.fileno())
+        return perf_counter() - start
+    except OSError:
+        return float('inf')
+    finally:
+        _remove_partial_file(out_path)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def calibrate_merge_strategy(directory: str, hashed: bool = False) -> MergeStrategy:
+    """
+    Find the fastest merge strategy for the file system of a directory, by merging a small sample with each one
+    The sample files are written to the directory and removed afterwards
+    A hashed merge always copies the data through Python, so with hashed only the pipeline block sizes are tried
+    The default strategy is returned if the sample files can not be written
+    """
+    sample_paths = [join(directory, '.psio_calibration_1.bin'), join(directory, '.psio_calibration_2.bin')]
+    out_path = join(directory, '.psio_calibration.partial')
+
+    # A data track followed by a smaller audio track
+    sample_sizes = (CALIBRATION_SAMPLE_SIZE * 3 // 4, CALIBRATION_SAMPLE_SIZE // 4)
+    candidates = [] if hashed else [MergeStrategy(strategy_name, PIPELINE_BLOCK_SIZE) for strategy_name in MERGE_STRATEGIES[:2]
+                                    if strategy_name != 'zero_copy' or _zero_copy_supported()]
+    candidates += [MergeStrategy('pipeline', block_size) for block_size in CALIBRATION_BLOCK_SIZES]
+
+    best_strategy = MergeStrategy(MERGE_STRATEGIES[-1] if hashed else MERGE_STRATEGIES[0], PIPELINE_BLOCK_SIZE)
+    best_time = float('inf')
+    try:
+        for sample_path, sample_size in zip(sample_paths, sample_sizes):
+            with open(sample_path, 'wb') as sample_file:
+                sample_file.write(os.urandom(sample_size))
+                sample_file.flush()
+                fsync(sample_file.fileno())
+
+        for strategy in candidates:
+            elapsed = _time_merge(strategy, sample_paths, out_path, hashed)
+            if elapsed < best_time:
+                best_strategy, best_time = strategy, elapsed
+    except OSError as error:
+        _log_error('WARNING', f'Unable to calibrate the merge strategy for {directory}: {error}')
+    finally:
+        for sample_path in sample_paths:
+            _remove_partial_file(sample_path)
+
+    return best_strategy
+# ************************************************************************************
+
+
+# ************************************************************************************
+def merge_strategy_for(directory: str, hashed: bool = False) -> MergeStrategy:
+    """
+    Get the merge strategy for the file system of a directory, calibrating it the first time the file system is used
+    Hashed and unhashed merges are calibrated separately, as a hashed merge can only change the block size
+    The calibration runs without holding the lock, so merges on other file systems are not held up by it
+    If calibration is not enabled, file systems without a stored strategy use the default strategy
+    """
+    filesystem = filesystem_key(directory)
+    key = filesystem + (HASHED_STRATEGY_SUFFIX if hashed else '')
+    while True:
+        with _MERGE_STRATEGIES_LOCK:
+            if key in _MERGE_STRATEGIES:
+                return _MERGE_STRATEGIES[key]
+            if not CALIBRATE_MERGES:
+                return MergeStrategy(MERGE_STRATEGIES[-1] if hashed else MERGE_STRATEGIES[0], PIPELINE_BLOCK_SIZE)
+
+            calibration = _CALIBRATIONS.get(filesystem)
+            if calibration is None:
+                calibration = _CALIBRATIONS[filesystem] = Event()
+                break
+
+        # Another merge is calibrating this file system, wait for it and then check again for the strategy
+        calibration.wait()
+
+    try:
+        strategy = calibrate_merge_strategy(directory, hashed)
+        with _MERGE_STRATEGIES_LOCK:
+            _MERGE_STRATEGIES[key] = strategy
+        return strategy
+    finally:
+        with _MERGE_STRATEGIES_LOCK:
+            del _CALIBRATIONS[filesystem]
+        calibration.set()
+# ************************************************************************************
+
+
+# ************************************************************************************
+def get_merge_strategies() -> dict:
+    """Get the calibrated merge strategies, in a form that can be stored in a JSON config file"""
+    with _MERGE_STRATEGIES_LOCK:
+        return {key: strategy._asdict() for key, strategy in _MERGE_STRATEGIES.items()}
+# ************************************************************************************
+
+
+# ************************************************************************************
+def set_merge_strategies(strategies: dict):
+    """Set the calibrated merge strategies, e.g. from a config file, any invalid entries are ignored"""
+    with _MERGE_STRATEGIES_LOCK:
+        for key, strategy in (strategies or {}).items():
+            try:
+                if strategy['name'] in MERGE_STRATEGIES and int(strategy['block_size']) > 0:
+                    _MERGE_STRATEGIES[key] = MergeStrategy(strategy['name'], int(strategy['block_size']))
+            except (KeyError, TypeError, ValueError):
+                continue
 # ************************************************************************************
 
 
@@ -182,6 +964,16 @@ def _log_error(error_type, error_message):
 # ************************************************************************************
 
 
+# ************************************************************************************
+def _log_missing_files(cue_data: CueSheetData):
+    """Log each binary file referenced in the cue sheet that does not exist, and each WAVE file that is not CD audio"""
+    for missing_file in cue_data.missing_files:
+        _log_error('ERROR', f'file does not exist: {missing_file}')
+    for invalid_file in cue_data.invalid_files:
+        _log_error('ERROR', f'WAVE file is not 44.1 kHz 16-bit stereo PCM: {invalid_file}')
+# ************************************************************************************
+
+
 # ************************************************************************************
 def set_binmerge_error_log_path(log_path):
     """Set the path for the error log file"""
@@ -190,82 +982,151 @@ def set_binmerge_error_log_path(log_path):
 # ************************************************************************************
 
 
+# ************************************************************************************
+def set_merge_pipeline(block_size: int = None, queue_depth: int = None):
+    """Set the size and number of the buffers shared by the reader and writer threads of the Python copy"""
+    global PIPELINE_BLOCK_SIZE, PIPELINE_QUEUE_DEPTH
+    if block_size:
+        PIPELINE_BLOCK_SIZE = max(64 * 1024, block_size)
+    if queue_depth:
+        PIPELINE_QUEUE_DEPTH = max(2, queue_depth)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def set_merge_calibration(enabled: bool = True):
+    """Set whether the merge strategy of each new file system is calibrated by merging a small sample on it"""
+    global CALIBRATE_MERGES
+    CALIBRATE_MERGES = enabled
+# ************************************************************************************
+
+
+# ************************************************************************************
+def set_page_cache_hints(enabled: bool = True, direct_io: bool = False):
+    """
+    Set whether the merges give the OS page cache hints, and whether the source tracks are read with O_DIRECT
+    O_DIRECT is only used for reading, the merged file is written through the page cache and then dropped from it
+    """
+    global PAGE_CACHE_HINTS, DIRECT_IO
+    PAGE_CACHE_HINTS = enabled
+    DIRECT_IO = direct_io
+# ************************************************************************************
+
+
 # ************************************************************************************
 def read_cue_file(cue_path):
-    """Read and parse a cue file, returning a list of File objects with their tracks and indexes"""
-    files = []
-    this_track = None
-    this_file = None
-    bin_files_missing = False
-
-    f = open(cue_path, 'r', encoding='utf-8')
-    for line in f:
-        m = search('FILE "?(.*?)"? BINARY', line)
-        if m:
-            this_path = join(dirname(cue_path), m.group(1))
-            file_available = (isfile(this_path) or access(this_path, R_OK))
-
-            if not file_available:
-                this_path = join(dirname(cue_path), m.group(1).replace(' (Track 01)', ''))
-                file_available = (isfile(this_path) or access(this_path, R_OK))
-                if not file_available:
-                    this_path = join(dirname(cue_path), m.group(1).replace(' (Track 1)', ''))
-                    file_available = (isfile(this_path) or access(this_path, R_OK))
-
-            if not file_available:
-                bin_files_missing = True
-            else:
-                this_file = File(this_path)
-                files.append(this_file)
+    """Read and parse a cue file, returning None if any of the binary files are missing"""
+    cue_data = parse_cue_sheet(cue_path)
 
-            continue
+    if not cue_data.complete:
+        _log_missing_files(cue_data)
+        return None
 
-        m = search('TRACK (\d+) ([^\s]*)', line)
-        if m and this_file:
-            this_track = Track(int(m.group(1)), m.group(2))
-            this_file.tracks.append(this_track)
-            continue
+    return cue_data
+# ************************************************************************************
 
-        m = search('INDEX (\d+) (\d+:\d+:\d+)', line)
-        if m and this_track:
-            this_track.indexes.append({'id': int(m.group(1)), 'stamp': m.group(2), 'file_offset':_cuestamp_to_sectors(m.group(2))})
-            continue
 
-    if bin_files_missing:
-        _log_error('ERROR', f'file does not exist: {line}')
-        return []
+# ************************************************************************************
+def _merge_result(hasher: Optional[MergeHasher], bin_path: str, cue_path: str, expected_tracks: list) -> MergeResult:
+    """
+    Build the result of a successful merge, logging a warning if the tracks do not match the expected hashes
+    or if the merged bin file is fragmented
+    """
+    if hasher is None:
+        result = MergeResult(bin_path, cue_path, stat(bin_path).st_size, None, None, None, (), None)
+    else:
+        result = hasher.result(bin_path, cue_path, expected_tracks)
+        if result.verified is False:
+            _log_error('WARNING', f'The merged tracks do not match the Redump hashes: {bin_path}')
+
+    result = result._replace(extents=file_extent_count(bin_path))
+    if is_fragmented(result.size, result.extents):
+        _log_error('WARNING', f'The merged bin file is fragmented into {result.extents} extents: {bin_path}')
+    return result
+# ************************************************************************************
 
-    if len(files) == 1:
-        # only 1 file, assume splitting, calc sectors of each
-        next_item_offset = files[0].size // Track.globalBlocksize
-        for t in reversed(files[0].tracks):
-            t.sectors = next_item_offset - t.indexes[0]["file_offset"]
-            next_item_offset = t.indexes[0]["file_offset"]
 
-    return files
+# ************************************************************************************
+def _same_path(path_a: str, path_b: str) -> bool:
+    """Check if two paths point to the same file"""
+    return normcase(abspath(path_a)) == normcase(abspath(path_b))
 # ************************************************************************************
 
 
 # ************************************************************************************
-def start_bin_merge(cue_file, game_name, out_dir):
-    """Main function to start the bin merging process"""
-    cue_map = read_cue_file(cue_file)
-    cue_sheet = _gen_merged_cuesheet(game_name, cue_map)
+def start_bin_merge(cue_file, game_name, out_dir, cue_data: CueSheetData = None, in_place: bool = False,
+                    hash_output: Optional[bool] = None, expected_tracks: list = None, strategy: MergeStrategy = None) -> Optional[MergeResult]:
+    """
+    Main function to start the bin merging process, an already parsed cue sheet can be passed in
+    The bin and cue files are written as .partial files and only renamed once both are complete,
+    so the output can be the final game directory and the merged cue can replace the original cue file
+    With in_place, the remaining tracks are appended onto the first bin file, which becomes the merged bin file,
+    so the data track is never rewritten. The first bin file is changed, so the original cue sheet is no longer valid
+    A hashed in-place merge still has to read the whole data track back to hash it, so hashed merges should copy instead
+    With hash_output, the merged data is hashed as it is written and the tracks are compared against expected_tracks,
+    a list of (name, size, crc, md5, sha1) tuples from the Redump DAT, when given. By default the data is only hashed
+    when there are expected tracks to compare against
+    The merge strategy is the calibrated strategy of the output file system unless one is passed in, a hashed merge
+    always copies the data through Python, so its block size is calibrated separately
+    Returns a MergeResult (without hashes if hash_output is not set), or None if the merge failed
+    """
+    if cue_data is None:
+        cue_data = read_cue_file(cue_file)
+    elif not cue_data.complete:
+        _log_missing_files(cue_data)
+        cue_data = None
+
+    if cue_data is None:
+        return None
+
+    cue_sheet = _gen_merged_cuesheet(game_name, cue_data)
 
     if not exists(out_dir):
         _log_error('ERROR', 'Output dir does not exist')
-        return False
+        return None
 
     new_cue_fn = join(out_dir, game_name + '.cue')
-    if exists(new_cue_fn):
+    if exists(new_cue_fn) and not _same_path(new_cue_fn, cue_file):
         _log_error('ERROR', f'Output cue file already exists. Quitting. Path: {new_cue_fn}')
-        return False
+        return None
 
-    if not _merge_files(join(out_dir, game_name + '.bin'), cue_map):
-        return False
+    new_bin_fn = join(out_dir, game_name + '.bin')
+    if exists(new_bin_fn) and not any(_same_path(new_bin_fn, f.filename) for f in cue_data.files):
+        _log_error('ERROR', f'Output bin file already exists. Quitting. Path: {new_bin_fn}')
+        return None
+
+    if hash_output is None:
+        hash_output = bool(expected_tracks)
+
+    if strategy is None:
+        strategy = merge_strategy_for(out_dir, hash_output)
+
+    hasher = MergeHasher() if hash_output else None
+    if in_place and _can_append_in_place(cue_data, out_dir):
+        if not _append_merge(cue_data, new_bin_fn, new_cue_fn, cue_sheet, hasher, strategy):
+            return None
+        return _merge_result(hasher, new_bin_fn, new_cue_fn, expected_tracks)
+
+    partial_bin_fn = new_bin_fn + '.partial'
+    partial_cue_fn = new_cue_fn + '.partial'
+    for partial_fn in (partial_bin_fn, partial_cue_fn):
+        _remove_partial_file(partial_fn)
+
+    if not _merge_files(partial_bin_fn, cue_data.files, hasher=hasher, **_strategy_flags(strategy)):
+        return None
+
+    try:
+        with open(partial_cue_fn, 'w', encoding='utf-8', newline='\r\n') as f:
+            f.write(cue_sheet)
 
-    with open(new_cue_fn, 'w', encoding='utf-8', newline='\r\n') as f:
-        f.write(cue_sheet)
+        # The bin file is renamed first, so a complete cue file never points at a missing bin file
+        replace(partial_bin_fn, new_bin_fn)
+        replace(partial_cue_fn, new_cue_fn)
+    except OSError as error:
+        _log_error('ERROR', f'Unable to write the merged files: {error}')
+        _remove_partial_file(partial_bin_fn)
+        _remove_partial_file(partial_cue_fn)
+        return None
 
-    return True
+    return _merge_result(hasher, new_bin_fn, new_cue_fn, expected_tracks)
 # ************************************************************************************
@@ -0,0 +1,144 @@
+'''
+Library catalog functions
+The application stores the details of every game it scans in a small local Sqlite3 database
+
+Each game is keyed by the path of its cue sheet, along with the size and modification time
+of the cue sheet and each of its bin files. When a directory is scanned again, only the games
+whose files have changed need to have their cue sheets parsed and their bin files read
+'''
+
+from json import dumps, loads
+from os import stat
+from os.path import abspath, join
+from sqlite3 import connect, Error
+from threading import Lock
+
+CATALOG_VERSION = 3
+
+
+# ************************************************************************************
+def file_fingerprint(path: str, snapshot=None):
+    """
+    Get the size and modification time of a file, or None if it does not exist
+    The inode is not used, DirEntry.stat() reports it as 0 on Windows, so it would not match a full os.stat result
+    """
+    if snapshot is not None:
+        st = snapshot.stat_path(path)
+    else:
+        try:
+            st = stat(path)
+        except OSError:
+            st = None
+
+    return [st.st_size, st.st_mtime_ns] if st is not None else None
+# ************************************************************************************
+
+
+# ************************************************************************************
+class LibraryCatalog:
+    """A persistent catalog of scanned games, keyed by the fingerprints of their files"""
+
+    def __init__(self, catalog_path: str):
+        self._catalog_path = catalog_path
+        self._entries = {}
+        self._pending = {}
+        self._seen = set()
+        self._lock = Lock()
+
+    # ************************************************************************************
+    def _connect(self):
+        """Open the catalog database, creating the tables if they do not exist"""
+        conn = connect(self._catalog_path)
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        conn.execute('CREATE TABLE IF NOT EXISTS games (cue_path TEXT PRIMARY KEY, fingerprints TEXT NOT NULL, details TEXT NOT NULL)')
+        return conn
+    # ************************************************************************************
+
+    # ************************************************************************************
+    def load(self, source_fingerprint=None):
+        """
+        Load every catalog entry into memory
+        The catalog is cleared if it was built by a different catalog version or from a different game database
+        """
+        self._entries = {}
+        self._pending = {}
+        self._seen = set()
+
+        expected_source = dumps([CATALOG_VERSION, source_fingerprint])
+        conn = None
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', ('source',)).fetchone()
+            if row is None or row[0] != expected_source:
+                with conn:
+                    conn.execute('DELETE FROM games')
+                    conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('source', expected_source))
+                return
+
+            for cue_path, fingerprints, details in conn.execute('SELECT cue_path, fingerprints, details FROM games'):
+                self._entries[cue_path] = (loads(fingerprints), details)
+        except (Error, ValueError) as error:
+            print(f'Error loading the library catalog: {error}')
+        finally:
+            if conn:
+                conn.close()
+    # ************************************************************************************
+
+    # ************************************************************************************
+    def lookup(self, cue_path: str, snapshot=None):
+        """Get the stored game details, if the cue sheet and its bin files have not changed since they were stored"""
+        cue_path = abspath(cue_path)
+        with self._lock:
+            self._seen.add(cue_path)
+
+        entry = self._entries.get(cue_path)
+        if entry is None:
+            return None
+
+        fingerprints, details = entry
+        for path, fingerprint in fingerprints.items():
+            if file_fingerprint(path, snapshot) != fingerprint:
+                return None
+
+        return loads(details)
+    # ************************************************************************************
+
+    # ************************************************************************************
+    def store(self, cue_path: str, details: dict, bin_paths, snapshot=None):
+        """Store the details of a game, they are written to disk when the catalog is saved"""
+        cue_path = abspath(cue_path)
+        fingerprints = {path: file_fingerprint(path, snapshot) for path in [cue_path] + [abspath(path) for path in bin_paths]}
+        if None in fingerprints.values():
+            return
+
+        with self._lock:
+            self._seen.add(cue_path)
+            self._pending[cue_path] = (fingerprints, dumps(details))
+    # ************************************************************************************
+
+    # ************************************************************************************
+    def save(self, scanned_root: str = None):
+        """
+        Write the stored game details to disk in a single transaction
+        Entries below the scanned root directory that were not seen during the scan are removed
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO games (cue_path, fingerprints, details) VALUES (?, ?, ?)',
+                                 [(cue_path, dumps(fingerprints), details) for cue_path, (fingerprints, details) in self._pending.items()])
+
+                if scanned_root:
+                    root = join(abspath(scanned_root), '')
+                    stale_paths = [(cue_path,) for cue_path in self._entries if cue_path.startswith(root) and cue_path not in self._seen]
+                    conn.executemany('DELETE FROM games WHERE cue_path = ?', stale_paths)
+        except Error as error:
+            print(f'Error saving the library catalog: {error}')
+        finally:
+            if conn:
+                conn.close()
+
+        self._pending = {}
+    # ************************************************************************************
+# ************************************************************************************
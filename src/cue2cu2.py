@@ -23,27 +23,14 @@
 #  This code has been modified by LoGi26 (2021) for use with the psio-assist script
 
 
-from os.path import exists, join, getsize
-from pathlib import Path
-from re import compile
+from os.path import exists, join, getsize, dirname, normcase
+
+from cue_parser import CueSheetData, parse_cue_sheet
 
 # Global variables
 error_log_path = None
 
 
-# ************************************************************************************
-def _convert_timecode_to_sectors(time_code):
-    """Convert time code to sectors"""
-    minutes = int(time_code[0:2])
-    seconds = int(time_code[3:5])
-    sectors = int(time_code[6:8])
-    minutes_sectors = int(minutes*60*75)
-    seconds_sectors = int(seconds*75)
-    total_sectors = int(minutes_sectors + seconds_sectors + sectors)
-    return total_sectors
-# ************************************************************************************
-
-
 # ************************************************************************************
 def _convert_sectors_to_timecode(sectors):
     """Convert sectors to time code"""
@@ -94,12 +81,9 @@ def _convert_filesize_to_sectors(binary_file):
 
 
 # ************************************************************************************
-def _timecode_addition(time_code, offset):
-    """Add two timecodes together, but cap the result at 449999 (the max CU2 format supports)"""
-    result = _convert_timecode_to_sectors(time_code) + _convert_timecode_to_sectors(offset)
-    if result > int('449999'):
-        result = int('449999')
-    return _convert_sectors_to_timecode(result)
+def _sectors_addition(sectors, offset):
+    """Add two sector counts together, but cap the result at 449999 (the max CU2 format supports)"""
+    return min(int(sectors) + int(offset), 449999)
 # ************************************************************************************
 
 
@@ -127,41 +111,40 @@ def set_cu2_error_log_path(log_path):
 # ************************************************************************************
 # SCRIPT START
 # ************************************************************************************
-def start_cue2cu2(cuesheet, binaryfile_name):
+def start_cue2cu2(cuesheet, binaryfile_name, cue_data: CueSheetData = None):
+    """Generate a CU2 sheet next to the binary file, an already parsed cue sheet can be passed in"""
     # Hardcoded for CU2 revision 2
     format_revision = int(2)
 
-    # Copy the cue sheet into an array so we don't have to re-read it from disk again and can navigate it easily
-    try:
-        with open(cuesheet, 'r', encoding='utf-8') as cuesheet_file:
-            cuesheet_content = cuesheet_file.read().splitlines()
+    # The famous two second offset for PSIO
+    psio_offset = 150
 
-    except IOError:
-        _log_error('ERROR', f'Could not open {str(cuesheet)}')
-        return False
+    # Parse the cue sheet unless the caller has already done so
+    if cue_data is None:
+        try:
+            cue_data = parse_cue_sheet(cuesheet)
+        except (IOError, UnicodeDecodeError):
+            _log_error('ERROR', f'Could not open {str(cuesheet)}')
+            return False
 
     # Check the cue sheet if the image is supposed to be in Mode 2 with 2352 bytes per sector
-    for line in cuesheet_content:
-        cuesheet_mode_valid = bool(False)
-        if compile('.*[Mm][Oo][Dd][Ee]2/2352.*').match(line):
-            cuesheet_mode_valid = bool(True)
-            break
-    if cuesheet_mode_valid == False: # If it's not, we can't continue
+    if not cue_data.is_mode2_2352: # If it's not, we can't continue
         _log_error('ERROR', f'Cue sheet {str(cuesheet)} indicates this image is not in MODE2/2352')
         return False
 
-    bin_path = str(Path(cuesheet).parent)
-    binaryfile = join(bin_path, binaryfile_name)
+    binaryfile = join(dirname(cuesheet), binaryfile_name)
     output = str()
 
     # Get number of tracks from cue sheet
-    ntracks = 0
-    for line in cuesheet_content:
-        if compile('[ \t]*[Tt][Rr][Aa][Cc][Kk].*').match(line) and not compile('[ \t]*[Ff][Ii][Ll][Ee].*[Tt][Rr][Aa][Cc][Kk].*').match(line):
-            ntracks += 1
+    tracks = cue_data.tracks
+    ntracks = len(tracks)
     output = f'{output}ntracks {str(ntracks)}\r\n'
 
-    sectors = _convert_filesize_to_sectors(binaryfile)
+    # Use the file size from the parsed cue sheet when it describes the same binary file
+    if len(cue_data.files) == 1 and normcase(cue_data.files[0].filename) == normcase(binaryfile):
+        sectors = _convert_bytes_to_sectors(cue_data.files[0].size)
+    else:
+        sectors = _convert_filesize_to_sectors(binaryfile)
 
     if sectors is None:
         return False
@@ -172,60 +155,50 @@ def start_cue2cu2(cuesheet, binaryfile_name):
 
     # Get data1 - well, this is always the same for our kind of disc images, so...
     # At some point I should do this the proper way and grab it from Track 1.
-    data1 = _timecode_addition('00:00:00','00:02:00')
+    data1 = _convert_sectors_to_timecode(_sectors_addition(0, psio_offset))
     output = f'{output}data1       {data1}\r\n'
 
+    # Absolute position of each track, relative to the start of the (merged) binary file
+    track_file_starts = [file_start for cue_file, file_start in zip(cue_data.files, cue_data.file_start_sectors()) for _ in cue_file.tracks]
+
     # Get the track and pregap lengths
     pregap_command_used_before = bool(False)
-    for track in range(2, ntracks+1):
-        # Find current track number in cuesheet_content
-        current_track_in_cuesheet = -1;
-        for line in cuesheet_content:
-            current_track_in_cuesheet += 1
-            if compile(f'.*[Tt][Rr][Aa][Cc][Kk] 0?{str(track)}.*').match(line):
-                break
-
-        # See if the next line is index 00, and if so, get and output the pregap if the CU2 format requires it
-        if compile('.*[Ii][Nn][Dd][Ee][Xx] 0?0.*').match(cuesheet_content[current_track_in_cuesheet+1]) and format_revision == int(2):
-            pregap_position = cuesheet_content[current_track_in_cuesheet+1][::-1][:8][::-1][:9]
-
-            # Add the famous two second offset for PSIO and convert to alternative notation used by Systems Console for tracks
-            pregap_position = _convert_sectors_to_timecode_with_alternative_notation(_convert_timecode_to_sectors(_timecode_addition(pregap_position,"00:02:00")))
-            output = f'{output}pregap{str(track).zfill(2)}  {pregap_position}\r\n'
+    for track_number in range(2, ntracks+1):
+        track = tracks[track_number-1]
+        file_start = track_file_starts[track_number-1]
+        pregap_index = track.get_index(0)
+        start_index = track.get_index(1)
+
+        # See if the track has an index 00, and if so, output the pregap if the CU2 format requires it
+        if pregap_index is not None and format_revision == int(2):
+            pregap_position = _convert_sectors_to_timecode_with_alternative_notation(_sectors_addition(file_start + pregap_index.file_offset, psio_offset))
+            output = f'{output}pregap{str(track_number).zfill(2)}  {pregap_position}\r\n'
 
         # Check if this cue sheet uses the PREGAP command, which is bad. We can continue, but...
-        elif compile('.*[Pp][Rr][Ee][Gg][Aa][Pp].*').match(cuesheet_content[current_track_in_cuesheet+1]) and format_revision == int(2):
+        elif track.pregap is not None and format_revision == int(2):
             if pregap_command_used_before == False:
-                _log_error('WARNING', f'The PREGAP command is used for track {str(track)}, which requires the software to insert data into the image or disc. This is not supported by Cue2cu2. The pregap will be ignored and a zero length pregap will be noted in the CU2 sheet in order to continue, but the resulting bin/CU2 set might not work as expected or not at all. If possible, please try a Redump compatible version of this image')
+                _log_error('WARNING', f'The PREGAP command is used for track {str(track_number)}, which requires the software to insert data into the image or disc. This is not supported by Cue2cu2. The pregap will be ignored and a zero length pregap will be noted in the CU2 sheet in order to continue, but the resulting bin/CU2 set might not work as expected or not at all. If possible, please try a Redump compatible version of this image')
                 pregap_command_used_before = bool(True)
             elif pregap_command_used_before == True:
-                _log_error('WARNING', f'The PREGAP command is also used for track {str(track)}.')
-            if compile('.*[Ii][Nn][Dd][Ee][Xx] 0?1.*').match(cuesheet_content[current_track_in_cuesheet+2]):
-                pregap_position = cuesheet_content[current_track_in_cuesheet+2][::-1][:8][::-1][:9]
-
-                # Add the famous two second offset for PSIO and convert to alternative notation used by Systems Console for tracks
-                pregap_position = _convert_sectors_to_timecode_with_alternative_notation(_convert_timecode_to_sectors(_timecode_addition(pregap_position,"00:02:00")))
-                output = f'{output}pregap{str(track).zfill(2)}  {pregap_position}\r\n'
+                _log_error('WARNING', f'The PREGAP command is also used for track {str(track_number)}.')
+            if start_index is not None:
+                pregap_position = _convert_sectors_to_timecode_with_alternative_notation(_sectors_addition(file_start + start_index.file_offset, psio_offset))
+                output = f'{output}pregap{str(track_number).zfill(2)}  {pregap_position}\r\n'
 
         elif format_revision == int(2):
-            _log_error('ERROR', f'Could not find pregap position (index 00) for track {str(track)} in cue sheet: {str(cuesheet)}')
+            _log_error('ERROR', f'Could not find pregap position (index 00) for track {str(track_number)} in cue sheet: {str(cuesheet)}')
             return False
 
-        # Else-If is it index 01? If so, output track start, or get it from the following line
-        if compile('.*[Ii][Nn][Dd][Ee][Xx] 0?1.*').match(cuesheet_content[current_track_in_cuesheet+1]):
-            track_position = cuesheet_content[current_track_in_cuesheet+1][::-1][:8][::-1][:9] # I have no idea what I'm doing
-        elif compile('.*[Ii][Nn][Dd][Ee][Xx] 0?1.*').match(cuesheet_content[current_track_in_cuesheet+2]):
-            track_position = cuesheet_content[current_track_in_cuesheet+2][::-1][:8][::-1][:9]
-        else:
-            _log_error('ERROR', f'Could not find starting position (index 01) for track {str(track)} in cue sheet: {str(cuesheet)}')
+        # The track start is always index 01
+        if start_index is None:
+            _log_error('ERROR', f'Could not find starting position (index 01) for track {str(track_number)} in cue sheet: {str(cuesheet)}')
             return False
 
-        # Add the famous two second offset for PSIO and convert to alternative notation used by Systems Console for tracks
-        track_position = _convert_sectors_to_timecode_with_alternative_notation(_convert_timecode_to_sectors(_timecode_addition(track_position,"00:02:00")))
-        output = f'{output}track{str(track).zfill(2)}   {track_position}\r\n'
+        track_position = _convert_sectors_to_timecode_with_alternative_notation(_sectors_addition(file_start + start_index.file_offset, psio_offset))
+        output = f'{output}track{str(track_number).zfill(2)}   {track_position}\r\n'
 
     # Add the end for the last track
-    track_end = _convert_sectors_to_timecode_with_alternative_notation(_convert_timecode_to_sectors(_timecode_addition(size,'00:02:00')))
+    track_end = _convert_sectors_to_timecode_with_alternative_notation(_sectors_addition(sectors, psio_offset))
     output = f'{output}\r\ntrk end   {track_end}'
 
     # *********************************************
@@ -235,9 +208,8 @@ def start_cue2cu2(cuesheet, binaryfile_name):
     # Derive the file name from the binary file's filename
     cu2sheet = binaryfile[::-1][4:][::-1]+'.cu2'
     try:
-        cu2file = open(cu2sheet,'wb')
-        cu2file.write(output.encode())
-        cu2file.close
+        with open(cu2sheet, 'wb') as cu2file:
+            cu2file.write(output.encode())
     except IOError:
         _log_error('ERROR', f'Could not write to: {str(cu2sheet)}')
         return False
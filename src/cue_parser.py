@@ -0,0 +1,333 @@
+'''
+Cue sheet parser
+Parses a cue sheet once into an immutable model that is shared by the game scan, binmerge and cue2cu2
+
+The parser does not use any global state, so cue sheets can safely be parsed from multiple threads
+All sector positions are stored as integers, so no floating point maths is needed anywhere
+
+WAVE files are accepted as audio tracks, only their RIFF header is read. The size of a WAVE file in the model is
+the size of its PCM data padded to whole sectors, which is the size it takes up once it is merged into a BIN file
+'''
+
+from os import stat
+from os.path import join, dirname, basename, splitext
+from re import compile, IGNORECASE
+from struct import unpack, unpack_from
+from typing import NamedTuple, Optional, Tuple
+
+# All possible blocksize types. You cannot mix types on a disc, so the first one we see is locked in
+BLOCK_SIZES = {
+    'AUDIO': 2352,
+    'MODE1/2352': 2352,
+    'MODE2/2352': 2352,
+    'CDI/2352': 2352,
+    'CDG': 2448,
+    'MODE1/2048': 2048,
+    'MODE2/2336': 2336,
+    'CDI/2336': 2336,
+}
+DEFAULT_BLOCK_SIZE = 2352
+SECTORS_PER_SECOND = 75
+
+_FILE_PATTERN = compile(r'FILE "?(.*?)"? (BINARY|WAVE)', IGNORECASE)
+_TRACK_PATTERN = compile(r'TRACK (\d+) ([^\s]*)', IGNORECASE)
+_INDEX_PATTERN = compile(r'INDEX (\d+) (\d+:\d+:\d+)', IGNORECASE)
+_PREGAP_PATTERN = compile(r'PREGAP (\d+:\d+:\d+)', IGNORECASE)
+_STAMP_PATTERN = compile(r'(\d+):(\d+):(\d+)')
+
+# Red Book audio, the only format that can be merged into a BIN file without converting it
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+CD_AUDIO_SAMPLE_RATE = 44100
+CD_AUDIO_CHANNELS = 2
+CD_AUDIO_BITS_PER_SAMPLE = 16
+
+
+# ************************************************************************************
+class WaveInfo(NamedTuple):
+    """The format of a WAVE file and the position of its PCM data"""
+    format_tag: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def is_cd_audio(self) -> bool:
+        """True for 44.1 kHz, 16-bit, stereo PCM"""
+        return (self.format_tag == WAVE_FORMAT_PCM and self.channels == CD_AUDIO_CHANNELS
+                and self.sample_rate == CD_AUDIO_SAMPLE_RATE and self.bits_per_sample == CD_AUDIO_BITS_PER_SAMPLE)
+# ************************************************************************************
+
+
+# ************************************************************************************
+class CueIndex(NamedTuple):
+    """An index within a track, the offset is in sectors from the start of the file"""
+    number: int
+    stamp: str
+    file_offset: int
+# ************************************************************************************
+
+
+# ************************************************************************************
+class CueTrack(NamedTuple):
+    """A track within a binary file"""
+    number: int
+    track_type: str
+    indexes: Tuple[CueIndex, ...]
+    pregap: Optional[int] = None
+
+    def get_index(self, number: int) -> Optional[CueIndex]:
+        """Return the index with the specified number, if the track has one"""
+        for index in self.indexes:
+            if index.number == number:
+                return index
+        return None
+# ************************************************************************************
+
+
+# ************************************************************************************
+class CueFile(NamedTuple):
+    """
+    A binary (or WAVE) file with its associated tracks
+    For a WAVE file the size is that of its PCM data padded to whole sectors, the data starts at data_offset in the file
+    """
+    filename: str
+    size: int
+    tracks: Tuple[CueTrack, ...]
+    file_type: str = 'BINARY'
+    data_offset: int = 0
+    data_size: Optional[int] = None
+# ************************************************************************************
+
+
+# ************************************************************************************
+class CueSheetData(NamedTuple):
+    """
+    A parsed cue sheet, with every binary file it references that exists on disk
+    invalid_files are the WAVE files that exist but are not CD audio, so they can not be merged
+    """
+    cue_path: str
+    files: Tuple[CueFile, ...]
+    block_size: int
+    missing_files: Tuple[str, ...]
+    invalid_files: Tuple[str, ...] = ()
+
+    @property
+    def complete(self) -> bool:
+        """True when every binary file referenced in the cue sheet exists (and every WAVE file is CD audio)"""
+        return not self.missing_files and not self.invalid_files
+
+    @property
+    def tracks(self) -> Tuple[CueTrack, ...]:
+        """All of the tracks in the cue sheet, in order"""
+        return tuple(track for cue_file in self.files for track in cue_file.tracks)
+
+    @property
+    def track_count(self) -> int:
+        return len(self.tracks)
+
+    @property
+    def has_audio(self) -> bool:
+        return any(track.track_type.upper() == 'AUDIO' for track in self.tracks)
+
+    @property
+    def uses_cdda(self) -> bool:
+        """CDDA is indicated by multiple tracks with at least one AUDIO track"""
+        return self.track_count > 1 and self.has_audio
+
+    @property
+    def is_mode2_2352(self) -> bool:
+        return any(track.track_type.upper() == 'MODE2/2352' for track in self.tracks)
+
+    @property
+    def total_sectors(self) -> int:
+        return sum(cue_file.size // self.block_size for cue_file in self.files)
+
+    def file_start_sectors(self) -> Tuple[int, ...]:
+        """The absolute sector that each binary file would start at once the files are merged"""
+        starts = []
+        sector_pos = 0
+        for cue_file in self.files:
+            starts.append(sector_pos)
+            sector_pos += cue_file.size // self.block_size
+        return tuple(starts)
+
+    def get_game_name(self, include_track: bool = False) -> str:
+        """Get the game name from the first binary file in the cue sheet"""
+        if not self.files or not self.complete:
+            return ''
+
+        game_name = basename(self.files[0].filename)
+        if not include_track and 'Track' in game_name:
+            game_name = game_name[:game_name.rfind('(', 0) -1]
+        return splitext(game_name)[0]
+# ************************************************************************************
+
+
+# ************************************************************************************
+def cuestamp_to_sectors(stamp: str) -> int:
+    """Convert a cue sheet timestamp (MM:SS:FF) to sectors"""
+    m = _STAMP_PATTERN.match(stamp)
+    minutes = int(m.group(1))
+    seconds = int(m.group(2))
+    fields = int(m.group(3))
+    return fields + (seconds * SECTORS_PER_SECOND) + (minutes * 60 * SECTORS_PER_SECOND)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def sectors_to_cuestamp(sectors: int) -> str:
+    """Convert sectors to a cue sheet timestamp (MM:SS:FF)"""
+    total_seconds, fields = divmod(int(sectors), SECTORS_PER_SECOND)
+    minutes, seconds = divmod(total_seconds, 60)
+    return '%02d:%02d:%02d' % (minutes, seconds, fields)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _file_size(path: str, snapshot=None) -> Optional[int]:
+    """Return the size of a readable file, or None if it does not exist"""
+    if snapshot is not None:
+        st = snapshot.stat_path(path)
+        return st.st_size if st is not None else None
+
+    try:
+        return stat(path).st_size
+    except OSError:
+        return None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _resolve_bin_file(cue_dir: str, file_name: str, snapshot=None):
+    """Find the binary file referenced by a FILE line, allowing for common naming mismatches"""
+    for candidate in (file_name, file_name.replace(' (Track 01)', ''), file_name.replace(' (Track 1)', '')):
+        path = join(cue_dir, candidate)
+        size = _file_size(path, snapshot)
+        if size is not None:
+            return path, size
+    return None, None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def read_wave_header(path: str) -> Optional[WaveInfo]:
+    """
+    Read the format and the position of the PCM data from the RIFF header of a WAVE file, without reading the data
+    Returns None if the file is not a WAVE file or has no data chunk
+    """
+    try:
+        with open(path, 'rb') as wave_file:
+            file_size = stat(path).st_size
+            header = wave_file.read(12)
+            if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                return None
+
+            wave_format = None
+            while True:
+                chunk_header = wave_file.read(8)
+                if len(chunk_header) < 8:
+                    return None
+                chunk_id, chunk_size = chunk_header[:4], unpack('<I', chunk_header[4:])[0]
+
+                if chunk_id == b'fmt ':
+                    chunk = wave_file.read(chunk_size)
+                    if len(chunk) < 16:
+                        return None
+                    format_tag, channels, sample_rate, _, _, bits_per_sample = unpack_from('<HHIIHH', chunk)
+
+                    # The extensible format holds the real format tag at the start of its sub-format GUID
+                    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(chunk) >= 26:
+                        format_tag = unpack_from('<H', chunk, 24)[0]
+                    wave_format = (format_tag, channels, sample_rate, bits_per_sample)
+                    wave_file.seek(chunk_size & 1, 1)
+                elif chunk_id == b'data':
+                    if wave_format is None:
+                        return None
+                    data_offset = wave_file.tell()
+                    return WaveInfo(*wave_format, data_offset, min(chunk_size, file_size - data_offset))
+                else:
+                    # Chunks are padded to an even size
+                    wave_file.seek(chunk_size + (chunk_size & 1), 1)
+    except OSError:
+        return None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def parse_cue_sheet(cue_path: str, snapshot=None) -> CueSheetData:
+    """
+    Read and parse a cue sheet in a single pass
+    If a DirectorySnapshot of the cue sheet directory is passed, the binary files are looked up in it
+    """
+    cue_dir = dirname(cue_path)
+    files = []
+    missing_files = []
+    invalid_files = []
+    block_size = None
+
+    # The file and track currently being built, these are frozen once the next one starts
+    file_path, file_size, file_tracks = None, None, []
+    file_type, wave_info = 'BINARY', None
+    track = None
+
+    def finish_track():
+        nonlocal track
+        if track is not None:
+            file_tracks.append(CueTrack(track['number'], track['track_type'], tuple(track['indexes']), track['pregap']))
+            track = None
+
+    def finish_file():
+        nonlocal file_path, file_tracks
+        finish_track()
+        if file_path is not None:
+            if wave_info is not None:
+                # The PCM data is padded to whole sectors when it is merged
+                sector_size = BLOCK_SIZES['AUDIO']
+                padded_size = -(-wave_info.data_size // sector_size) * sector_size
+                files.append(CueFile(file_path, padded_size, tuple(file_tracks), file_type, wave_info.data_offset, wave_info.data_size))
+            else:
+                files.append(CueFile(file_path, file_size, tuple(file_tracks)))
+        file_path, file_tracks = None, []
+
+    with open(cue_path, 'r', encoding='utf-8') as cue_file:
+        for line in cue_file:
+            m = _FILE_PATTERN.search(line)
+            if m:
+                finish_file()
+                file_path, file_size = _resolve_bin_file(cue_dir, m.group(1), snapshot)
+                file_type, wave_info = m.group(2).upper(), None
+                if file_path is None:
+                    missing_files.append(m.group(1))
+                elif file_type == 'WAVE':
+                    wave_info = read_wave_header(file_path)
+                    if wave_info is None or not wave_info.is_cd_audio:
+                        invalid_files.append(m.group(1))
+                        file_path = None
+                continue
+
+            m = _TRACK_PATTERN.search(line)
+            if m:
+                finish_track()
+                if file_path is not None:
+                    track_type = m.group(2).upper()
+                    if block_size is None:
+                        block_size = BLOCK_SIZES.get(track_type)
+                    track = {'number': int(m.group(1)), 'track_type': track_type, 'indexes': [], 'pregap': None}
+                continue
+
+            m = _INDEX_PATTERN.search(line)
+            if m and track is not None:
+                track['indexes'].append(CueIndex(int(m.group(1)), m.group(2), cuestamp_to_sectors(m.group(2))))
+                continue
+
+            m = _PREGAP_PATTERN.search(line)
+            if m and track is not None:
+                track['pregap'] = cuestamp_to_sectors(m.group(1))
+
+    finish_file()
+
+    return CueSheetData(cue_path, tuple(files), block_size or DEFAULT_BLOCK_SIZE, tuple(missing_files), tuple(invalid_files))
+# ************************************************************************************
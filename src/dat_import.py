@@ -0,0 +1,228 @@
+'''
+Redump DAT importer
+Refreshes the local Sqlite3 database from a Redump (or PSX DataCenter) XML DAT file
+
+The DAT is streamed with iterparse and each game element is cleared once it has been read,
+so the memory used stays the same no matter how large the DAT is
+Every change is written in a single transaction, so a failed import leaves the database unchanged
+
+Games are matched by their serial(s) when the DAT has them, otherwise by their Redump name
+The size and hashes of each track are stored in the game_tracks table, for verifying merged BIN files
+'''
+
+from contextlib import closing, contextmanager
+from os.path import splitext
+from re import compile, IGNORECASE
+from sqlite3 import Error
+from typing import NamedTuple
+from xml.etree.ElementTree import iterparse, ParseError
+from zipfile import ZipFile, is_zipfile
+
+import db
+
+_DISC_NUMBER_PATTERN = compile(r'\(Disc\s*(\d+)\)', IGNORECASE)
+_SERIAL_SEPARATOR_PATTERN = compile(r'[,/\s]+')
+
+# The games are written to the database in batches of this size
+IMPORT_BATCH_SIZE = 500
+
+
+# ************************************************************************************
+class DatGame(NamedTuple):
+    """A game read from a DAT file"""
+    name: str
+    serials: tuple
+    disc_number: int
+    libcrypt: bool
+    tracks: tuple
+# ************************************************************************************
+
+
+# ************************************************************************************
+class ImportSummary(NamedTuple):
+    """The number of rows changed by an import"""
+    games_read: int
+    games_updated: int
+    games_added: int
+    games_skipped: int
+    tracks: int
+# ************************************************************************************
+
+
+# ************************************************************************************
+@contextmanager
+def _open_dat(dat_path: str):
+    """Open a DAT file, or the first DAT file inside a zip archive, the file and archive are both closed on exit"""
+    if is_zipfile(dat_path):
+        with ZipFile(dat_path) as archive:
+            dat_names = [name for name in archive.namelist() if name.lower().endswith(('.dat', '.xml'))]
+            if not dat_names:
+                raise ValueError(f'No DAT file found in {dat_path}')
+            with archive.open(dat_names[0]) as dat_file:
+                yield dat_file
+        return
+
+    with open(dat_path, 'rb') as dat_file:
+        yield dat_file
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _read_serials(game_element) -> tuple:
+    """Read the serials of a game, from either a serial attribute or serial elements"""
+    values = [game_element.get('serial', '')] + [element.text or '' for element in game_element.iter('serial')]
+
+    serials = []
+    for value in values:
+        for serial in _SERIAL_SEPARATOR_PATTERN.split(value.strip()):
+            if serial:
+                game_key = db.normalize_game_id(serial)
+                if game_key not in serials:
+                    serials.append(game_key)
+    return tuple(serials)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _read_game(game_element) -> DatGame:
+    """Read a game element into a DatGame"""
+    name = game_element.get('name', '').strip()
+    m = _DISC_NUMBER_PATTERN.search(name)
+    disc_number = int(m.group(1)) if m else 0
+
+    tracks = []
+    libcrypt = False
+    for rom in game_element.iter('rom'):
+        rom_name = rom.get('name', '')
+        extension = splitext(rom_name)[1].lower()
+
+        # LibCrypt games have an SBI subchannel file in the DAT
+        if extension == '.sbi':
+            libcrypt = True
+        elif extension == '.bin':
+            size = rom.get('size')
+            tracks.append((rom_name, int(size) if size and size.isdigit() else None,
+                           (rom.get('crc') or '').lower() or None, (rom.get('md5') or '').lower() or None,
+                           (rom.get('sha1') or '').lower() or None))
+
+    return DatGame(name, _read_serials(game_element), disc_number, libcrypt, tuple(tracks))
+# ************************************************************************************
+
+
+# ************************************************************************************
+def iter_dat_games(dat_path: str):
+    """Yield each game in a DAT file, reading the file as a stream"""
+    with _open_dat(dat_path) as dat_file:
+        context = iterparse(dat_file, events=('start', 'end'))
+        try:
+            _, root = next(context)
+        except StopIteration:
+            return
+        for event, element in context:
+            if event == 'end' and element.tag in ('game', 'machine'):
+                yield _read_game(element)
+
+                # Drop the game element, and the reference the root element holds to it
+                element.clear()
+                root.clear()
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _write_games(conn, games: list, keys_by_name: dict) -> tuple:
+    """Write a batch of games to the database, returning the number of games updated, added and skipped, and the tracks written"""
+    updated = added = skipped = tracks = 0
+
+    for game in games:
+        game_keys = game.serials or keys_by_name.get(game.name, ())
+        if not game_keys:
+            skipped += 1
+            continue
+
+        for game_key in game_keys:
+            # Only the name and disc number come from the DAT, the LibCrypt flag is only ever set, never cleared
+            cursor = conn.execute('UPDATE games SET name = ?, disc_number = ?, libcrypt = CASE WHEN ? THEN 1 ELSE libcrypt END WHERE game_key = ?;',
+                                  (game.name, game.disc_number, game.libcrypt, game_key))
+            if cursor.rowcount:
+                updated += 1
+            else:
+                conn.execute('INSERT INTO games (game_id, name, disc_number, libcrypt, game_key) VALUES (?, ?, ?, ?, ?);',
+                             (game_key, game.name, game.disc_number, int(game.libcrypt), game_key))
+                added += 1
+
+            # The disc set is cleared first, so a game whose disc number is now 0 is removed from its set
+            conn.execute('DELETE FROM disc_sets WHERE game_key = ?;', (game_key,))
+            if game.disc_number > 0:
+                conn.execute('INSERT OR REPLACE INTO disc_sets (game_key, set_id, disc_order) VALUES (?, ?, ?);',
+                             (game_key, db.disc_set_id(game.name), game.disc_number))
+
+            if game.tracks:
+                conn.execute('DELETE FROM game_tracks WHERE game_key = ?;', (game_key,))
+                conn.executemany('INSERT INTO game_tracks (game_key, name, size, crc, md5, sha1) VALUES (?, ?, ?, ?, ?, ?);',
+                                 [(game_key,) + track for track in game.tracks])
+                tracks += len(game.tracks)
+
+    return updated, added, skipped, tracks
+# ************************************************************************************
+
+
+# ************************************************************************************
+def import_redump_dat(dat_path: str, progress=None) -> ImportSummary:
+    """
+    Import a Redump DAT file into the local database in a single transaction
+    The database must have been set with db.set_database_path, it is migrated first if needed
+    progress is called with the number of games read after each batch
+    """
+    if not db.migrate_database():
+        raise ValueError('The database could not be migrated to the current schema version')
+
+    conn = db.open_database_for_writing()
+    if conn is None:
+        raise ValueError(f'Unable to open the database: {db.DATABASE_FULL_PATH}')
+
+    games_read = updated = added = skipped = tracks = 0
+    try:
+        # Games in a DAT without serials are matched by their name, the names are read once up front
+        keys_by_name = {}
+        for game_key, name in conn.execute('SELECT game_key, name FROM games WHERE game_key IS NOT NULL;'):
+            keys = keys_by_name.setdefault(name, ())
+            if game_key not in keys:
+                keys_by_name[name] = keys + (game_key,)
+
+        conn.isolation_level = None
+        conn.execute('BEGIN')
+
+        # The generator is closed even if the import fails, so the DAT file and zip archive are always closed
+        batch = []
+        with closing(iter_dat_games(dat_path)) as dat_games:
+            for game in dat_games:
+                batch.append(game)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    counts = _write_games(conn, batch, keys_by_name)
+                    updated, added, skipped, tracks = [total + count for total, count in zip((updated, added, skipped, tracks), counts)]
+                    games_read += len(batch)
+                    batch = []
+                    if progress:
+                        progress(games_read)
+
+        counts = _write_games(conn, batch, keys_by_name)
+        updated, added, skipped, tracks = [total + count for total, count in zip((updated, added, skipped, tracks), counts)]
+        games_read += len(batch)
+
+        # The names have changed, so the trigram index is rebuilt within the same transaction
+        db.build_name_index(conn)
+
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE;')
+    except (Error, ParseError, ValueError, OSError):
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+        # The pooled connections were opened on the database before it was changed
+        db.close_connections()
+
+    return ImportSummary(games_read, updated, added, skipped, tracks)
+# ************************************************************************************
@@ -5,61 +5,243 @@ The application uses a local Sqlite3 database to store game names and game cover
 The local database file has been split into 4 separate files in the repo
 This is due to the 100MB file size limit in GitHub
 The application will merge the split database files into a single file when it is launched
+The split files are streamed into a temporary file, checked against the shipped SHA-256 checksum
+and then renamed into place, so a partly merged database file is never left behind
+
+Each thread keeps its own read-only connection to the database, which is reused for every query
+All queries are parameterized, so SQLite can reuse the prepared statements between lookups
+
+Blobs can optionally be stored compressed with zlib or lzma, compressed blobs start with a magic
+prefix and are decompressed transparently when they are extracted, raw blobs are written as they are
+
+When the database is first used it is migrated once, adding a normalized game_key column, covering
+indexes, the disc_sets table of multi-disc games, the game_tracks table of Redump track hashes
+and a trigram index of the game names, the schema version is stored in PRAGMA user_version
+
+Games without a detectable ID can be found by name, the trigrams of the name are looked up in the
+index and the candidates are ranked by their Dice similarity to the name
 '''
 
-from sys import exit
-from os import remove, makedirs
-from os.path import exists, join, getsize
+from hashlib import sha256
+from lzma import LZMADecompressor, LZMAError, compress as lzma_compress
+from zlib import decompressobj, compress as zlib_compress, error as ZlibError
+from os import remove, makedirs, replace, fsync
+from os.path import exists, join, getsize, abspath, basename, dirname
+from re import compile, IGNORECASE
+from shutil import copyfile
 from sqlite3 import connect, Error
+from threading import local, Lock, current_thread
+from typing import NamedTuple
 from pathlib2 import Path
 
 DATABASE_PATH = None
 DATABASE_FILE = None
 DATABASE_FULL_PATH = None
 
+# The database bundled with an exe, which is extracted to a new temporary directory on every run. It is copied to
+# DATABASE_FULL_PATH (next to the exe), so it is only migrated once, and copied again when a new version is bundled
+BUNDLED_DATABASE_PATH = None
+BUNDLED_CHECKSUM_SUFFIX = '.bundled.sha256'
+
+# The split files are merged in chunks of this size, so the memory used does not depend on the database size
+MERGE_CHUNK_SIZE = 4 * 1024 * 1024
+DATABASE_SPLIT_COUNT = 4
+DATABASE_CHECKSUM_FILE = 'psio_assist_db.sha256'
+
+# Pragmas applied to every read-only connection, the database is memory mapped and given a larger page cache
+CONNECTION_PRAGMAS = (
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA cache_size = -16384',
+    'PRAGMA temp_store = MEMORY',
+)
+
+# The read-only connection of each thread, every connection is also registered so they can all be closed
+_THREAD_CONNECTIONS = local()
+_OPEN_CONNECTIONS = []
+_CONNECTIONS_LOCK = Lock()
+_CONNECTION_GENERATION = 0
+
+# Compressed blobs start with one of these prefixes, raw BMP and PPF data never does
+ZLIB_BLOB_MAGIC = b'PSZ1'
+LZMA_BLOB_MAGIC = b'PSX1'
+BLOB_CHUNK_SIZE = 64 * 1024
+
+# The schema version written by migrate_database, and the tables that are looked up by game ID
+SCHEMA_VERSION = 4
+GAME_ID_TABLES = ('games', 'covers', 'libcrypt_patches')
+
+# The indexes cover every column the lookups read, so a lookup never has to visit the table rows
+SCHEMA_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_games_game_key ON games (game_key, name, disc_number, libcrypt)',
+    'CREATE INDEX IF NOT EXISTS idx_covers_game_key ON covers (game_key, id)',
+    'CREATE INDEX IF NOT EXISTS idx_libcrypt_patches_game_key ON libcrypt_patches (game_key, id)',
+)
+
+# The schema version of the database in use, the lookups only use the columns and tables that it has
+# The column used for game ID lookups is only changed to game_key once the database has been migrated
+DATABASE_SCHEMA_VERSION = 0
+GAME_KEY_COLUMN = 'game_id'
+
+# Matches the disc number in a Redump name, e.g. "Final Fantasy IX (Europe) (Disc 1)"
+_DISC_NAME_PATTERN = compile(r'\s*\(Disc\s*\d+\)', IGNORECASE)
+
+# Names are compared without their bracketed tags (region, disc, language) or punctuation
+_NAME_TAG_PATTERN = compile(r'\([^)]*\)|\[[^\]]*\]')
+_NAME_SEPARATOR_PATTERN = compile(r'[^a-z0-9]+')
+
+# Number of candidates that are ranked in full for each name search
+NAME_SEARCH_CANDIDATES = 50
+
+# Maximum number of IDs in a single IN list, the SQLite default limit is 999 parameters per query
+BULK_QUERY_CHUNK_SIZE = 500
+
+
+# ************************************************************************************
+def _split_paths():
+    """Get the paths of the database split-files, in order"""
+    return [join(DATABASE_PATH, f'psio_assist_db_part_{i}') for i in range(1, DATABASE_SPLIT_COUNT + 1)]
+# ************************************************************************************
+
 
 # ************************************************************************************
 def _split_database():
-    """Splits the database file into 4 equal parts"""
+    """Splits the database file into 4 equal parts, and writes the checksum that is verified when they are merged"""
     # Create output directory if it doesn't exist
     if not exists(DATABASE_PATH):
         makedirs(DATABASE_PATH)
 
     # Get file size
     file_size = getsize(DATABASE_FULL_PATH)
-    chunk_size = file_size // 4
+    split_size = file_size // DATABASE_SPLIT_COUNT
+    digest = sha256()
 
     # Read input file in binary mode
     with open(DATABASE_FULL_PATH, 'rb') as f:
-        for i in range(4):
-            # Calculate size for this chunk (last chunk might be slightly larger)
-            if i == 3:
-                chunk_size = file_size - (chunk_size * 3)
+        for i, output_path in enumerate(_split_paths()):
+            # Calculate size for this split (last split might be slightly larger)
+            remaining = split_size if i < DATABASE_SPLIT_COUNT - 1 else file_size - (split_size * i)
 
-            # Read chunk data
-            chunk_data = f.read(chunk_size)
+            # Copy the split in chunks
+            with open(output_path, 'wb') as split_file:
+                while remaining > 0:
+                    chunk_data = f.read(min(MERGE_CHUNK_SIZE, remaining))
+                    if not chunk_data:
+                        break
+                    split_file.write(chunk_data)
+                    digest.update(chunk_data)
+                    remaining -= len(chunk_data)
 
-            # Write chunk to new file
-            output_path = join(DATABASE_PATH, f'psio_assist_db_part_{i+1}')
-            with open(output_path, 'wb') as chunk_file:
-                chunk_file.write(chunk_data)
+    with open(join(DATABASE_PATH, DATABASE_CHECKSUM_FILE), 'w') as checksum_file:
+        checksum_file.write(f'{digest.hexdigest()}  {DATABASE_FILE}\n')
 # ************************************************************************************
 
 
 # ************************************************************************************
-def _merge_database():
-    """Merges the 4 split database files back into a single file"""
-    # Open output file in binary write mode
-    with open(DATABASE_FULL_PATH, 'wb') as outfile:
-        # Merge files in order (part_1 to part_4)
-        for i in range(1, 5):
-            part_path = join(DATABASE_PATH, f'psio_assist_db_part_{i}')
-            if not exists(part_path):
-                raise FileNotFoundError(f"Part file {part_path} not found")
+def split_database():
+    """Split the database into the split-files that are committed to the repo, and write their checksum"""
+    _split_database()
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _file_checksum(file_path: str) -> str:
+    """Get the SHA-256 checksum of a file, reading it in chunks"""
+    digest = sha256()
+    with open(file_path, 'rb') as in_file:
+        for chunk in iter(lambda: in_file.read(MERGE_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+# ************************************************************************************
 
-            # Read and write each part
-            with open(part_path, 'rb') as infile:
-                outfile.write(infile.read())
+
+# ************************************************************************************
+def _copy_bundled_database():
+    """
+    Copy the bundled database to the database path, unless it has already been copied from the same bundled database
+    The checksum of the bundled database is stored next to the copy, the copy is migrated in place after it is made
+    """
+    checksum_path = f'{DATABASE_FULL_PATH}{BUNDLED_CHECKSUM_SUFFIX}'
+    bundled_checksum = _file_checksum(BUNDLED_DATABASE_PATH)
+    if exists(DATABASE_FULL_PATH) and exists(checksum_path):
+        with open(checksum_path, 'r') as checksum_file:
+            if checksum_file.read().strip() == bundled_checksum:
+                return
+
+    if not exists(DATABASE_PATH):
+        makedirs(DATABASE_PATH)
+
+    # Connections to the old copy must be closed before it is replaced
+    close_connections()
+    temp_path = f'{DATABASE_FULL_PATH}.partial'
+    copyfile(BUNDLED_DATABASE_PATH, temp_path)
+    replace(temp_path, DATABASE_FULL_PATH)
+    _set_schema_version(0)
+    with open(checksum_path, 'w') as checksum_file:
+        checksum_file.write(f'{bundled_checksum}\n')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _expected_checksum():
+    """Read the SHA-256 checksum that is shipped with the split-files, or None if there is no checksum file"""
+    checksum_path = join(DATABASE_PATH, DATABASE_CHECKSUM_FILE)
+    if not exists(checksum_path):
+        return None
+
+    with open(checksum_path, 'r') as checksum_file:
+        fields = checksum_file.read().split()
+    return fields[0].lower() if fields else None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _merge_database(progress=None):
+    """
+    Merges the 4 split database files back into a single file
+    The split-files are streamed into a temporary file, which is only renamed to the database file once
+    its checksum has been verified. progress is called with the bytes copied and the total size
+    """
+    split_paths = _split_paths()
+    for split_path in split_paths:
+        if not exists(split_path):
+            raise FileNotFoundError(f"Part file {split_path} not found")
+
+    total_size = sum(getsize(split_path) for split_path in split_paths)
+    temp_path = f'{DATABASE_FULL_PATH}.partial'
+    digest = sha256()
+    buffer = bytearray(MERGE_CHUNK_SIZE)
+    view = memoryview(buffer)
+    copied = 0
+
+    try:
+        with open(temp_path, 'wb') as outfile:
+            # Merge files in order (part_1 to part_4), reusing the same buffer for every chunk
+            for split_path in split_paths:
+                with open(split_path, 'rb') as infile:
+                    while True:
+                        length = infile.readinto(buffer)
+                        if not length:
+                            break
+                        outfile.write(view[:length])
+                        digest.update(view[:length])
+                        copied += length
+                        if progress:
+                            progress(copied, total_size)
+
+            outfile.flush()
+            fsync(outfile.fileno())
+
+        # The merged database is only used if it can be verified, a missing checksum file is treated as a mismatch
+        expected_checksum = _expected_checksum()
+        if expected_checksum is None:
+            raise ValueError(f'Database checksum file {DATABASE_CHECKSUM_FILE} not found, the merged database can not be verified')
+        if digest.hexdigest() != expected_checksum:
+            raise ValueError(f'Database checksum mismatch, expected {expected_checksum} but got {digest.hexdigest()}')
+
+        replace(temp_path, DATABASE_FULL_PATH)
+    finally:
+        if exists(temp_path):
+            remove(temp_path)
 
     # Delete the split files after merging
     _delete_database_splits()
@@ -69,28 +251,33 @@ def _merge_database():
 # ************************************************************************************
 def _database_splits_exist():
     """Checks if each of the database split-files exist"""
-    for i in range(1,5):
-        if not exists(join(DATABASE_PATH, f'psio_assist_db_part_{i}')):
-            return False
-    return True
+    return all(exists(split_path) for split_path in _split_paths())
 # ************************************************************************************
 
 
 # ************************************************************************************
 def _delete_database_splits():
     """Delete the database split-files"""
-    for i in range(1,5):
-        if exists(join(DATABASE_PATH, f'psio_assist_db_part_{i}')):
-            remove(join(DATABASE_PATH, f'psio_assist_db_part_{i}'))
+    for split_path in _split_paths():
+        if exists(split_path):
+            remove(split_path)
 # ************************************************************************************
 
 
 # ************************************************************************************
-def _create_connection(db_file):
-    """Establish a connection with the local Sqlite3 database"""
+def _create_connection(db_file, read_only: bool = True):
+    """
+    Establish a connection with the local Sqlite3 database
+    Read-only connections open the file as immutable, so SQLite can skip all file locking
+    """
     conn = None
     try:
-        conn = connect(db_file)
+        if read_only:
+            conn = connect(f'{Path(abspath(db_file)).as_uri()}?mode=ro&immutable=1', uri=True, check_same_thread=False)
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+        else:
+            conn = connect(db_file)
         return conn
     except Error as error:
         print(error)
@@ -100,44 +287,302 @@ def _create_connection(db_file):
 
 
 # ************************************************************************************
-def _extract_game_cover_blob(row_id, image_out_path: str):
-    """Extract the game cover art data from the local database"""
+def open_database_for_writing():
+    """Open a writable connection to the local database, for the tools that update it, or None if it can not be opened"""
+    return _create_connection(DATABASE_FULL_PATH, read_only=False)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _get_connection():
+    """Get the read-only connection of the current thread, opening it the first time it is needed"""
+    cached = getattr(_THREAD_CONNECTIONS, 'connection', None)
+    if cached is not None and cached[0] == _CONNECTION_GENERATION:
+        return cached[1]
+
+    conn = _create_connection(DATABASE_FULL_PATH)
+    if conn is None:
+        return None
+
+    with _CONNECTIONS_LOCK:
+        # Close the connections of threads that have finished, such as earlier scan threads
+        for thread, open_conn in [entry for entry in _OPEN_CONNECTIONS if not entry[0].is_alive()]:
+            open_conn.close()
+            _OPEN_CONNECTIONS.remove((thread, open_conn))
+
+        _OPEN_CONNECTIONS.append((current_thread(), conn))
+        _THREAD_CONNECTIONS.connection = (_CONNECTION_GENERATION, conn)
+    return conn
+# ************************************************************************************
+
+
+# ************************************************************************************
+def close_connections():
+    """
+    Close every pooled connection, each thread opens a new connection on its next query
+    This must be called after the database file has been replaced or modified
+    """
+    global _CONNECTION_GENERATION
+    with _CONNECTIONS_LOCK:
+        _CONNECTION_GENERATION += 1
+        for _, conn in _OPEN_CONNECTIONS:
+            try:
+                conn.close()
+            except Error:
+                pass
+        _OPEN_CONNECTIONS.clear()
+# ************************************************************************************
+
+
+# ************************************************************************************
+def compress_blob(blob_data: bytes, method: str = 'lzma') -> bytes:
+    """Compress blob data, adding the magic prefix so that it is decompressed when it is extracted"""
+    if method == 'zlib':
+        return ZLIB_BLOB_MAGIC + zlib_compress(blob_data, 9)
+    if method == 'lzma':
+        return LZMA_BLOB_MAGIC + lzma_compress(blob_data, preset=9)
+    raise ValueError(f'Unknown compression method: {method}')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def is_compressed_blob(blob_data: bytes) -> bool:
+    """Check if blob data was compressed by compress_blob"""
+    return blob_data[:4] in (ZLIB_BLOB_MAGIC, LZMA_BLOB_MAGIC)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _write_blob(blob_data: bytes, out_path: str) -> bool:
+    """
+    Write blob data to a file, decompressing it in chunks if it is compressed
+    The data is written to a .partial file that is only renamed once it is complete, so a corrupt blob
+    never leaves a truncated file behind (which the next scan would treat as present)
+    """
+    magic = bytes(blob_data[:4])
+    if magic == ZLIB_BLOB_MAGIC:
+        decompressor = decompressobj()
+    elif magic == LZMA_BLOB_MAGIC:
+        decompressor = LZMADecompressor()
+    else:
+        decompressor = None
+
+    partial_path = f'{out_path}.partial'
     try:
-        conn = _create_connection(DATABASE_FULL_PATH)
-        cursor = conn.cursor()
+        with open(partial_path, 'wb') as output_file:
+            if decompressor is None:
+                output_file.write(blob_data)
+            else:
+                view = memoryview(blob_data)
+                for pos in range(4, len(view), BLOB_CHUNK_SIZE):
+                    output_file.write(decompressor.decompress(view[pos:pos + BLOB_CHUNK_SIZE]))
+                if magic == ZLIB_BLOB_MAGIC:
+                    output_file.write(decompressor.flush())
+                if not decompressor.eof:
+                    raise EOFError('the compressed data is truncated')
 
-        with open(image_out_path, 'wb') as output_file:
-            cursor.execute(f'SELECT psio FROM covers WHERE id = {row_id};')
-            image_blob = cursor.fetchone()
-            output_file.write(image_blob[0])
+        replace(partial_path, out_path)
+        return True
+    except (OSError, ZlibError, LZMAError, EOFError) as error:
+        print(f'Unable to write {out_path}: {error}')
+        try:
+            remove(partial_path)
+        except OSError:
+            pass
+        return False
+# ************************************************************************************
 
-        cursor.close()
-    except Error:
-        pass
-    finally:
-        if conn:
-            conn.close()
+
+# ************************************************************************************
+def _select_blob(query: str, row_id) -> bytes:
+    """Select a single blob column from the local database"""
+    rows = select(query, (row_id,))
+    return rows[0][0] if rows else None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _extract_game_cover_blob(row_id, image_out_path: str):
+    """Extract the game cover art data from the local database"""
+    image_blob = _select_blob('SELECT psio FROM covers WHERE id = ?;', row_id)
+    if image_blob is not None:
+        _write_blob(image_blob, image_out_path)
 # ************************************************************************************
 
 
 # ************************************************************************************
 def _extract_game_libcrypt_patch_blob(row_id, ppf_out_path: str):
     """Extract the game LibCrypt PPF patch data from the local database"""
-    try:
-        conn = _create_connection(DATABASE_FULL_PATH)
-        cursor = conn.cursor()
+    patch_blob = _select_blob('SELECT psio FROM libcrypt_patches WHERE id = ?;', row_id)
+    if patch_blob is not None:
+        _write_blob(patch_blob, ppf_out_path)
+# ************************************************************************************
 
-        with open(ppf_out_path, 'wb') as output_file:
-            cursor.execute(f'SELECT psio FROM libcrypt_patches WHERE id = {row_id};')
-            patch_blob = cursor.fetchone()
-            output_file.write(patch_blob[0])
 
-        cursor.close()
-    except Error:
-        pass
-    finally:
-        if conn:
+# ************************************************************************************
+def normalize_game_id(game_id: str) -> str:
+    """Normalize a game ID to the key stored in the database (e.g. SLUS-007.43 -> SLUS_00743)"""
+    return game_id.upper().replace('-', '_').replace('.', '')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def get_schema_version() -> int:
+    """Get the schema version of the database, 0 if the database has never been migrated"""
+    rows = select('PRAGMA user_version;')
+    return rows[0][0] if rows else 0
+# ************************************************************************************
+
+
+# ************************************************************************************
+def disc_set_id(game_name: str) -> str:
+    """Get the ID of the disc set that a game belongs to, this is its Redump name without the disc number"""
+    return _DISC_NAME_PATTERN.sub('', game_name).strip()
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _set_schema_version(version: int):
+    """Set the schema version of the database in use, which decides the columns and tables the lookups use"""
+    global DATABASE_SCHEMA_VERSION, GAME_KEY_COLUMN
+    DATABASE_SCHEMA_VERSION = version
+    GAME_KEY_COLUMN = 'game_key' if version >= 1 else 'game_id'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _migrate_game_keys(conn):
+    """Schema version 1: add the normalized game_key column to every table that is looked up by game ID, then index it"""
+    for table in GAME_ID_TABLES:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table});')]
+        if 'game_key' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN game_key TEXT;')
+        conn.execute(f"UPDATE {table} SET game_key = REPLACE(REPLACE(UPPER(game_id), '-', '_'), '.', '');")
+
+    for index in SCHEMA_INDEXES:
+        conn.execute(index)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _migrate_disc_sets(conn):
+    """Schema version 2: add the disc_sets table, each disc of a multi-disc game shares the same set ID"""
+    conn.execute('CREATE TABLE IF NOT EXISTS disc_sets (game_key TEXT PRIMARY KEY, set_id TEXT NOT NULL, disc_order INTEGER NOT NULL);')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_disc_sets_set_id ON disc_sets (set_id, disc_order);')
+
+    rows = conn.execute('SELECT game_key, name, disc_number FROM games WHERE disc_number > 0 ORDER BY rowid;').fetchall()
+    conn.executemany('INSERT OR IGNORE INTO disc_sets (game_key, set_id, disc_order) VALUES (?, ?, ?);',
+                     [(game_key, disc_set_id(name), disc_number) for game_key, name, disc_number in rows if game_key and name])
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _migrate_game_tracks(conn):
+    """Schema version 3: add the game_tracks table, which holds the size and hashes of each track from a Redump DAT"""
+    conn.execute('CREATE TABLE IF NOT EXISTS game_tracks (game_key TEXT NOT NULL, name TEXT NOT NULL, size INTEGER, crc TEXT, md5 TEXT, sha1 TEXT);')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_game_tracks_game_key ON game_tracks (game_key);')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def normalize_game_name(game_name: str, keep_tags: bool = False) -> str:
+    """Normalize a game name for fuzzy matching, e.g. "Final Fantasy IX (Europe) (Disc 1)" -> "final fantasy ix" """
+    if not keep_tags:
+        game_name = _NAME_TAG_PATTERN.sub(' ', game_name)
+    return _NAME_SEPARATOR_PATTERN.sub(' ', game_name.lower()).strip()
+# ************************************************************************************
+
+
+# ************************************************************************************
+def name_trigrams(normalized_name: str) -> set:
+    """Get the set of trigrams of a normalized name, each word is padded so that short words still match"""
+    trigrams = set()
+    for word in normalized_name.split():
+        padded = f'  {word} '
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _dice_score(trigrams_a: set, trigrams_b: set) -> float:
+    """The Dice similarity of two sets of trigrams"""
+    if not trigrams_a or not trigrams_b:
+        return 0.0
+    return 2 * len(trigrams_a & trigrams_b) / (len(trigrams_a) + len(trigrams_b))
+# ************************************************************************************
+
+
+# ************************************************************************************
+def build_name_index(conn):
+    """Rebuild the trigram index of the game names, this must be called again whenever the game names change"""
+    conn.execute('DELETE FROM name_trigrams;')
+    conn.execute('DELETE FROM game_names;')
+
+    trigram_rows = []
+    name_rows = []
+    for game_key, name in conn.execute('SELECT DISTINCT game_key, name FROM games WHERE game_key IS NOT NULL AND name IS NOT NULL;').fetchall():
+        trigrams = name_trigrams(normalize_game_name(name))
+        if trigrams:
+            # The trigrams reference the name by its row number, which keeps the trigram index small
+            name_id = len(name_rows) + 1
+            name_rows.append((name_id, game_key, name, len(trigrams)))
+            trigram_rows.extend((trigram, name_id) for trigram in trigrams)
+
+    conn.executemany('INSERT INTO game_names (name_id, game_key, name, trigram_count) VALUES (?, ?, ?, ?);', name_rows)
+    conn.executemany('INSERT INTO name_trigrams (trigram, name_id) VALUES (?, ?);', trigram_rows)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _migrate_name_index(conn):
+    """Schema version 4: add the trigram index of the game names"""
+    conn.execute('CREATE TABLE IF NOT EXISTS game_names (name_id INTEGER PRIMARY KEY, game_key TEXT NOT NULL, name TEXT NOT NULL, trigram_count INTEGER NOT NULL);')
+    conn.execute('CREATE TABLE IF NOT EXISTS name_trigrams (trigram TEXT NOT NULL, name_id INTEGER NOT NULL);')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_name_trigrams_trigram ON name_trigrams (trigram, name_id);')
+    build_name_index(conn)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def migrate_database() -> bool:
+    """
+    Migrate the database to the current schema version, each migration only runs once
+    Each migration is committed with its schema version, so a failed migration never leaves a half-migrated database
+    """
+    migrations = ((1, _migrate_game_keys), (2, _migrate_disc_sets), (3, _migrate_game_tracks), (4, _migrate_name_index))
+    version = get_schema_version()
+
+    if version < SCHEMA_VERSION:
+        conn = _create_connection(DATABASE_FULL_PATH, read_only=False)
+        if conn is None:
+            return False
+
+        try:
+            conn.isolation_level = None
+            for migration_version, migration in migrations:
+                if version >= migration_version:
+                    continue
+
+                conn.execute('BEGIN')
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {migration_version};')
+                conn.execute('COMMIT')
+                version = migration_version
+
+            conn.execute('ANALYZE;')
+        except Error as error:
+            print(f'Unable to migrate the database: {error}')
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+        finally:
             conn.close()
+
+            # The pooled connections were opened on the database before it was changed
+            close_connections()
+
+    _set_schema_version(version)
+    return version >= SCHEMA_VERSION
 # ************************************************************************************
 
 
@@ -148,55 +593,188 @@ def set_database_path(database_path: str, database_name: str):
     DATABASE_PATH = database_path
     DATABASE_FILE = database_name
     DATABASE_FULL_PATH = join(DATABASE_PATH, DATABASE_FILE)
+
+    # Connections to the previous database can no longer be reused
+    close_connections()
+    _set_schema_version(0)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def set_bundled_database_path(bundled_path: str):
+    """Set the path of the database bundled with an exe, it is copied to the database path by ensure_database_exists"""
+    global BUNDLED_DATABASE_PATH
+    BUNDLED_DATABASE_PATH = bundled_path
 # ************************************************************************************
 
 
 # ************************************************************************************
-def ensure_database_exists():
-    """Ensures that the database file exists and has been merged into a single file"""
+def ensure_database_exists(progress=None):
+    """
+    Ensures that the database file exists and has been merged into a single file
+    Returns None when the database is ready, otherwise a message describing the error
+    This can take a while on first launch, so it is safe to run on a background thread
+    """
+    if BUNDLED_DATABASE_PATH is not None and exists(BUNDLED_DATABASE_PATH):
+        try:
+            _copy_bundled_database()
+        except OSError as error:
+            # The bundled database is used as it is, it will be migrated again on the next run
+            print(f'Unable to copy the bundled database to {DATABASE_PATH}: {error}')
+            set_database_path(dirname(BUNDLED_DATABASE_PATH), basename(BUNDLED_DATABASE_PATH))
+
     if not exists(DATABASE_FULL_PATH):
         if _database_splits_exist():
-            _merge_database()
+            try:
+                _merge_database(progress)
+            except (OSError, ValueError) as error:
+                print(error)
+
             if not exists(DATABASE_FULL_PATH):
                 print('\n******************************')
                 print('Unable to merge database file!')
                 print('******************************\n')
-                exit()
+                return 'Unable to merge database file!'
         else:
             print('\n******************************')
             print('Database split-files not found!')
             print('******************************\n')
-            exit()
+            return 'Database split-files not found!'
+
+    # The lookups fall back to the un-indexed game_id column if the database cannot be migrated
+    migrate_database()
+    return None
 # ************************************************************************************
 
 
 # ************************************************************************************
-def select(select_query: str):
-    """Select data from the local database"""
+def select(select_query: str, parameters=()):
+    """Select data from the local database, using the read-only connection of the current thread"""
     rows = []
+    conn = _get_connection()
+    if conn is None:
+        return rows
+
     try:
-        conn = _create_connection(DATABASE_FULL_PATH)
-        cursor = conn.cursor()
-        cursor.execute(select_query)
-        rows = cursor.fetchall()
-        cursor.close()
+        rows = conn.execute(select_query, parameters).fetchall()
     except Error:
         pass
-    finally:
-        if conn:
-            conn.close()
 
     return rows
 # ************************************************************************************
 
 
+# ************************************************************************************
+class NameMatch(NamedTuple):
+    """A game found by name, the score is the Dice similarity of the names between 0 and 1"""
+    game_id: str
+    name: str
+    score: float
+# ************************************************************************************
+
+
+# ************************************************************************************
+def get_bulk_metadata(game_ids) -> dict:
+    """
+    Get the database details for a list of games with one query per table (per chunk of IDs)
+    Returns a dictionary keyed by game ID with the disc number, LibCrypt status, Redump name, disc set,
+    and whether cover art and a LibCrypt patch are available for the game
+    """
+    formatted_game_ids = {game_id: normalize_game_id(game_id) for game_id in set(game_ids) if game_id}
+    unique_ids = sorted(set(formatted_game_ids.values()))
+
+    games = {}
+    covers = set()
+    patches = set()
+    disc_sets = {}
+
+    conn = _get_connection()
+    try:
+        cursor = conn.cursor()
+
+        for start in range(0, len(unique_ids), BULK_QUERY_CHUNK_SIZE):
+            chunk = unique_ids[start:start + BULK_QUERY_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+
+            # The first matching row is used for each game, the same as the single game lookups
+            cursor.execute(f'SELECT {GAME_KEY_COLUMN}, name, disc_number, libcrypt FROM games WHERE {GAME_KEY_COLUMN} IN ({placeholders}) ORDER BY rowid;', chunk)
+            for game_id, name, disc_number, libcrypt in cursor.fetchall():
+                games.setdefault(game_id, (name, disc_number, libcrypt))
+
+            cursor.execute(f'SELECT DISTINCT {GAME_KEY_COLUMN} FROM covers WHERE {GAME_KEY_COLUMN} IN ({placeholders});', chunk)
+            covers.update(row[0] for row in cursor.fetchall())
+
+            cursor.execute(f'SELECT DISTINCT {GAME_KEY_COLUMN} FROM libcrypt_patches WHERE {GAME_KEY_COLUMN} IN ({placeholders});', chunk)
+            patches.update(row[0] for row in cursor.fetchall())
+
+            if DATABASE_SCHEMA_VERSION >= 2:
+                cursor.execute(f'SELECT game_key, set_id, disc_order FROM disc_sets WHERE game_key IN ({placeholders});', chunk)
+                disc_sets.update((game_key, (set_id, disc_order)) for game_key, set_id, disc_order in cursor.fetchall())
+
+        cursor.close()
+    except (Error, AttributeError) as error:
+        print(f'Unable to read the game metadata: {error}')
+
+    metadata = {}
+    for game_id, formatted_game_id in formatted_game_ids.items():
+        name, disc_number, libcrypt = games.get(formatted_game_id, ('', 0, 0))
+        set_id, disc_order = disc_sets.get(formatted_game_id, (None, 0))
+        metadata[game_id] = {
+            'redump_name': name or '',
+            'disc_number': disc_number or 0,
+            'libcrypt': libcrypt or 0,
+            'cover_available': formatted_game_id in covers,
+            'patch_available': formatted_game_id in patches,
+            'disc_set': set_id,
+            'disc_order': disc_order,
+        }
+
+    return metadata
+# ************************************************************************************
+
+
+# ************************************************************************************
+def find_games_by_name(game_name: str, limit: int = 5) -> list:
+    """
+    Find the games in the database with a name similar to the game name, best match first
+    The candidates with the highest Dice similarity are found with the trigram index, so long names that share
+    many trigrams do not crowd out closer short names. They are then ranked with the similarity of the full names
+    (including region tags) used to break ties
+    Returns a list of NameMatch, the game IDs are in the application format (e.g. SLUS-00743)
+    """
+    if DATABASE_SCHEMA_VERSION < 4:
+        return []
+
+    query_trigrams = name_trigrams(normalize_game_name(game_name))
+    if not query_trigrams:
+        return []
+
+    placeholders = ','.join('?' * len(query_trigrams))
+    rows = select(f'''SELECT n.game_key, n.name, t.shared, n.trigram_count
+                      FROM (SELECT name_id, COUNT(*) AS shared FROM name_trigrams
+                            WHERE trigram IN ({placeholders})
+                            GROUP BY name_id) AS t
+                      JOIN game_names AS n ON n.name_id = t.name_id
+                      ORDER BY 2.0 * t.shared / (? + n.trigram_count) DESC
+                      LIMIT ?;''', tuple(query_trigrams) + (len(query_trigrams), NAME_SEARCH_CANDIDATES))
+
+    full_trigrams = name_trigrams(normalize_game_name(game_name, keep_tags=True))
+    ranked = []
+    for game_key, name, shared, trigram_count in rows:
+        score = 2 * shared / (len(query_trigrams) + trigram_count)
+        tie_break = _dice_score(full_trigrams, name_trigrams(normalize_game_name(name, keep_tags=True)))
+        ranked.append((score, tie_break, game_key, name))
+
+    ranked.sort(key=lambda match: (match[0], match[1]), reverse=True)
+    return [NameMatch(game_key.replace('_', '-'), name, round(score, 3)) for score, _, game_key, name in ranked[:limit]]
+# ************************************************************************************
+
+
 # ************************************************************************************
 def get_redump_name(game_id: str):
     """Get the game name using names from Redump/PSX Data-Centre stored in a local database"""
 
-    formatted_game_id = game_id.replace('-','_')
-    query = f'SELECT name FROM games WHERE game_id = "{formatted_game_id}"'
-    response = select(f'''{query};''')
+    response = select(f'SELECT name FROM games WHERE {GAME_KEY_COLUMN} = ?;', (normalize_game_id(game_id),))
 
     if response is not None and response != []:
         game_name = response[0][0]
@@ -206,13 +784,26 @@ def get_redump_name(game_id: str):
 # ************************************************************************************
 
 
+# ************************************************************************************
+def get_game_tracks(game_id: str) -> list:
+    """
+    Get the size and hashes of each track of a game from the Redump DAT, in track order
+    Returns a list of (name, size, crc, md5, sha1) tuples, which is empty if no DAT has been imported for the game
+    """
+    if DATABASE_SCHEMA_VERSION < 3:
+        return []
+
+    response = select('SELECT name, size, crc, md5, sha1 FROM game_tracks WHERE game_key = ? ORDER BY rowid;', (normalize_game_id(game_id),))
+
+    return response or []
+# ************************************************************************************
+
+
 # ************************************************************************************
 def get_disc_number(game_id: str):
     """Get the disc number from the local database"""
 
-    formatted_game_id = game_id.replace('-','_')
-    query = f'SELECT disc_number FROM games WHERE game_id = "{formatted_game_id}"'
-    response = select(f'''{query};''')
+    response = select(f'SELECT disc_number FROM games WHERE {GAME_KEY_COLUMN} = ?;', (normalize_game_id(game_id),))
 
     return response[0][0] if response and response != [] else 0
 # ************************************************************************************
@@ -222,9 +813,7 @@ def get_disc_number(game_id: str):
 def get_libcrypt_status(game_id: str):
     """Get the libcrypt status from local database"""
 
-    formatted_game_id = game_id.replace('-','_')
-    query = f'SELECT libcrypt FROM games WHERE game_id = "{formatted_game_id}"'
-    response = select(f'''{query};''')
+    response = select(f'SELECT libcrypt FROM games WHERE {GAME_KEY_COLUMN} = ?;', (normalize_game_id(game_id),))
 
     return response[0][0] if response and response != [] else 0
 # ************************************************************************************
@@ -234,9 +823,7 @@ def get_libcrypt_status(game_id: str):
 def libcrypt_patch_available(game_id: str) -> bool:
     """Check if there is a LibCrypt PPF patch available in the local database"""
 
-    formatted_game_id = game_id.replace('-','_')
-    query = f'SELECT id FROM libcrypt_patches WHERE game_id = "{formatted_game_id}"'
-    response = select(f'''{query};''')
+    response = select(f'SELECT id FROM libcrypt_patches WHERE {GAME_KEY_COLUMN} = ?;', (normalize_game_id(game_id),))
 
     return response and response != []
 # ************************************************************************************
@@ -246,9 +833,7 @@ def libcrypt_patch_available(game_id: str) -> bool:
 def copy_game_cover(output_path: str, game_id: str, game_name: str):
     """Copy the game front cover art if it is available in the local database"""
 
-    formatted_game_id = game_id.replace('-','_')
-    query = f'SELECT id FROM covers WHERE game_id = "{formatted_game_id}"'
-    response = select(f'''{query};''')
+    response = select(f'SELECT id FROM covers WHERE {GAME_KEY_COLUMN} = ?;', (normalize_game_id(game_id),))
 
     if response and response != []:
         row_id = response[0][0]
@@ -262,9 +847,7 @@ def copy_game_cover(output_path: str, game_id: str, game_name: str):
 def copy_libcrypt_patch(output_path: str, game_id: str):
     """Copy the LibCrypt PPF patch file if it is available in the local database"""
 
-    formatted_game_id = game_id.replace('-','_')
-    query = f'SELECT id FROM libcrypt_patches WHERE game_id = "{formatted_game_id}"'
-    response = select(f'''{query};''')
+    response = select(f'SELECT id FROM libcrypt_patches WHERE {GAME_KEY_COLUMN} = ?;', (normalize_game_id(game_id),))
 
     if response and response != []:
         row_id = response[0][0]
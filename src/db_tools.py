@@ -0,0 +1,185 @@
+'''
+Database maintenance tools
+Command line tools for the local Sqlite3 database, these are not needed to run the application
+
+Usage:
+    python db_tools.py migrate
+    python db_tools.py split
+    python db_tools.py compress-covers --method lzma
+    python db_tools.py import-dat "Sony - PlayStation - Datfile (10853).zip"
+    python db_tools.py benchmark --lookups 1000
+'''
+
+from argparse import ArgumentParser
+from os.path import abspath, dirname, exists, join, split, getsize
+from time import perf_counter
+
+import db
+from dat_import import import_redump_dat
+
+DEFAULT_DATABASE_PATH = join(dirname(abspath(__file__)), 'data', 'psio_assist.db')
+DEFAULT_LOOKUPS = 500
+COMPRESSION_METHODS = ('lzma', 'zlib')
+COMPRESSION_BATCH_SIZE = 200
+
+# The queries run for each game during a scan, the column is either game_id or game_key
+LOOKUP_QUERIES = (
+    'SELECT name, disc_number, libcrypt FROM games WHERE {column} = ?;',
+    'SELECT id FROM covers WHERE {column} = ?;',
+    'SELECT id FROM libcrypt_patches WHERE {column} = ?;',
+)
+
+
+# ************************************************************************************
+def _time_lookups(column: str, game_keys: list) -> float:
+    """Run the scan lookups for each game key, returning the average time per game in microseconds"""
+    queries = [query.format(column=column) for query in LOOKUP_QUERIES]
+
+    start = perf_counter()
+    for game_key in game_keys:
+        for query in queries:
+            db.select(query, (game_key,))
+    elapsed = perf_counter() - start
+
+    return elapsed / max(len(game_keys), 1) * 1000000
+# ************************************************************************************
+
+
+# ************************************************************************************
+def migrate():
+    """Migrate the database to the current schema version"""
+    version = db.get_schema_version()
+    if version >= db.SCHEMA_VERSION:
+        print(f'The database is already at schema version {version}')
+        return
+
+    if db.migrate_database():
+        print(f'Migrated the database from schema version {version} to {db.get_schema_version()}')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def split_database():
+    """Split the database into the files that are committed to the repo, along with their checksum"""
+    db.split_database()
+    print(f'Split the database into {db.DATABASE_SPLIT_COUNT} files and wrote {db.DATABASE_CHECKSUM_FILE}')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def compress_covers(method: str):
+    """
+    Compress every raw cover art blob in the database, then vacuum the database to reclaim the space
+    Covers that are already compressed are skipped, so the tool can safely be run more than once
+    """
+    size_before = getsize(db.DATABASE_FULL_PATH)
+    conn = db.open_database_for_writing()
+    if conn is None:
+        return
+
+    compressed = 0
+    try:
+        row_ids = [row[0] for row in conn.execute('SELECT rowid FROM covers ORDER BY rowid;')]
+        for start in range(0, len(row_ids), COMPRESSION_BATCH_SIZE):
+            batch = row_ids[start:start + COMPRESSION_BATCH_SIZE]
+            rows = conn.execute(f'SELECT rowid, psio FROM covers WHERE rowid IN ({",".join("?" * len(batch))});', batch).fetchall()
+
+            updates = [(db.compress_blob(bytes(blob), method), row_id) for row_id, blob in rows if blob and not db.is_compressed_blob(blob)]
+            with conn:
+                conn.executemany('UPDATE covers SET psio = ? WHERE rowid = ?;', updates)
+            compressed += len(updates)
+            print(f'Compressed {compressed} covers', end='\r')
+
+        conn.execute('VACUUM;')
+    finally:
+        conn.close()
+        db.close_connections()
+
+    size_after = getsize(db.DATABASE_FULL_PATH)
+    print(f'Compressed {compressed} covers with {method}, the database is now {size_after / 1048576:.1f} MB ({size_before / 1048576:.1f} MB before)')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def import_dat(dat_path: str):
+    """Import the game names, disc numbers and track hashes from a Redump DAT file"""
+    start = perf_counter()
+    summary = import_redump_dat(dat_path, progress=lambda games_read: print(f'Read {games_read} games', end='\r'))
+    elapsed = perf_counter() - start
+
+    print(f'Read {summary.games_read} games in {elapsed:.1f} seconds')
+    print(f'Updated {summary.games_updated} games, added {summary.games_added} games and stored {summary.tracks} tracks')
+    if summary.games_skipped:
+        print(f'Skipped {summary.games_skipped} games that have no serial and are not already in the database')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def benchmark(lookups: int):
+    """
+    Time the per-game lookups before and after the migration
+    The un-indexed game_id column is timed first, the database is then migrated if needed
+    and the same lookups are timed again using the indexed game_key column
+    """
+    rows = db.select('SELECT game_id FROM games ORDER BY RANDOM() LIMIT ?;', (lookups,))
+    game_keys = [db.normalize_game_id(row[0]) for row in rows if row[0]]
+    if not game_keys:
+        print('No games found in the database')
+        return
+
+    print(f'Timing the lookups for {len(game_keys)} games')
+    before = _time_lookups('game_id', game_keys)
+    print(f'Before (game_id):  {before:10.1f} us per game')
+
+    if db.get_schema_version() < db.SCHEMA_VERSION and not db.migrate_database():
+        return
+
+    after = _time_lookups('game_key', game_keys)
+    print(f'After (game_key):  {after:10.1f} us per game')
+    print(f'Speed-up:          {before / after:10.1f}x')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def main():
+    """Parse the command line arguments and run the selected tool"""
+    parser = ArgumentParser(description='PSIO Game Assistant database tools')
+    parser.add_argument('--database', default=DEFAULT_DATABASE_PATH, help='Path of the merged database file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('migrate', help='Add the game_key column and indexes to the database')
+
+    subparsers.add_parser('split', help='Split the database into the repo split-files and write their checksum')
+
+    compress_parser = subparsers.add_parser('compress-covers', help='Compress the cover art stored in the database')
+    compress_parser.add_argument('--method', choices=COMPRESSION_METHODS, default=COMPRESSION_METHODS[0], help='Compression method')
+
+    import_parser = subparsers.add_parser('import-dat', help='Import the games from a Redump DAT file (.dat, .xml or .zip)')
+    import_parser.add_argument('dat_path', help='Path of the DAT file')
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='Time the game lookups before and after the migration')
+    benchmark_parser.add_argument('--lookups', type=int, default=DEFAULT_LOOKUPS, help='Number of games to look up')
+
+    args = parser.parse_args()
+
+    database_path = abspath(args.database)
+    if not exists(database_path):
+        print(f'Database not found: {database_path}')
+        return
+
+    db.set_database_path(*split(database_path))
+    if args.command == 'migrate':
+        migrate()
+    elif args.command == 'split':
+        split_database()
+    elif args.command == 'compress-covers':
+        compress_covers(args.method)
+    elif args.command == 'import-dat':
+        import_dat(args.dat_path)
+    elif args.command == 'benchmark':
+        benchmark(args.lookups)
+# ************************************************************************************
+
+
+if __name__ == '__main__':
+    main()
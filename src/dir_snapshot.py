@@ -0,0 +1,142 @@
+'''
+Directory snapshot functions
+Each game directory is listed once with os.scandir, and every existence check and file size
+needed during the scan is answered from that listing instead of a separate stat call
+
+On SD cards and network shares every stat is a round trip to the device, so cutting the scan
+down to a single listing per directory makes a large difference on big libraries
+'''
+
+from os import scandir, stat
+from os.path import abspath, normcase, split, join
+
+IGNORED_DIRECTORIES = ('System Volume Information',)
+GAME_FILE_EXTENSIONS = ('.cue', '.cu2')
+
+
+# ************************************************************************************
+class DirectorySnapshot:
+    """The files and sub-directories of a directory, listed once with os.scandir"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._key = normcase(abspath(path))
+        self._files = {}
+        self._lower_names = {}
+        self._dir_names = []
+
+        with scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+
+                if is_dir:
+                    self._dir_names.append(entry.name)
+                else:
+                    self._files[entry.name] = entry
+                    self._lower_names.setdefault(entry.name.lower(), entry.name)
+
+    # ************************************************************************************
+    def file_names(self) -> list:
+        return list(self._files)
+
+    def dir_names(self) -> list:
+        return list(self._dir_names)
+    # ************************************************************************************
+
+    # ************************************************************************************
+    def exists(self, name: str, ignore_case: bool = False) -> bool:
+        """Check if a file exists in the directory"""
+        if name in self._files:
+            return True
+        if ignore_case:
+            return name.lower() in self._lower_names
+        return self._stat_other_case(name) is not None
+    # ************************************************************************************
+
+    # ************************************************************************************
+    def _stat_other_case(self, name: str):
+        """
+        Stat a file that is only listed with different case, or return None
+        On case-insensitive file systems (Windows, macOS, FAT/exFAT) the file is found, the same as an os.stat call,
+        on case-sensitive file systems it is not. Names that are not listed at all are never stat'ed
+        """
+        if name.lower() not in self._lower_names:
+            return None
+        try:
+            return stat(join(self.path, name))
+        except OSError:
+            return None
+    # ************************************************************************************
+
+    # ************************************************************************************
+    def stat(self, name: str):
+        """Get the stat result of a file in the directory, or None if it does not exist"""
+        entry = self._files.get(name)
+        if entry is None:
+            return self._stat_other_case(name)
+        try:
+            # DirEntry caches the result, so each file is only ever stat'ed once
+            return entry.stat()
+        except OSError:
+            return None
+    # ************************************************************************************
+
+    # ************************************************************************************
+    def stat_path(self, path: str):
+        """Get the stat result of a file by its full path, using the snapshot when the file is in this directory"""
+        directory, name = split(path)
+        if normcase(abspath(directory)) == self._key:
+            return self.stat(name)
+
+        try:
+            return stat(path)
+        except OSError:
+            return None
+    # ************************************************************************************
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _is_game_directory(snapshot: DirectorySnapshot) -> bool:
+    """A game directory contains at least one cue or cu2 sheet"""
+    return any(name.lower().endswith(GAME_FILE_EXTENSIONS) and not name.startswith('.') for name in snapshot.file_names())
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _visible_dir_names(snapshot: DirectorySnapshot) -> list:
+    """Get the sub-directories, skipping hidden and system directories"""
+    return [name for name in snapshot.dir_names() if not name.startswith('.') and name not in IGNORED_DIRECTORIES]
+# ************************************************************************************
+
+
+# ************************************************************************************
+def walk_game_directories(root_path: str, max_depth: int = 1):
+    """
+    Yield (directory_path, directory_name, snapshot) for each game directory below the root directory
+    Directories that contain a cue sheet are not searched any further, other directories are searched
+    until max_depth is reached. If the root has no sub-directories, the root itself is yielded
+    """
+    root_snapshot = DirectorySnapshot(root_path)
+    sub_folders = _visible_dir_names(root_snapshot)
+
+    if not sub_folders:
+        yield root_path, root_path, root_snapshot
+        return
+
+    pending = [(root_path, name, 1) for name in sub_folders]
+    while pending:
+        directory_path, directory_name, depth = pending.pop(0)
+        try:
+            snapshot = DirectorySnapshot(join(directory_path, directory_name))
+        except OSError:
+            continue
+
+        if depth >= max_depth or _is_game_directory(snapshot):
+            yield directory_path, directory_name, snapshot
+        else:
+            pending[:0] = [(snapshot.path, name, depth + 1) for name in _visible_dir_names(snapshot)]
+# ************************************************************************************
@@ -0,0 +1,187 @@
+'''
+PlayStation disc image header functions
+Reads every fact needed from the start of a bin file with a single bounded read
+
+Every PlayStation disc has a SYSTEM.CNF file in the root directory, the BOOT line of that file
+holds the name of the executable, which is the game ID (e.g. BOOT = cdrom:\\SLUS_007.43;1)
+The same header window is searched for the IDs of the other discs in a collection, and it also
+holds the 1024-byte block that PPF patches use to validate the bin file
+'''
+
+from functools import lru_cache
+from re import compile, escape, IGNORECASE, MULTILINE
+from struct import unpack_from, error as StructError
+from typing import NamedTuple, Optional, Tuple
+
+RAW_SECTOR_SIZE = 2352
+ISO_SECTOR_SIZE = 2048
+PRIMARY_VOLUME_DESCRIPTOR_SECTOR = 16
+SYSTEM_CNF_NAME = 'SYSTEM.CNF'
+
+# Number of sectors read from the start of the bin file, this covers the volume descriptor,
+# the root directory, SYSTEM.CNF and the PPF block-check on practically every disc
+HEADER_PROBE_SECTORS = 128
+
+# The PPF block-check compares 1024 bytes at this offset of a bin file
+BLOCK_CHECK_OFFSET = 0x9320
+BLOCK_CHECK_SIZE = 1024
+
+# Limits so that a corrupt image can never make us read more than a few sectors
+MAX_DIRECTORY_SECTORS = 16
+MAX_SYSTEM_CNF_SIZE = 4 * ISO_SECTOR_SIZE
+DISC_ID_LENGTH = 11
+
+_BOOT_PATTERN = compile(rb'^\s*BOOT\s*=\s*cdrom:?[\\/]*([^\s;]+)', IGNORECASE | MULTILINE)
+
+
+# ************************************************************************************
+class DiscHeader(NamedTuple):
+    """The facts that are read from the header window of a bin file"""
+    boot_file_name: Optional[str]
+    disc_ids: Tuple[str, ...]
+    block_check: bytes
+# ************************************************************************************
+
+
+# ************************************************************************************
+class _HeaderWindow:
+    """The first sectors of a bin file, read into one buffer with a single read call"""
+    def __init__(self, bin_file, sectors: int, block_size: int):
+        self._bin_file = bin_file
+        self.data = bin_file.read(sectors * block_size)
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Read from the buffer, only going back to the file for data outside of the window"""
+        if offset + length <= len(self.data):
+            return self.data[offset:offset + length]
+        self._bin_file.seek(offset)
+        return self._bin_file.read(length)
+# ************************************************************************************
+
+
+# ************************************************************************************
+@lru_cache(maxsize=None)
+def _compile_id_pattern(region_codes: Tuple[str, ...]):
+    """Compile a single pattern that matches every region code"""
+    return compile(b'|'.join(escape(code.encode('ascii')) for code in region_codes))
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _user_data_offset(sector: bytes, block_size: int) -> int:
+    """Get the offset of the 2048 bytes of user data within a sector"""
+    if block_size == ISO_SECTOR_SIZE:
+        return 0
+    if block_size == 2336:
+        return 8
+
+    # Raw sectors have a 12-byte sync and 4-byte header, mode 2 sectors also have an 8-byte sub-header
+    return 24 if sector[15] == 2 else 16
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _read_sectors(window: _HeaderWindow, lba: int, count: int, block_size: int) -> bytes:
+    """Read the user data of consecutive sectors, starting at the logical block address"""
+    raw_data = window.read(lba * block_size, count * block_size)
+
+    user_data = bytearray()
+    for pos in range(0, len(raw_data) - block_size + 1, block_size):
+        sector = raw_data[pos:pos + block_size]
+        offset = _user_data_offset(sector, block_size)
+        user_data += sector[offset:offset + ISO_SECTOR_SIZE]
+    return bytes(user_data)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _find_directory_record(directory_data: bytes, file_name: str):
+    """Find a file in the directory data, returning its logical block address and size"""
+    pos = 0
+    while pos + 33 < len(directory_data):
+        record_length = directory_data[pos]
+
+        # Directory records never span sectors, the rest of the sector is zero padding
+        if record_length == 0:
+            pos = (pos // ISO_SECTOR_SIZE + 1) * ISO_SECTOR_SIZE
+            continue
+
+        name_length = directory_data[pos + 32]
+        record_name = directory_data[pos + 33:pos + 33 + name_length].decode('ascii', errors='ignore')
+        if record_name.split(';')[0].upper() == file_name:
+            return unpack_from('<I', directory_data, pos + 2)[0], unpack_from('<I', directory_data, pos + 10)[0]
+
+        pos += record_length
+
+    return None, None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def parse_boot_file_name(system_cnf: bytes):
+    """Parse the name of the boot executable from the contents of SYSTEM.CNF"""
+    m = _BOOT_PATTERN.search(system_cnf)
+    if not m:
+        return None
+
+    # The executable can be inside a sub-directory, only the file name is the game ID
+    boot_path = m.group(1).decode('ascii', errors='ignore').replace('/', '\\')
+    return boot_path.split('\\')[-1].upper() or None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _read_system_cnf(window: _HeaderWindow, block_size: int):
+    """Read the contents of SYSTEM.CNF using the ISO9660 file system"""
+    volume_descriptor = _read_sectors(window, PRIMARY_VOLUME_DESCRIPTOR_SECTOR, 1, block_size)
+    if len(volume_descriptor) < ISO_SECTOR_SIZE or volume_descriptor[0] != 1 or volume_descriptor[1:6] != b'CD001':
+        return None
+
+    # The root directory record is stored at offset 156 of the primary volume descriptor
+    root_lba = unpack_from('<I', volume_descriptor, 156 + 2)[0]
+    root_size = unpack_from('<I', volume_descriptor, 156 + 10)[0]
+    root_sectors = min(-(-root_size // ISO_SECTOR_SIZE), MAX_DIRECTORY_SECTORS)
+
+    root_directory = _read_sectors(window, root_lba, root_sectors, block_size)
+    cnf_lba, cnf_size = _find_directory_record(root_directory, SYSTEM_CNF_NAME)
+    if cnf_lba is None:
+        return None
+
+    cnf_size = min(cnf_size, MAX_SYSTEM_CNF_SIZE)
+    return _read_sectors(window, cnf_lba, -(-cnf_size // ISO_SECTOR_SIZE), block_size)[:cnf_size]
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _find_disc_ids(header_data: bytes, region_codes: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Find the IDs in the header data, in the order that they appear
+    Multi-disc games list the ID of each disc in the collection, the search stops at the first repeated ID
+    """
+    disc_ids = []
+    for m in _compile_id_pattern(region_codes).finditer(header_data):
+        raw_id = header_data[m.start():m.start() + DISC_ID_LENGTH]
+        disc_id = raw_id.decode('ascii', errors='ignore').replace('.', '').strip()
+        if disc_id in disc_ids:
+            break
+        disc_ids.append(disc_id)
+    return tuple(disc_ids)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def probe_disc_header(bin_file_path: str, region_codes, block_size: int = RAW_SECTOR_SIZE, probe_sectors: int = HEADER_PROBE_SECTORS) -> DiscHeader:
+    """Read the header window of a bin file once and extract the boot file, the disc IDs and the PPF block-check"""
+    try:
+        with open(bin_file_path, 'rb') as bin_file:
+            window = _HeaderWindow(bin_file, probe_sectors, block_size)
+            system_cnf = _read_system_cnf(window, block_size)
+    except (OSError, IndexError, StructError):
+        return DiscHeader(None, (), b'')
+
+    boot_file_name = parse_boot_file_name(system_cnf) if system_cnf else None
+    disc_ids = _find_disc_ids(window.data, tuple(region_codes))
+    block_check = window.data[BLOCK_CHECK_OFFSET:BLOCK_CHECK_OFFSET + BLOCK_CHECK_SIZE]
+
+    return DiscHeader(boot_file_name, disc_ids, block_check)
+# ************************************************************************************
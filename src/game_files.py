@@ -16,6 +16,13 @@ class Game:
         self._cu2_required = cu2_required
         self._multi_disc_file_present = multi_disc_file_present
         self._libcrypt_required = libcrypt_required
+        self._block_check = None
+        self._redump_name = None
+        self._cover_available = None
+        self._libcrypt_patch_available = None
+        self._disc_set_id = None
+        self._merge_failed = False
+        self._id_from_name = False
 
     # Getter and setter for directory_name
     def get_directory_name(self):
@@ -93,6 +100,55 @@ class Game:
 
     def set_libcrypt_required(self, value):
         self._libcrypt_required = value
+
+    # Getter and setter for block_check (the PPF block-check bytes read from the BIN header)
+    def get_block_check(self):
+        return self._block_check
+
+    def set_block_check(self, value):
+        self._block_check = value
+
+    # Getter and setter for redump_name (None until the database has been checked)
+    def get_redump_name(self):
+        return self._redump_name
+
+    def set_redump_name(self, value):
+        self._redump_name = value
+
+    # Getter and setter for cover_available (True if the database has cover art for the game)
+    def get_cover_available(self):
+        return self._cover_available
+
+    def set_cover_available(self, value):
+        self._cover_available = value
+
+    # Getter and setter for libcrypt_patch_available (True if the database has a LibCrypt patch for the game)
+    def get_libcrypt_patch_available(self):
+        return self._libcrypt_patch_available
+
+    def set_libcrypt_patch_available(self, value):
+        self._libcrypt_patch_available = value
+
+    # Getter and setter for disc_set_id (the multi-disc set from the database, None if the game is not in a set)
+    def get_disc_set_id(self):
+        return self._disc_set_id
+
+    def set_disc_set_id(self, value):
+        self._disc_set_id = value
+
+    # Getter and setter for merge_failed (the bin merge raised an error, so the game files may not match the paths)
+    def get_merge_failed(self):
+        return self._merge_failed
+
+    def set_merge_failed(self, value):
+        self._merge_failed = value
+
+    # Getter and setter for id_from_name (the ID was found by a fuzzy name match, not read from the disc)
+    def get_id_from_name(self):
+        return self._id_from_name
+
+    def set_id_from_name(self, value):
+        self._id_from_name = value
 # ************************************************************************************
 
 
@@ -104,6 +160,7 @@ class Cuesheet:
         self._game_name = game_name
         self._new_name = None
         self._bin_files = []
+        self._cue_data = None
 
     # Getter and setter for file_name
     def get_file_name(self):
@@ -142,6 +199,13 @@ class Cuesheet:
 
     def add_bin_file(self, bin_file):
         self._bin_files.append(bin_file)
+
+    # Getter and setter for cue_data (the parsed cue sheet, shared by every processing stage)
+    def get_cue_data(self):
+        return self._cue_data
+
+    def set_cue_data(self, value):
+        self._cue_data = value
 # ************************************************************************************
 
 
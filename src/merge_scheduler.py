@@ -0,0 +1,120 @@
+'''
+Device aware merge scheduler
+Runs the bin merges in parallel, limiting the number of merges that use each disk at the same time
+
+Each merge is grouped by the devices (st_dev) of its source and destination files. A merge only starts when
+every device it uses has a free slot, so a single SD card is never thrashed by several merges at once,
+while merges on other disks run alongside it. The largest merges are started first to shorten the total run time
+'''
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from os import stat
+from typing import Callable, NamedTuple
+
+# Number of merges run at the same time on each device
+DEFAULT_JOBS_PER_DEVICE = 1
+
+# Seconds to wait for a merge to finish before calling the on_wait callback
+WAIT_INTERVAL = 0.1
+
+
+# ************************************************************************************
+class MergeJob(NamedTuple):
+    """A merge to run, the devices are the st_dev of its source and destination paths"""
+    key: object
+    size: int
+    devices: tuple
+    action: Callable
+# ************************************************************************************
+
+
+# ************************************************************************************
+def device_ids(paths) -> tuple:
+    """Get the unique device IDs of the paths, paths that can not be read are ignored"""
+    devices = []
+    for path in paths:
+        try:
+            device = stat(path).st_dev
+        except OSError:
+            continue
+        if device not in devices:
+            devices.append(device)
+    return tuple(devices)
+# ************************************************************************************
+
+
+# ************************************************************************************
+class MergeScheduler:
+    """Runs merge jobs on a thread pool, with a limit on the number of jobs running on each device"""
+
+    # ************************************************************************************
+    def __init__(self, jobs_per_device: int = DEFAULT_JOBS_PER_DEVICE, device_limits: dict = None):
+        self._jobs_per_device = max(1, jobs_per_device)
+        self._device_limits = device_limits or {}
+        self._jobs = []
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def add(self, key, size: int, paths, action: Callable):
+        """Add a job, the paths are the source files and the destination directory of the merge"""
+        self._jobs.append(MergeJob(key, size, device_ids(paths), action))
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _device_limit(self, device) -> int:
+        return max(1, self._device_limits.get(device, self._jobs_per_device))
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def run(self, on_done: Callable = None, on_wait: Callable = None) -> dict:
+        """
+        Run all of the jobs, returning a dictionary of each job key to the value returned by its action
+        If an action raises an exception, the exception is stored as its result
+        on_done is called with the key and result as each job finishes, and on_wait while waiting for jobs to finish,
+        both are called on the thread that called run (e.g. to update the GUI)
+        """
+        pending = sorted(self._jobs, key=lambda job: job.size, reverse=True)
+        self._jobs = []
+        if not pending:
+            return {}
+
+        devices = {device for job in pending for device in job.devices}
+        max_workers = max(1, sum(self._device_limit(device) for device in devices))
+
+        results = {}
+        running = {}
+        active = dict.fromkeys(devices, 0)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+
+                # Start the largest pending jobs whose devices all have a free slot
+                for job in list(pending):
+                    if all(active[device] < self._device_limit(device) for device in job.devices):
+                        pending.remove(job)
+                        for device in job.devices:
+                            active[device] += 1
+                        running[executor.submit(job.action)] = job
+
+                finished, _ = wait(running, timeout=WAIT_INTERVAL, return_when=FIRST_COMPLETED)
+                if not finished and on_wait:
+                    on_wait()
+
+                for future in finished:
+                    job = running.pop(future)
+                    for device in job.devices:
+                        active[device] -= 1
+
+                    try:
+                        results[job.key] = future.result()
+                    except Exception as error:
+                        results[job.key] = error
+
+                    if on_done:
+                        on_done(job.key, results[job.key])
+
+        return results
+    # ************************************************************************************
+# ************************************************************************************
@@ -105,9 +105,10 @@ def apply_ppf1_patch(ppf_file: BinaryIO, bin_file: BinaryIO):
 
 
 # ************************************************************************************
-def apply_ppf2_patch(ppf_file: BinaryIO, bin_file: BinaryIO):
+def apply_ppf2_patch(ppf_file: BinaryIO, bin_file: BinaryIO, bin_block: bytes = None):
     """ 
     Applies a PPF2.0 patch
+    bin_block: the 1024-bytes at 0x9320 of the BIN file, if they have already been read
     Consists of:
     - 6-bytes PPF version number, 
     - 50-byte description, 
@@ -143,8 +144,9 @@ def apply_ppf2_patch(ppf_file: BinaryIO, bin_file: BinaryIO):
     ppf_block = ppf_file.read(1024)
 
     # Read the 1024-byte block-data from the BIN file
-    bin_file.seek(0x9320)
-    bin_block = bin_file.read(1024)
+    if not bin_block:
+        bin_file.seek(0x9320)
+        bin_block = bin_file.read(1024)
 
     # Compare the 1024-byte block data from the PPF patch file with the block of data from the BIN file
     if ppf_block != bin_block:
@@ -177,10 +179,11 @@ def apply_ppf2_patch(ppf_file: BinaryIO, bin_file: BinaryIO):
 
 
 # ************************************************************************************
-def apply_ppf3_patch(ppf_file: BinaryIO, bin_file: BinaryIO, mode: int = 1):
+def apply_ppf3_patch(ppf_file: BinaryIO, bin_file: BinaryIO, mode: int = 1, bin_block: bytes = None):
     """ 
     Applies or undoes a PPF3.0 patch
     mode: 1=apply patch, 2=undo patch
+    bin_block: the 1024-bytes at 0x9320 of the BIN file, if they have already been read
     Consists of:
     - 6-bytes PPF version number, 
     - 50-byte description,
@@ -226,11 +229,10 @@ def apply_ppf3_patch(ppf_file: BinaryIO, bin_file: BinaryIO, mode: int = 1):
         ppf_file.seek(60)
         ppf_block = ppf_file.read(1024)
 
-        # Seek to the correct offset for BIN or ISO file
-        bin_file.seek(0x80A0 if image_type else 0x9320)
-
-        # Read the 1024-byte block-data from the BIN/ISO file
-        bin_block = bin_file.read(1024)
+        # Read the 1024-byte block-data from the BIN/ISO file, the pre-read block is only valid for BIN files
+        if image_type or not bin_block:
+            bin_file.seek(0x80A0 if image_type else 0x9320)
+            bin_block = bin_file.read(1024)
 
         # Compare the 1024-byte block data from the PPF patch file with the data from the BIN/ISO file
         if ppf_block != bin_block:
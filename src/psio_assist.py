@@ -43,12 +43,15 @@
 
 # System imports
 import sys
-from os import listdir, scandir, mkdir, remove
-from os.path import exists, join, dirname, basename, splitext, abspath, isfile
+from os import listdir, mkdir, remove
+from os.path import exists, join, dirname, basename, splitext, abspath, isfile, getsize
 from time import sleep
 from json import load, dumps
 from typing import Union
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue, Empty
+from threading import Thread
 from re import search, sub, IGNORECASE
 from shutil import copyfile, move, rmtree
 from tkinter import Menu, filedialog, StringVar, BooleanVar, TclError, PhotoImage
@@ -59,10 +62,15 @@ from pathlib2 import Path
 
 # Local imports
 from game_files import Game, Cuesheet, Binfile
-from binmerge import set_binmerge_error_log_path, start_bin_merge, read_cue_file
+from catalog import LibraryCatalog
+from merge_scheduler import MergeScheduler, DEFAULT_JOBS_PER_DEVICE
+from dir_snapshot import DirectorySnapshot, walk_game_directories
+from binmerge import set_binmerge_error_log_path, start_bin_merge, get_merge_strategies, set_merge_strategies, set_merge_calibration, set_page_cache_hints, is_fragmented
+from cue_parser import parse_cue_sheet, DEFAULT_BLOCK_SIZE
+from disc_header import DiscHeader, probe_disc_header
 from cue2cu2 import set_cu2_error_log_path, start_cue2cu2
 from ppf_patcher import set_ppf_debug_mode, open_files_for_patching, ppf_version, apply_ppf1_patch, apply_ppf2_patch, apply_ppf3_patch
-from db import set_database_path, ensure_database_exists, get_redump_name, get_disc_number, get_libcrypt_status, libcrypt_patch_available, copy_game_cover, copy_libcrypt_patch
+from db import set_database_path, set_bundled_database_path, ensure_database_exists, get_bulk_metadata, find_games_by_name, normalize_game_name, get_redump_name, get_game_tracks, libcrypt_patch_available, copy_game_cover, copy_libcrypt_patch
 
 
 class PSIOGameAssistant:
@@ -79,6 +87,10 @@ class PSIOGameAssistant:
     MAX_REDUMP_NAME_LENGTH = 47
     MAX_LINES_TO_CHECK = 300
     GAME_ID_LENGTH = 11
+    DEFAULT_SCAN_WORKERS = 8
+    DEFAULT_SCAN_DEPTH = 1
+    METADATA_BATCH_SIZE = 25
+    NAME_MATCH_THRESHOLD = 0.85
 
     def __init__(self, args=None):
         """Initialise the PSIO Game Assistant application"""
@@ -88,6 +100,7 @@ class PSIOGameAssistant:
         self.covers_path = join(dirname(self.script_root_dir), 'covers')
         self.error_log_file = join(dirname(self.script_root_dir), 'errors.txt')
         self.config_file_path = join(self.script_root_dir, 'config')
+        self.catalog = LibraryCatalog(join(self.script_root_dir, 'catalog.db'))
 
         # Set the error log paths for the Bin-Merge and CUE2CU2 processes
         set_cu2_error_log_path(self.error_log_file)
@@ -100,11 +113,14 @@ class PSIOGameAssistant:
         self.src_path = None
         self.dest_path = None
         self.redump_rename = None
+        self.scan_queue = None
+        self.database_queue = None
 
         # GUI elements
         self.label_progress = None
         self.progress_bar = None
         self.button_start = None
+        self.button_browse = None
         self.treeview_game_list = None
         self.label_src = None
         self.cover_art_frame = None
@@ -113,6 +129,11 @@ class PSIOGameAssistant:
         self.database_name = "psio_assist.db"
         self.icon_path = self._resource_path("icon.ico")
         self.database_path = self._resource_path("data")
+        if hasattr(sys, '_MEIPASS'):
+            # The exe extracts the bundled database to a new directory on every run, so it is copied next to the exe
+            # and migrated there once, instead of being migrated again on every launch
+            set_bundled_database_path(join(self.database_path, self.database_name))
+            self.database_path = join(self.script_root_dir, 'data')
         set_database_path(self.database_path, self.database_name)
 
         print(f'Database path: {self.database_path}')
@@ -122,6 +143,21 @@ class PSIOGameAssistant:
 
         # Set debug mode based on the parsed arguments
         self.debug_mode = args.debug if args else False
+
+        # Number of threads used to scan the game sub-folders, 1 scans them sequentially
+        self.scan_workers = max(1, args.workers) if args else self.DEFAULT_SCAN_WORKERS
+
+        # Number of directory levels searched for game directories below the selected directory
+        self.scan_depth = max(1, args.depth) if args else self.DEFAULT_SCAN_DEPTH
+
+        # Number of bin merges run at the same time on each disk
+        self.merge_jobs = max(1, args.merge_jobs) if args else DEFAULT_JOBS_PER_DEVICE
+
+        # Read the bin files with O_DIRECT when merging, bypassing the page cache
+        set_page_cache_hints(direct_io=args.direct_io if args else False)
+
+        # Calibrate the merge strategy of each new file system, this writes a few MB of test data to each disk
+        set_merge_calibration(args.calibrate if args else False)
         set_ppf_debug_mode(self.debug_mode)
 
         self._debug_print(f'\nPSIO Game Assistant v{self.CURRENT_REVISION}')
@@ -154,20 +190,29 @@ class PSIOGameAssistant:
 
         self._debug_print('\nPROCESSING GAMES...')
 
+        # Merge the multi-bin games first, the merges are run in parallel across the disks the games are on
+        # With --calibrate, the merge strategy for each file system is calibrated the first time it is used and kept in the config
+        self._load_merge_strategies()
+        self._merge_multi_bin_games()
+        self._store_merge_strategies()
+
         # Loop through all of the Game objects in the game list
         for game in self.game_list:
 
             # Display the game name in the progress label
             game_name = game.get_cue_sheet().get_game_name()
+
+            # The files of a game whose merge failed may no longer match its paths, so it is left as it is
+            if game.get_merge_failed():
+                print(f'Skipping {game_name}, the bin files could not be merged')
+                continue
+
             self.label_progress.configure(text=f'{self.PROGRESS_STATUS} Processing - {game_name}')
 
             self._debug_print('\n***********************************************************')
             self._debug_print(f'GAME_ID: {game.get_id()}')
             self._debug_print(f'GAME_NAME: {game_name}')
 
-            # Merge multi-bin files
-            self._merge_multi_bin_files(game)
-
             # Generate CU2 file for games with CCDA audio
             self._generate_cu2_file(game)
 
@@ -198,22 +243,64 @@ class PSIOGameAssistant:
 
 
     # ************************************************************************************
-    def _merge_multi_bin_files(self, game: Game):
-        """Merge multi-bin files"""
-        game_name = game.get_cue_sheet().get_game_name()
-        game_full_path = join(game.get_directory_path(), game.get_directory_name())
-        cue_full_path = join(game_full_path, game.get_cue_sheet().get_file_name())
+    def _merge_multi_bin_games(self):
+        """
+        Merge the multi-bin files of every game that has them
+        The merges are grouped by the disks of their source and destination, each disk runs a limited number of merges
+        at the same time (largest first) so that games on different disks are merged in parallel
+        """
+        multi_bin_games = [game for game in self.game_list if len(game.get_cue_sheet().get_bin_files()) > 1]
+        if not multi_bin_games:
+            return
+
+        self._debug_print('MERGING BIN FILES...')
+        self.label_progress.configure(text=f'{self.PROGRESS_STATUS} Merging bin files')
+
+        scheduler = MergeScheduler(self.merge_jobs)
+        for index, game in enumerate(multi_bin_games):
+            bin_paths = [bin_file.get_file_path() for bin_file in game.get_cue_sheet().get_bin_files()]
+            merge_size = sum(getsize(bin_path) for bin_path in bin_paths if exists(bin_path))
+            game_full_path = join(game.get_directory_path(), game.get_directory_name())
+
+            # The final name is worked out here, the merge threads do not touch the GUI variables
+            final_name = self._planned_game_name(game)
+            scheduler.add(index, merge_size, bin_paths + [dirname(game_full_path)],
+                          lambda game=game, final_name=final_name: self._merge_bin_files(game, final_name))
 
-        if len(game.get_cue_sheet().get_bin_files()) > 1:
-            self._debug_print('MERGING BIN FILES...')
-            label_text = f'{self.PROGRESS_STATUS} Merging bin files - {game_name}'
+        merged = []
+
+        def merge_done(index, result):
+            game = multi_bin_games[index]
+            merged.append(index)
+            if result is None or isinstance(result, Exception):
+                print(f"Error merging {game.get_cue_sheet().get_game_name()}: {result or 'the bin files were not merged'}")
+                game.set_merge_failed(True)
+            label_text = f'{self.PROGRESS_STATUS} Merged {len(merged)} of {len(multi_bin_games)} - {game.get_cue_sheet().get_game_name()}'
             self.label_progress.configure(text=label_text)
-            self._merge_bin_files(game)
+            self._update_window()
 
-            bin_path = cue_full_path[:-4] + ".bin"
-            if exists(bin_path):
-                game.get_cue_sheet().set_bin_files([])
-                game.get_cue_sheet().add_bin_file(Binfile(f"{game_name}.bin", bin_path))
+        results = scheduler.run(on_done=merge_done, on_wait=self._update_window)
+        self._print_fragmentation_report([result for result in results.values() if result is not None and not isinstance(result, Exception)])
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _print_fragmentation_report(self, merge_results: list):
+        """Print the number of extents each merged bin file is stored in, flagging the fragmented ones"""
+        merge_results = [result for result in merge_results if result.extents is not None]
+        if not merge_results:
+            return
+
+        fragmented = [result for result in merge_results if is_fragmented(result.size, result.extents)]
+        self._debug_print('\nMERGED BIN FILE EXTENTS:')
+        for result in merge_results:
+            flag = ' (FRAGMENTED)' if result in fragmented else ''
+            self._debug_print(f'{result.extents:6d} extents  {result.size / 1048576:8.1f} MB  {basename(result.bin_path)}{flag}')
+
+        if fragmented:
+            print(f'{len(fragmented)} merged bin files are fragmented, they may load slowly on the PSIO:')
+            for result in fragmented:
+                print(f'  {result.bin_path} ({result.extents} extents)')
     # ************************************************************************************
 
 
@@ -228,7 +315,7 @@ class PSIOGameAssistant:
             self._debug_print('GENERATING CU2...')
             label_text = f'{self.PROGRESS_STATUS} Generating cu2 file - {game_name}'
             self.label_progress.configure(text=label_text)
-            start_cue2cu2(cue_full_path, f'{game_name}.bin')
+            start_cue2cu2(cue_full_path, f'{game_name}.bin', game.get_cue_sheet().get_cue_data())
 
             cu2_path = cue_full_path[:-4] + ".cu2"
             if exists(cu2_path):
@@ -245,7 +332,9 @@ class PSIOGameAssistant:
             self._debug_print('RENAMING THE GAME FILES USING REDUMP...')
             self.label_progress.configure(text=f'{self.PROGRESS_STATUS} Renaming - {game_name}')
 
-            redump_game_name = get_redump_name(game_id)
+            redump_game_name = game.get_redump_name()
+            if redump_game_name is None:
+                redump_game_name = get_redump_name(game_id)
             self._debug_print(f'Redump Game Name: {redump_game_name}')
 
             if redump_game_name is not None and redump_game_name != "":
@@ -278,7 +367,7 @@ class PSIOGameAssistant:
         game_id = game.get_id()
         game_name = game.get_cue_sheet().get_game_name()
 
-        if game.get_cover_art_present():
+        if game.get_cover_art_present() or game.get_cover_available() is False:
             return
 
         self._debug_print('ADDING THE GAME COVER ART...')
@@ -301,7 +390,12 @@ class PSIOGameAssistant:
         if not game.get_libcrypt_required():
             return
 
-        if libcrypt_patch_available(game.get_id()):
+        # A name match may be a different region or revision of the game, so its patch could damage the image
+        if game.get_id_from_name():
+            self._debug_print(f'Not patching {game.get_cue_sheet().get_game_name()}, its ID was identified by name')
+            return
+
+        if self._libcrypt_patch_available(game):
             self._debug_print('PATCHING BIN FILE...')
 
             # Get the LibCrypt PPF patch from the database and copy it to the local directory
@@ -322,9 +416,9 @@ class PSIOGameAssistant:
                     if version == 1:
                         apply_ppf1_patch(ppf_file, bin_file)
                     elif version == 2:
-                        apply_ppf2_patch(ppf_file, bin_file)
+                        apply_ppf2_patch(ppf_file, bin_file, bin_block=game.get_block_check())
                     elif version == 3:
-                        apply_ppf3_patch(ppf_file, bin_file)
+                        apply_ppf3_patch(ppf_file, bin_file, bin_block=game.get_block_check())
 
                 # Delete the PPF patch file after it has been applied to the BIN file
                 remove(ppf_path)
@@ -346,17 +440,15 @@ class PSIOGameAssistant:
     # ************************************************************************************
     def _process_multi_disc_games(self):
         """Process each game in the game list to handle multi-disc collections."""
-        for game in self.game_list:
+        for multi_games in self._resolve_disc_sets():
+            game = multi_games[0]
             if not self._is_first_disc_without_multidisc(game):
                 continue
 
             self._debug_print(f'Game name: {game.get_cue_sheet().get_game_name()}')
+            self._debug_print(f'Game disc set: {game.get_disc_set_id()}')
             self._debug_print(f'Game disc collection: {game.get_disc_collection()}')
 
-            multi_games = self._collect_multi_games(game)
-            if len(multi_games) <= 1:
-                continue
-
             new_game_path = self._create_multi_disc_folder(multi_games)
             self._process_disc_files(multi_games, new_game_path)
             self._generate_lst_file(multi_games)
@@ -372,12 +464,41 @@ class PSIOGameAssistant:
 
 
     # ************************************************************************************
-    def _collect_multi_games(self, game):
-        """Collect all games in the disc collection."""
-        return [
-            self._find_game_by_id(game_id.replace("_", "-"))
-            for game_id in game.get_disc_collection()
-        ]
+    def _resolve_disc_sets(self) -> list:
+        """
+        Group the games in the game list into multi-disc sets in a single pass
+        Games are grouped by the disc set from the database, the disc IDs found in the BIN header of
+        the first disc are only used for games that are not in the disc_sets table
+        Each set is a list of games in disc order, sets with a single disc are not returned
+        """
+        games_by_id = {game.get_id(): game for game in self.game_list if game.get_id()}
+        disc_sets = {}
+
+        for game in self.game_list:
+            set_id = game.get_disc_set_id()
+            if set_id is not None:
+                disc_sets.setdefault(set_id, []).append(game)
+
+            elif game.get_disc_number() == 1 and len(game.get_disc_collection()) > 1:
+                header_set = [games_by_id.get(game_id.replace('_', '-')) for game_id in game.get_disc_collection()]
+                disc_sets[f'header:{game.get_id()}'] = [disc for disc in header_set if disc is not None]
+
+        resolved_sets = []
+        for games in disc_sets.values():
+            # A set with a disc whose merge failed is left as it is, the disc's files may not match its paths
+            if any(disc.get_merge_failed() for disc in games):
+                continue
+
+            # The same disc can only appear once in a set, even if the library has a duplicate copy of it
+            discs = {}
+            for disc in games:
+                discs.setdefault(disc.get_disc_number(), disc)
+
+            multi_games = [discs[disc_number] for disc_number in sorted(discs)]
+            if len(multi_games) > 1:
+                resolved_sets.append(multi_games)
+
+        return resolved_sets
     # ************************************************************************************
 
 
@@ -487,22 +608,6 @@ class PSIOGameAssistant:
     # ************************************************************************************
 
 
-    # ************************************************************************************
-    def _find_game_by_id(self, game_id: str) -> Game:
-        """Return the Game object from teh game list with the specified game ID"""
-        game_dict = {game.get_id(): game for game in self.game_list}
-        return game_dict.get(game_id)
-    # ************************************************************************************
-
-
-    # ************************************************************************************
-    def _find_game_by_name(self, game_name: str) -> Game:
-        """Return the Game object from teh game list with the specified game name"""
-        game_dict = {game.get_cue_sheet().get_game_name(): game for game in self.game_list}
-        return game_dict.get(game_name)
-    # ************************************************************************************
-
-
     # ************************************************************************************
     def _remove_disc_from_name(self, game_name: str) -> str:
         """Check if "Disc" is in the string and remove it"""
@@ -514,77 +619,118 @@ class PSIOGameAssistant:
 
 
     # ************************************************************************************
-    def _detect_cdda(self, cue_file_path: str):
-        """Reads a CUE file and determines if it uses CDDA (CD Digital Audio) tracks"""
-        try:
-            with open(cue_file_path, 'r', encoding="utf-8") as file:
-                lines = file.readlines()
-
-            # Count tracks and check for AUDIO tracks
-            track_count = 0
-            has_audio = False
-
-            for line in lines:
-                line = line.strip()
-                if line.startswith('TRACK'):
-                    track_count += 1
-
-                    # Check if the track is an AUDIO track
-                    if 'AUDIO' in line:
-                        has_audio = True
+    def _merge_bin_files(self, game: Game, final_name: str):
+        """
+        Merge multi-bin files
+        The merged files are written straight into the game directory with the final game name (after any Redump
+        rename and name validation), so the merged bin file never has to be moved or renamed afterwards
+        This runs on the merge threads, so it must not update the GUI
+        Returns the MergeResult, or None if the game was not merged
+        """
 
-            # CDDA is indicated by multiple tracks with at least one AUDIO track
-            return track_count > 1 and has_audio
+        # Get the game info
+        game_name = game.get_cue_sheet().get_game_name()
+        game_full_path = join(game.get_directory_path(), game.get_directory_name())
+        cue_full_path = join(game_full_path, game.get_cue_sheet().get_file_name())
 
-        except FileNotFoundError:
-            print(f"Error: CUE file '{cue_file_path}' not found.")
-            return False
+        target_path = self._planned_game_directory(game, final_name)
+        if target_path != game_full_path:
+            self._debug_print(f'Merging into the renamed game directory: {target_path}')
+            try:
+                mkdir(target_path)
+            except OSError as error:
+                print(f"Error creating directory {target_path}: {error}")
+                return None
+
+        # Merge the multiple BIN files into a single BIN file
+        # When the database has the Redump track hashes, the tracks are copied into a new file and hashed as they are
+        # copied, so verifying them costs no extra reads. Otherwise the other tracks are appended onto the data track
+        # in place, without hashing, so the data track is never read or rewritten
+        expected_tracks = get_game_tracks(game.get_id()) if game.get_id() else []
+        merge_result = start_bin_merge(cue_full_path, final_name, target_path, game.get_cue_sheet().get_cue_data(),
+                                       in_place=not expected_tracks, hash_output=bool(expected_tracks), expected_tracks=expected_tracks)
+        if merge_result is None:
+            if target_path != game_full_path:
+                rmtree(target_path, ignore_errors=True)
+            return None
+
+        if merge_result.crc32 is not None:
+            self._debug_print(f'Merged bin CRC32: {merge_result.crc32} MD5: {merge_result.md5} SHA-1: {merge_result.sha1}')
+        if merge_result.verified is not None:
+            self._debug_print(f'Merged tracks match Redump: {merge_result.verified}')
+
+        new_bin_path = join(target_path, f'{final_name}.bin')
+        new_cue_path = join(target_path, f'{final_name}.cue')
+
+        # The merged files are complete, so the Game object is updated to them even if tidying up the originals fails
+        try:
+            # Remove the original CUE file and the original multi-bin files, unless the merged files replaced them
+            for original_path in [cue_full_path] + [bin_file.get_file_path() for bin_file in game.get_cue_sheet().get_bin_files()]:
+                if original_path not in (new_bin_path, new_cue_path) and exists(original_path):
+                    remove(original_path)
+
+            # Move the files that belong with the game into the renamed directory, then remove the old directory
+            if target_path != game_full_path:
+                self._move_game_files(game_full_path, game_name, target_path, final_name)
+                rmtree(game_full_path, ignore_errors=True)
         except OSError as error:
-            print(f"Error reading CUE file: {error}")
-            return False
+            print(f"Error tidying up the original files of {game_name}: {error}")
+            game.set_cover_art_present(exists(join(target_path, f'{final_name}.bmp')))
+            game.set_cu2_present(exists(join(target_path, f'{final_name}.cu2')))
+
+        # Update the game objects paths
+        game.set_directory_name(basename(target_path) if target_path != game_full_path else game.get_directory_name())
+        game.get_cue_sheet().set_game_name(final_name)
+        game.get_cue_sheet().set_file_name(f'{final_name}.cue')
+        game.get_cue_sheet().set_file_path(new_cue_path)
+        game.get_cue_sheet().set_bin_files([Binfile(f'{final_name}.bin', new_bin_path)])
+        game.get_cue_sheet().set_cue_data(parse_cue_sheet(new_cue_path))
+        return merge_result
     # ************************************************************************************
 
 
     # ************************************************************************************
-    def _merge_bin_files(self, game: Game):
-        """Merge multi-bin files"""
-
-        # Get the game info
+    def _planned_game_name(self, game: Game) -> str:
+        """Get the name the game will have once it has been renamed using Redump and its name has been validated"""
         game_name = game.get_cue_sheet().get_game_name()
-        game_full_path = join(game.get_directory_path(), game.get_directory_name())
-        cue_full_path = join(game_full_path, game.get_cue_sheet().get_file_name())
 
-        # Create a temporary directory to use whilst merging the bin files
-        temp_game_dir = join(game_full_path, 'temp_dir')
-        if not exists(temp_game_dir):
-            try:
-                mkdir(temp_game_dir)
-            except OSError:
-                pass
+        if self.redump_rename.get() and game.get_id():
+            redump_game_name = game.get_redump_name()
+            if redump_game_name is None:
+                redump_game_name = get_redump_name(game.get_id())
+            if redump_game_name:
+                game_name = self._game_name_validator(redump_game_name)
 
-        if exists(temp_game_dir):
+        if len(game_name) > self.MAX_GAME_NAME_LENGTH or '.' in game_name:
+            game_name = self._game_name_validator(game_name)
 
-            # Merge the multiple BIN files into a single BIN file
-            self.label_progress.configure(text=f'{self.PROGRESS_STATUS} Merging bin files')
-            start_bin_merge(cue_full_path, game_name, temp_game_dir)
+        return game_name
+    # ************************************************************************************
 
-            # Check if the single Bin file has been generated
-            temp_bin_path = join(temp_game_dir, f'{game_name}.bin')
-            temp_cue_path = join(temp_game_dir, f'{game_name}.cue')
-            if exists(temp_bin_path) and exists(temp_cue_path):
 
-                # Remove the original CUE file
-                remove(cue_full_path)
+    # ************************************************************************************
+    def _planned_game_directory(self, game: Game, final_name: str) -> str:
+        """
+        Get the directory the game files will be in once the game has been renamed
+        Games in the root of the selected directory, or whose renamed directory already exists, stay where they are
+        """
+        game_full_path = join(game.get_directory_path(), game.get_directory_name())
+        if final_name == game.get_cue_sheet().get_game_name() or game_full_path == game.get_directory_path():
+            return game_full_path
 
-				# Remove the original multi-bin files
-                for original_bin_file in game.get_cue_sheet().get_bin_files():
-                    remove(original_bin_file.get_file_path())
+        target_path = join(dirname(game_full_path), final_name)
+        return game_full_path if exists(target_path) else target_path
+    # ************************************************************************************
 
-                # Move the merged Bin file and the newly generated CUE file into the game directory
-                move(temp_bin_path, join(game_full_path, f'{game_name}.bin'))
-                move(temp_cue_path, join(game_full_path, f'{game_name}.cue'))
 
-            rmtree(temp_game_dir)
+    # ************************************************************************************
+    def _move_game_files(self, source_path: str, game_name: str, target_path: str, new_game_name: str):
+        """Move the cu2 and bmp files of a game into the target directory, renaming them to the new game name"""
+        for extension in ('cu2', 'bmp'):
+            original_file = join(source_path, f'{game_name}.{extension}')
+            new_file = join(target_path, f'{new_game_name}.{extension}')
+            if exists(original_file) and original_file != new_file:
+                move(original_file, new_file)
     # ************************************************************************************
 
 
@@ -602,19 +748,20 @@ class PSIOGameAssistant:
         self._debug_print(f'Renaming game from "{game_name}" to "{new_game_name}"')
 
         game_full_path = join(game.get_directory_path(), game.get_directory_name())
+        referenced_bin_files = [bin_file.get_file_path() for bin_file in game.get_cue_sheet().get_bin_files()]
 
         # Get the original file paths
         original_bin_file = join(game_full_path, f'{game_name}.bin')
         original_cue_file = join(game_full_path, f'{game_name}.cue')
-        original_cu2_file = join(game_full_path, f'{game_name}.cu2')
-        original_bmp_file = join(game_full_path, f'{game_name}.bmp')
 
-        # Create new directory for the game
-        new_filepath = join(dirname(game_full_path), new_game_name)
-        mkdir(new_filepath)
+        # Create new directory for the game, the files are renamed in place if the game is already in its final directory
+        new_filepath = self._planned_game_directory(game, new_game_name)
         if not exists(new_filepath):
-            print(f"Error creating directory: {new_filepath}")
-            return
+            try:
+                mkdir(new_filepath)
+            except OSError as error:
+                print(f"Error creating directory {new_filepath}: {error}")
+                return
 
         # Move/rename the bin file
         if exists(original_bin_file):
@@ -628,23 +775,24 @@ class PSIOGameAssistant:
             cue_path.write_text(cue_text)
             move(original_cue_file, join(new_filepath, f'{new_game_name}.cue'))
 
-        # Move/rename the cu2 file
-        if exists(original_cu2_file):
-            move(original_cu2_file, join(new_filepath, f'{new_game_name}.cu2'))
-
-        # Move/rename the bmp file
-        if exists(original_bmp_file):
-            move(original_bmp_file, join(new_filepath, f'{new_game_name}.bmp'))
+        # Move/rename the cu2 and bmp files
+        self._move_game_files(game_full_path, game_name, new_filepath, new_game_name)
 
         # Update the game objects paths
-        game.set_directory_name(new_game_name)
+        game.set_directory_name(basename(new_filepath))
         game.get_cue_sheet().set_game_name(new_game_name)
         game.get_cue_sheet().get_bin_files()[0].set_file_path(join(new_filepath, f'{new_game_name}.bin'))
         game.get_cue_sheet().set_file_name(f'{new_game_name}.cue')
         game.get_cue_sheet().set_file_path(join(new_filepath, f'{new_game_name}.cue'))
+        game.get_cue_sheet().set_cue_data(None)
 
-        # Delete the original game directory
-        rmtree(game_full_path, ignore_errors=True)
+        # Delete the original game directory, unless it still holds bin files that the cue sheet references
+        if new_filepath != game_full_path:
+            remaining_bin_files = [path for path in referenced_bin_files if dirname(path) == game_full_path and exists(path)]
+            if remaining_bin_files:
+                print(f'Not removing {game_full_path}, it still holds {len(remaining_bin_files)} bin files of the game')
+            else:
+                rmtree(game_full_path, ignore_errors=True)
     # ************************************************************************************
 
 
@@ -706,23 +854,32 @@ class PSIOGameAssistant:
 
 
     # ************************************************************************************
-    def _get_game_name_from_cue(self, cue_path: str, include_track=False):
-        """Get game name from the cue sheet"""
-        cue_content = read_cue_file(cue_path)
-        if cue_content:
-            game_name = basename(cue_content[0].filename)
-            if not include_track and 'Track' in game_name:
-                game_name = game_name[:game_name.rfind('(', 0) -1]
-            return splitext(game_name)[0]
-        return ''
+    def _get_game_id(self, disc_header: DiscHeader):
+        """
+        Get the unique game ID from the BIN file header
+        The ID is taken from the SYSTEM.CNF boot line, with the first ID found in the header bytes as a fallback
+        """
+        if disc_header.boot_file_name and disc_header.boot_file_name.startswith(tuple(self.REGION_CODES)):
+            game_id = disc_header.boot_file_name[:self.GAME_ID_LENGTH]
+        elif disc_header.disc_ids:
+            game_id = disc_header.disc_ids[0]
+        else:
+            return None
+
+        return game_id.replace('_', '-').replace('.', '').strip()
     # ************************************************************************************
 
 
     # ************************************************************************************
-    def _get_game_id(self, bin_file_path: str):
-        """Get the unique game ID from BIN file"""
-        game_disc_collection = self._get_disc_collection(bin_file_path)
-        return game_disc_collection[0].replace('_', '-').replace('.', '').strip() if game_disc_collection else None
+    def _probe_disc_header(self, bin_file_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> DiscHeader:
+        """
+        Read the header facts from the BIN file with a single bounded read
+        If no IDs are found in the header window, scan further into the BIN file as a fallback
+        """
+        disc_header = probe_disc_header(bin_file_path, self.REGION_CODES, block_size)
+        if not disc_header.disc_ids:
+            disc_header = disc_header._replace(disc_ids=tuple(self._get_disc_collection(bin_file_path)))
+        return disc_header
     # ************************************************************************************
 
 
@@ -774,44 +931,140 @@ class PSIOGameAssistant:
 
 
     # ************************************************************************************
-    def _create_game_list(self, selected_path: str):
-        """Create and populate the global game list."""
-        self.game_list = []
-        sub_folders = self._get_sub_folders(selected_path)
+    def _scan_games(self, selected_path: str, snapshots: dict = None):
+        """
+        First scan phase: yield a lightweight Game object for each cue sheet, using only the directory listings
+        The game ID, disc number, LibCrypt status and CDDA details are filled in by the deep scan
+        Each directory is listed once, the listings are added to snapshots so the deep scan can reuse them
+        """
+        for directory_path, directory_name, snapshot in walk_game_directories(selected_path, self.scan_depth):
+            game_directory_path = join(directory_path, directory_name)
+            if snapshots is not None:
+                snapshots[game_directory_path] = snapshot
+
+            for cue_sheet in self._find_cue_sheets(snapshot.file_names()):
+                yield self._create_quick_game(game_directory_path, cue_sheet, directory_name, directory_path, snapshot)
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _deep_scan_games(self, selected_path: str, quick_games: list, on_game=None, snapshots: dict = None) -> list:
+        """
+        Second scan phase: read the cue sheet, BIN header and database details for each game
+        Scanning is mostly waiting on I/O, so the games are scanned by a pool of threads
+        on_game is called with the list index and the Game object as each game finishes
+        The returned list is in the same order as the quick games, so the sorted game list is always the same
+        """
         self._debug_print('\nGAME DETAILS:\n')
 
-        for sub_folder in sub_folders:
-            self._process_sub_folder(selected_path, sub_folder)
+        # The catalog only holds details read from the game files, the database details are looked up in bulk
+        self.catalog.load()
+
+        def deep_scan(index):
+            quick_game = quick_games[index]
+            game_directory_path = join(quick_game.get_directory_path(), quick_game.get_directory_name())
+            snapshot = snapshots.get(game_directory_path) if snapshots else None
+            return index, self._create_game_from_cue(game_directory_path, quick_game.get_cue_sheet().get_file_name(),
+                                                     quick_game.get_directory_name(), quick_game.get_directory_path(), snapshot)
+
+        games = [None] * len(quick_games)
+        scanned_games = []
+        with ThreadPoolExecutor(max_workers=self.scan_workers) as executor:
+            futures = [executor.submit(deep_scan, index) for index in range(len(quick_games))]
+            for future in as_completed(futures):
+                index, game = future.result()
+                games[index] = game
+                scanned_games.append((index, game))
+
+                # The database details are looked up for a batch of games at a time, not for each game
+                if len(scanned_games) >= self.METADATA_BATCH_SIZE:
+                    self._finish_scanned_games(scanned_games, on_game)
+                    scanned_games = []
 
-        self._sort_game_list()
+        self._finish_scanned_games(scanned_games, on_game)
+        self.catalog.save(selected_path)
+        return games
     # ************************************************************************************
 
 
     # ************************************************************************************
-    def _process_sub_folder(self, selected_path: str, sub_folder: str):
-        """Process a single sub-folder to extract game information and add to game list."""
-        game_directory_path = join(selected_path, sub_folder)
-        cue_sheets = self._find_cue_sheets(game_directory_path)
+    def _finish_scanned_games(self, scanned_games: list, on_game=None):
+        """Add the database details to a batch of scanned games, then report each game"""
+        self._apply_database_metadata([game for _, game in scanned_games])
+        for index, game in scanned_games:
+            self._print_game_details(game)
+            if on_game:
+                on_game(index, game)
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _apply_database_metadata(self, games: list):
+        """Look up the database details for a list of games with a single bulk query"""
+        self._identify_games_by_name([game for game in games if game.get_id() is None])
+
+        metadata = get_bulk_metadata([game.get_id() for game in games if game.get_id()])
+        for game in games:
+            details = metadata.get(game.get_id())
+            if details is None:
+                continue
+
+            game.set_disc_number(details['disc_number'])
+            game.set_libcrypt_required(details['libcrypt'])
+            game.set_redump_name(details['redump_name'])
+            game.set_cover_available(details['cover_available'])
+            game.set_libcrypt_patch_available(details['patch_available'])
+            game.set_disc_set_id(details['disc_set'])
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _identify_games_by_name(self, games: list):
+        """
+        Identify games without a detectable ID by searching the database for their name
+        The best match is only used if it is a confident match, and it is either better than the next match
+        or an exact match of the full name (region variants and other discs have the same score otherwise)
+        """
+        for game in games:
+            game_name = game.get_cue_sheet().get_game_name() or game.get_directory_name()
+            matches = find_games_by_name(game_name, limit=2)
+            if not matches or matches[0].score < self.NAME_MATCH_THRESHOLD:
+                continue
+
+            best_match = matches[0]
+            exact_match = normalize_game_name(best_match.name, keep_tags=True) == normalize_game_name(game_name, keep_tags=True)
+            if len(matches) > 1 and matches[1].score >= best_match.score and not exact_match:
+                self._debug_print(f'Ambiguous name match for {game_name}: {[match.name for match in matches]}')
+                continue
+
+            self._debug_print(f'Identified {game_name} by name as {best_match.game_id} ({best_match.name}, score {best_match.score})')
+            game.set_id(best_match.game_id)
+            game.set_id_from_name(True)
+    # ************************************************************************************
+
 
-        for cue_sheet in cue_sheets:
-            game = self._create_game_from_cue(game_directory_path, cue_sheet, sub_folder, selected_path)
-            if game:
-                self.game_list.append(game)
-                self._print_game_details(game)
+    # ************************************************************************************
+    def _libcrypt_patch_available(self, game: Game) -> bool:
+        """Check if a LibCrypt patch is available, using the bulk lookup result when the game has one"""
+        patch_available = game.get_libcrypt_patch_available()
+        if patch_available is None:
+            patch_available = libcrypt_patch_available(game.get_id())
+            game.set_libcrypt_patch_available(patch_available)
+        return patch_available
     # ************************************************************************************
 
 
     # ************************************************************************************
-    def _find_cue_sheets(self, game_directory_path: str) -> list:
-        """Find CUE or CU2 files in the specified directory."""
+    def _find_cue_sheets(self, file_names: list) -> list:
+        """Find CUE or CU2 files in the directory listing."""
         cue_sheets = [
-            f for f in listdir(game_directory_path)
+            f for f in file_names
             if f.lower().endswith('.cue') and not f.startswith('.')
         ]
 
         if not cue_sheets:
             cue_sheets = [
-                f for f in listdir(game_directory_path)
+                f for f in file_names
                 if f.lower().endswith('.cu2') and not f.startswith('.')
             ]
 
@@ -820,68 +1073,96 @@ class PSIOGameAssistant:
 
 
     # ************************************************************************************
-    def _create_game_from_cue(self, game_directory_path: str, cue_sheet: str, sub_folder: str, selected_path: str) -> Game:
-        """Create a Game object from a CUE sheet."""
+    def _create_quick_game(self, game_directory_path: str, cue_sheet: str, sub_folder: str, selected_path: str, snapshot: DirectorySnapshot) -> Game:
+        """Create a lightweight Game object from the directory listing, without reading any of the game files."""
+        cue_name = cue_sheet[:-4]
+
+        the_cue_sheet = Cuesheet(cue_sheet, join(game_directory_path, cue_sheet), cue_name)
+
+        # The bin files are only added by the deep scan, once they have been read from the cue sheet
+        return Game(
+            sub_folder, selected_path, None, 0, [],
+            the_cue_sheet, self._cover_art_present(snapshot, cue_sheet), snapshot.exists(f'{cue_sheet[:-3]}cu2'), False,
+            snapshot.exists('MULTIDISC.LST'), False
+        )
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _cover_art_present(self, snapshot: DirectorySnapshot, cue_sheet: str) -> bool:
+        """Check the directory listing for the cover art of the game"""
+        return snapshot.exists(f'{cue_sheet[:-3]}bmp') or snapshot.exists(f'{cue_sheet[:-3]}BMP')
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _create_game_from_cue(self, game_directory_path: str, cue_sheet: str, sub_folder: str, selected_path: str, snapshot: DirectorySnapshot = None) -> Game:
+        """Create a Game object from a CUE sheet, all file checks are answered from a single directory listing."""
         cue_sheet_path = join(game_directory_path, cue_sheet)
-        game_name_from_cue = self._get_game_name_from_cue(cue_sheet_path)
+        if snapshot is None:
+            snapshot = DirectorySnapshot(game_directory_path)
+
+        # Reuse the catalogued game details if the cue sheet and its bin files have not changed
+        cue_data = None
+        game_details = self.catalog.lookup(cue_sheet_path, snapshot)
+        if game_details is None:
+            # Parse the cue sheet once, the parsed data is reused by every later stage
+            cue_data = parse_cue_sheet(cue_sheet_path, snapshot)
+            game_details = self._read_game_details(cue_data)
+            if cue_data.complete:
+                self.catalog.store(cue_sheet_path, game_details, game_details['bin_files'], snapshot)
 
         # Check for cover art
-        cover_art_path = join(game_directory_path, cue_sheet[:-3])
-        cover_art_present = exists(f'{cover_art_path}bmp') or exists(f'{cover_art_path}BMP')
+        cover_art_present = self._cover_art_present(snapshot, cue_sheet)
 
         # Check for multi-disc and CU2 files
-        multi_disc_file_present = exists(join(game_directory_path, 'MULTIDISC.LST'))
-        cu2_present = exists(join(game_directory_path, f'{cue_sheet[:-3]}cu2'))
-        cu2_required = self._detect_cdda(cue_sheet_path)
-
-        # Get game ID and disc information
-        bin_files = read_cue_file(cue_sheet_path)
-        game_id = self._get_game_id(bin_files[0].filename) if bin_files else None
-        disc_number = get_disc_number(game_id) if game_id else 0
-        bin_path = join(game_directory_path, f'{game_name_from_cue}.bin')
-        disc_collection = self._get_disc_collection(bin_path) if game_name_from_cue else []
-
-        # Get libcrypt status
-        libcrypt_required = get_libcrypt_status(game_id) if game_id else False
+        multi_disc_file_present = snapshot.exists('MULTIDISC.LST')
+        cu2_present = snapshot.exists(f'{cue_sheet[:-3]}cu2')
 
         # Create Cuesheet and associated Binfile objects
-        the_cue_sheet = Cuesheet(cue_sheet, cue_sheet_path, game_name_from_cue)
-        if bin_files:
-            for bin_file in bin_files:
-                the_cue_sheet.add_bin_file(Binfile(basename(bin_file.filename), bin_file.filename))
-
-        # Create and return the Game object
-        return Game(
-            sub_folder, selected_path, game_id, disc_number, disc_collection,
-            the_cue_sheet, cover_art_present, cu2_present, cu2_required,
-            multi_disc_file_present, libcrypt_required
+        the_cue_sheet = Cuesheet(cue_sheet, cue_sheet_path, game_details['game_name'])
+        the_cue_sheet.set_cue_data(cue_data)
+        for bin_file_path in game_details['bin_files']:
+            the_cue_sheet.add_bin_file(Binfile(basename(bin_file_path), bin_file_path))
+
+        # Create and return the Game object, the database details are added by _apply_database_metadata
+        game = Game(
+            sub_folder, selected_path, game_details['game_id'], 0, game_details['disc_collection'],
+            the_cue_sheet, cover_art_present, cu2_present, game_details['cu2_required'],
+            multi_disc_file_present, False
         )
+        game.set_block_check(bytes.fromhex(game_details['block_check']) if game_details['block_check'] else None)
+        return game
     # ************************************************************************************
 
 
     # ************************************************************************************
-    def _sort_game_list(self):
-        """Sort the game list alphabetically by game name."""
-        self.game_list.sort(key=lambda game: game.get_cue_sheet().get_game_name(), reverse=False)
-    # ************************************************************************************
+    def _read_game_details(self, cue_data) -> dict:
+        """Read the game details that are stored in the library catalog from the cue sheet and BIN header"""
+        game_name_from_cue = cue_data.get_game_name()
+        cu2_required = cue_data.uses_cdda
 
+        # Get game ID and disc information
+        bin_files = cue_data.files if cue_data.complete else ()
+        disc_header = self._probe_disc_header(bin_files[0].filename, cue_data.block_size) if bin_files else None
+        game_id = self._get_game_id(disc_header) if disc_header else None
+        disc_collection = list(disc_header.disc_ids) if disc_header else []
 
+        return {
+            'game_name': game_name_from_cue,
+            'bin_files': [bin_file.filename for bin_file in bin_files],
+            'game_id': game_id,
+            'disc_collection': disc_collection,
+            'cu2_required': cu2_required,
+            'block_check': disc_header.block_check.hex() if disc_header else '',
+        }
     # ************************************************************************************
-    def _get_sub_folders(self, selected_path: str) -> list:
-        """Get a list of sub-folders in the selected source directory"""
 
-        sub_folders = [
-            f.name for f in scandir(selected_path)
-            if f.is_dir()
-            and not f.name.startswith('.')
-            and f.name != 'System Volume Information'
-        ]
-
-        # If there are no sub-directories use the selected directory to search for files
-        if not sub_folders:
-            sub_folders = [selected_path]
 
-        return sub_folders
+    # ************************************************************************************
+    def _sort_game_list(self):
+        """Sort the game list alphabetically by game name."""
+        self.game_list.sort(key=lambda game: game.get_cue_sheet().get_game_name(), reverse=False)
     # ************************************************************************************
 
 
@@ -904,11 +1185,91 @@ class PSIOGameAssistant:
 
     # ************************************************************************************
     def _parse_game_list(self):
-        """Parse game list and display results"""
+        """
+        Scan the selected directory and display the games
+        The games are displayed from the directory listings straight away, the deep scan then runs
+        in a background thread and updates each row of the tree-view as its details are found
+        """
+        selected_path = self.src_path.get()
+        self.button_start['state'] = 'disabled'
+        self.button_browse['state'] = 'disabled'
+
+        # First phase: display the lightweight games from the directory listings
+        self.game_list = []
+        for item in self.treeview_game_list.get_children():
+            self.treeview_game_list.delete(item)
+
+        snapshots = {}
+        for game in self._scan_games(selected_path, snapshots):
+            self.game_list.append(game)
+            self.treeview_game_list.insert(parent='', index='end', iid=len(self.game_list) -1, text='',
+                                           values=self._game_row_values(game, pending=True))
+            if len(self.game_list) % 100 == 0:
+                self.label_progress.configure(text=f'{self.PROGRESS_STATUS} Found {len(self.game_list)} games')
+                self._update_window()
+
+        # Second phase: fill in the game details in the background
+        self.scan_queue = Queue()
+        quick_games = list(self.game_list)
+        Thread(target=self._deep_scan_worker, args=(selected_path, quick_games, snapshots), daemon=True).start()
+        self.window.after(100, self._poll_deep_scan, 0)
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _deep_scan_worker(self, selected_path: str, quick_games: list, snapshots: dict = None):
+        """Run the deep scan in a background thread, passing each game back to the GUI thread through the scan queue"""
+        games = None
+        try:
+            games = self._deep_scan_games(selected_path, quick_games, on_game=lambda index, game: self.scan_queue.put((index, game)),
+                                          snapshots=snapshots)
+        except Exception as error:
+            print(f'Error scanning games: {error}')
+        finally:
+            self.scan_queue.put((None, games))
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _poll_deep_scan(self, games_scanned: int):
+        """Update the tree-view rows with the games that the deep scan has finished, until the scan is complete"""
+        while True:
+            try:
+                index, game = self.scan_queue.get_nowait()
+            except Empty:
+                break
+
+            # The scan has finished, replace the lightweight games with the fully scanned games
+            if index is None:
+                self.button_browse['state'] = 'normal'
+
+                # The lightweight games are not safe to process, so the list is cleared if the scan failed
+                if game is None:
+                    self.game_list = []
+                    self._display_game_list()
+                    self.label_progress.configure(text=f'{self.PROGRESS_STATUS} Error scanning games')
+                    return
 
-        # Create the game list
-        self._create_game_list(self.src_path.get())
+                self.game_list = game
+                self._sort_game_list()
+                self._display_game_list()
+                self.label_progress.configure(text=self.PROGRESS_STATUS)
+                self.button_start['state'] = 'normal'
+                self._show_game_summary()
+                return
 
+            self.game_list[index] = game
+            self.treeview_game_list.item(index, values=self._game_row_values(game))
+            games_scanned += 1
+
+        self.label_progress.configure(text=f'{self.PROGRESS_STATUS} Identifying games {games_scanned}/{len(self.game_list)}')
+        self.window.after(100, self._poll_deep_scan, games_scanned)
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _show_game_summary(self):
+        """Display a message dialog box showing the game counts"""
         unidentified_games = 0
         games_without_cover = 0
         multi_discs = 0
@@ -963,9 +1324,6 @@ class PSIOGameAssistant:
             padding=(20, 20)
         )
         md.show()
-
-        self._display_game_list()
-        self._update_window()
     # ************************************************************************************
 
 
@@ -978,31 +1336,38 @@ class PSIOGameAssistant:
             self.treeview_game_list.delete(item)
 
         # Populate the tree-view using the game list
-        bools = ('No', 'Yes')
         for count, game in enumerate(self.game_list):
-            game_id = game.get_id()
-            game_name = game.get_cue_sheet().get_game_name()
-            disc_number = game.get_disc_number()
-            number_of_bins = len(game.get_cue_sheet().get_bin_files())
-            name_valid = bools[len(game.get_cue_sheet().get_game_name()) <= self.MAX_GAME_NAME_LENGTH and '.' not in game.get_cue_sheet().get_game_name()]
-            cu2_present = bools[game.get_cu2_present()] if game.get_cu2_required() else "*"
+            self.treeview_game_list.insert(parent='', index=count, iid=count, text='', values=self._game_row_values(game))
+    # ************************************************************************************
 
-            # Check if the games is a multi-disc game and if an LST file is available
-            lst_present = "*"
-            if game.get_disc_number() > 0:
-                lst_present = "yes" if game.get_multi_disc_file_present() else "No"
 
-            # Check if the cover art is available
-            bmp_present = bools[game.get_cover_art_present()]
+    # ************************************************************************************
+    def _game_row_values(self, game: Game, pending: bool = False) -> tuple:
+        """Get the tree-view column values for a game, pending games have not been deep scanned yet"""
+        bools = ('No', 'Yes')
+        game_name = game.get_cue_sheet().get_game_name()
+        number_of_bins = len(game.get_cue_sheet().get_bin_files())
+        name_valid = bools[len(game_name) <= self.MAX_GAME_NAME_LENGTH and '.' not in game_name]
+        bmp_present = bools[game.get_cover_art_present()]
 
-            # Check if the game requires LibCrypt patching and if a patch is available
-            patch_available = "*"
-            if game.get_libcrypt_required():
-                patch_available = "Yes" if libcrypt_patch_available(game.get_id()) else "No"
+        if pending:
+            return ('...', game_name, '...', '...', name_valid, bmp_present, '...', '...', '...')
 
-            # Insert the data into the tree-view
-            self.treeview_game_list.insert(parent='', index=count, iid=count, text='',
-                                        values=(game_id, game_name, disc_number, number_of_bins, name_valid, bmp_present, cu2_present, lst_present, patch_available))
+        game_id = game.get_id()
+        disc_number = game.get_disc_number()
+        cu2_present = bools[game.get_cu2_present()] if game.get_cu2_required() else "*"
+
+        # Check if the games is a multi-disc game and if an LST file is available
+        lst_present = "*"
+        if game.get_disc_number() > 0:
+            lst_present = "yes" if game.get_multi_disc_file_present() else "No"
+
+        # Check if the game requires LibCrypt patching and if a patch is available
+        patch_available = "*"
+        if game.get_libcrypt_required():
+            patch_available = "Yes" if self._libcrypt_patch_available(game) and not game.get_id_from_name() else "No"
+
+        return (game_id, game_name, disc_number, number_of_bins, name_valid, bmp_present, cu2_present, lst_present, patch_available)
     # ************************************************************************************
 
 
@@ -1059,10 +1424,11 @@ class PSIOGameAssistant:
     def _browse_button_clicked(self):
         """Handle browse button click"""
         selected_path = filedialog.askdirectory(initialdir='/', title='Select Game Directory')
+        if not selected_path:
+            return
         self.src_path.set(selected_path)
         self.label_src.configure(text= f"  {self.src_path.get()}")
         self._parse_game_list()
-        self.button_start['state'] = 'normal'
 
     def _start_button_clicked(self):
         """Handle start button click"""
@@ -1075,18 +1441,41 @@ class PSIOGameAssistant:
         """Handle checkbox change"""
         self.redump_rename.set(True if self.redump_rename.get() else False)
 
+    def _read_config(self) -> dict:
+        """Read the stored config, returning an empty config if there is none"""
+        if exists(self.config_file_path):
+            try:
+                with open(self.config_file_path, encoding="utf-8") as config_file:
+                    config = load(config_file)
+                return config if isinstance(config, dict) else {}
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def _store_config(self, **values):
+        """Store values in the config, keeping the values already stored"""
+        config = self._read_config()
+        config.update(values)
+        with open(self.config_file_path, mode="w", encoding="utf-8") as config_file:
+            config_file.write(dumps(config))
+
     def _get_stored_theme(self):
         """Get stored theme from config"""
-        if exists(self.config_file_path):
-            with open(self.config_file_path, encoding="utf-8") as config_file:
-                return load(config_file)['theme']
-        else:
-            return "superhero"
+        return self._read_config().get('theme', "superhero")
 
     def _store_selected_theme(self, theme_name):
         """Store selected theme"""
-        with open(self.config_file_path, mode="w", encoding="utf-8") as config_file:
-            config_file.write(dumps({"theme": theme_name}))
+        self._store_config(theme=theme_name)
+
+    def _load_merge_strategies(self):
+        """Load the merge strategy calibrated for each file system from the config"""
+        set_merge_strategies(self._read_config().get('merge_strategies'))
+
+    def _store_merge_strategies(self):
+        """Store the calibrated merge strategies in the config, if any file systems have been calibrated"""
+        merge_strategies = get_merge_strategies()
+        if merge_strategies != self._read_config().get('merge_strategies'):
+            self._store_config(merge_strategies=merge_strategies)
 
     def _switch_theme(self, theme_name):
         """Switch UI theme"""
@@ -1177,8 +1566,8 @@ class PSIOGameAssistant:
         self.label_src = Label(self.window, text=self.src_path.get(), width=60, borderwidth=2, relief='solid', bootstyle="primary", font=("Arial", 11))
         self.label_src.place(x=30, y=35, width=window_width -200, height=30)
 
-        button_src_browse = Button(self.window, text='Browse', bootstyle="primary", command=self._browse_button_clicked)
-        button_src_browse.place(x=840, y=35, width=window_width -870, height=30)
+        self.button_browse = Button(self.window, text='Browse', bootstyle="primary", command=self._browse_button_clicked)
+        self.button_browse.place(x=840, y=35, width=window_width -870, height=30)
     # ************************************************************************************
 
 
@@ -1243,7 +1632,65 @@ class PSIOGameAssistant:
         self.button_start = Button(self.window, text='Process', command=self._start_button_clicked, state=DISABLED)
         self.button_start.place(x=30, y=frame_y +140, width=window_width -50, height=30)
 
-        self.label_progress.after(1000, ensure_database_exists)
+        self.label_progress.after(1000, self._prepare_database)
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _prepare_database(self):
+        """
+        Merge the database split-files in a background thread, the first launch can take a while on slow disks
+        Browsing for games is disabled until the database is ready
+        """
+        self.button_browse['state'] = 'disabled'
+        self.database_queue = Queue()
+
+        def report_progress(copied: int, total: int):
+            self.database_queue.put((copied, total))
+
+        def prepare():
+            error = None
+            try:
+                error = ensure_database_exists(report_progress)
+            except Exception as exception:
+                error = str(exception)
+            finally:
+                self.database_queue.put((None, error))
+
+        Thread(target=prepare, daemon=True).start()
+        self.window.after(100, self._poll_database)
+    # ************************************************************************************
+
+
+    # ************************************************************************************
+    def _poll_database(self):
+        """Show the progress of the database merge, until the database is ready"""
+        progress = None
+        while True:
+            try:
+                copied, total = self.database_queue.get_nowait()
+            except Empty:
+                break
+
+            # The database is ready, or it could not be created
+            if copied is None:
+                self.progress_bar['value'] = 0
+                self.label_progress.configure(text=self.PROGRESS_STATUS)
+                if total is not None:
+                    MessageDialog(f'{total}\n\nThe application will now close.', title='Database Error', width=650, padding=(20, 20)).show()
+                    self.window.destroy()
+                    return
+                self.button_browse['state'] = 'normal'
+                return
+
+            progress = (copied, total)
+
+        if progress is not None:
+            percent = int(progress[0] * 100 / progress[1]) if progress[1] else 100
+            self.progress_bar['value'] = percent
+            self.label_progress.configure(text=f'{self.PROGRESS_STATUS} Preparing the game database {percent}%')
+
+        self.window.after(100, self._poll_database)
     # ************************************************************************************
 
 
@@ -1264,6 +1711,39 @@ def parse_arguments():
         action="store_true",
         help="Enable debug mode for verbose output."
     )
+
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=PSIOGameAssistant.DEFAULT_SCAN_WORKERS,
+        help="Number of threads used to scan the game directories (1 scans sequentially)."
+    )
+
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=PSIOGameAssistant.DEFAULT_SCAN_DEPTH,
+        help="Number of directory levels to search for games, for nested layouts such as Letter/Game."
+    )
+
+    parser.add_argument(
+        "-m", "--merge-jobs",
+        type=int,
+        default=DEFAULT_JOBS_PER_DEVICE,
+        help="Number of bin merges run at the same time on each disk."
+    )
+
+    parser.add_argument(
+        "--direct-io",
+        action="store_true",
+        help="Read the bin files with O_DIRECT when merging, so the merges do not use the page cache (Linux)."
+    )
+
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="Find the fastest merge method for each disk by merging a few MB of test data on it, the result is kept in the config."
+    )
     return parser.parse_args()
 
 
@@ -0,0 +1,111 @@
+'''
+Shared test fixtures
+The application modules live in src and import each other by name, so src is put on the import path
+'''
+
+import sys
+from os.path import abspath, dirname, join
+from sqlite3 import connect
+from struct import pack
+
+import pytest
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), 'src'))
+
+import db
+
+RAW_SECTOR_SIZE = 2352
+
+# The games of the test database, as (game_id, name, disc_number, libcrypt)
+DATABASE_GAMES = (
+    ('SLUS-00743', 'Zeta Game (USA)', 0, 0),
+    ('SCES-01237', 'Alpha Game (Europe)', 0, 0),
+    ('SLUS-00907', 'Mid Game (USA) (Disc 1)', 1, 0),
+    ('SLUS-00908', 'Mid Game (USA) (Disc 2)', 2, 0),
+    ('SLUS-01251', 'Final Fantasy IX (USA) (Disc 1)', 1, 0),
+    ('SCES-02105', 'Final Fantasy VII International Edition Bonus Disc (Europe)', 0, 0),
+    ('SLES-02965', 'Final Fantasy IX (Europe) (Disc 1)', 1, 0),
+)
+
+
+# ************************************************************************************
+def write_wave(path, pcm: bytes, channels: int = 2, sample_rate: int = 44100, bits_per_sample: int = 16, extra_chunk: bool = False):
+    """Write a PCM WAVE file, optionally with a LIST chunk of odd size before the data chunk"""
+    block_align = channels * bits_per_sample // 8
+    fmt = pack('<HHIIHH', 1, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample)
+    chunks = b'fmt ' + pack('<I', len(fmt)) + fmt
+    if extra_chunk:
+        chunks += b'LIST' + pack('<I', 5) + b'abcde\0'
+    chunks += b'data' + pack('<I', len(pcm)) + pcm
+    with open(path, 'wb') as wave_file:
+        wave_file.write(b'RIFF' + pack('<I', 4 + len(chunks)) + b'WAVE' + chunks)
+# ************************************************************************************
+
+
+# ************************************************************************************
+@pytest.fixture
+def two_track_game(tmp_path):
+    """A game with a data track and an audio track in separate bin files, returns the cue path and the track data"""
+    data_track = bytes(range(256)) * (RAW_SECTOR_SIZE * 30 // 256)
+    audio_track = b'\x5a' * (RAW_SECTOR_SIZE * 7)
+    (tmp_path / 'Game (Track 1).bin').write_bytes(data_track)
+    (tmp_path / 'Game (Track 2).bin').write_bytes(audio_track)
+    cue_path = tmp_path / 'Game.cue'
+    cue_path.write_text('FILE "Game (Track 1).bin" BINARY\n'
+                        '  TRACK 01 MODE2/2352\n'
+                        '    INDEX 01 00:00:00\n'
+                        'FILE "Game (Track 2).bin" BINARY\n'
+                        '  TRACK 02 AUDIO\n'
+                        '    INDEX 00 00:00:00\n'
+                        '    INDEX 01 00:02:00\n')
+    return str(cue_path), data_track, audio_track
+# ************************************************************************************
+
+
+# ************************************************************************************
+@pytest.fixture
+def game_database(tmp_path):
+    """
+    A database in the original (schema version 0) layout, which is migrated to the current schema version
+    Returns the path of the database file
+    """
+    database_path = tmp_path / 'database'
+    database_path.mkdir()
+    database_file = database_path / 'psio_assist.db'
+
+    conn = connect(str(database_file))
+    with conn:
+        conn.execute('CREATE TABLE games (id INTEGER PRIMARY KEY, game_id TEXT, name TEXT, disc_number INTEGER, libcrypt INTEGER)')
+        conn.execute('CREATE TABLE covers (id INTEGER PRIMARY KEY, game_id TEXT, psio BLOB)')
+        conn.execute('CREATE TABLE libcrypt_patches (id INTEGER PRIMARY KEY, game_id TEXT, psio BLOB)')
+        conn.executemany('INSERT INTO games (game_id, name, disc_number, libcrypt) VALUES (?, ?, ?, ?)', DATABASE_GAMES)
+    conn.close()
+
+    db.set_database_path(str(database_path), database_file.name)
+    assert db.migrate_database()
+    yield str(database_file)
+    db.close_connections()
+# ************************************************************************************
+
+
+# ************************************************************************************
+@pytest.fixture
+def wave_game(tmp_path):
+    """
+    A game with a data track and a WAVE audio track that does not end on a sector boundary
+    Returns the cue path and the expected merged image, with the PCM data padded with silence to whole sectors
+    """
+    data_track = bytes(range(256)) * (RAW_SECTOR_SIZE * 10 // 256)
+    pcm = b'\x12\x34' * (RAW_SECTOR_SIZE * 3 // 2 + 500)
+    (tmp_path / 'Game (Track 1).bin').write_bytes(data_track)
+    write_wave(tmp_path / 'Game (Track 2).wav', pcm, extra_chunk=True)
+    cue_path = tmp_path / 'Game.cue'
+    cue_path.write_text('FILE "Game (Track 1).bin" BINARY\n'
+                        '  TRACK 01 MODE2/2352\n'
+                        '    INDEX 01 00:00:00\n'
+                        'FILE "Game (Track 2).wav" WAVE\n'
+                        '  TRACK 02 AUDIO\n'
+                        '    INDEX 00 00:00:00\n'
+                        '    INDEX 01 00:02:00\n')
+    return str(cue_path), data_track + pcm + bytes(-len(pcm) % RAW_SECTOR_SIZE)
+# ************************************************************************************
@@ -0,0 +1,185 @@
+'''
+Tests for merging the tracks of a game into a single bin file
+'''
+
+from hashlib import md5
+from os import listdir, stat
+from os.path import dirname, join
+from threading import active_count
+
+import pytest
+
+import binmerge
+from binmerge import MERGE_STRATEGIES, MergeHasher, MergeStrategy, start_bin_merge
+
+# A small block size, so every copy takes several blocks
+TEST_BLOCK_SIZE = 64 * 1024
+
+
+# ************************************************************************************
+@pytest.mark.parametrize('strategy', MERGE_STRATEGIES)
+def test_in_place_merge_appends_to_the_data_track(two_track_game, strategy):
+    cue_path, data_track, audio_track = two_track_game
+    game_dir = dirname(cue_path)
+    first_bin = join(game_dir, 'Game (Track 1).bin')
+    inode = stat(first_bin).st_ino
+
+    result = start_bin_merge(cue_path, 'Game', game_dir, in_place=True, strategy=MergeStrategy(strategy, TEST_BLOCK_SIZE))
+
+    assert result.size == len(data_track) + len(audio_track)
+    with open(result.bin_path, 'rb') as bin_file:
+        assert bin_file.read() == data_track + audio_track
+
+    # The data track became the merged bin file, it was never copied
+    assert stat(result.bin_path).st_ino == inode
+    assert sorted(listdir(game_dir)) == ['Game (Track 2).bin', 'Game.bin', 'Game.cue']
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_in_place_merge_hashes_every_track(two_track_game):
+    cue_path, data_track, audio_track = two_track_game
+
+    result = start_bin_merge(cue_path, 'Game', dirname(cue_path), in_place=True, hash_output=True)
+
+    assert [(track.file_name, track.size) for track in result.tracks] == [
+        ('Game (Track 1).bin', len(data_track)), ('Game (Track 2).bin', len(audio_track))]
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _assert_restored(game_dir: str, data_track: bytes):
+    """The first bin file is back to its original name and contents, and no merged or partial files are left"""
+    with open(join(game_dir, 'Game (Track 1).bin'), 'rb') as bin_file:
+        assert bin_file.read() == data_track
+    assert sorted(listdir(game_dir)) == ['Game (Track 1).bin', 'Game (Track 2).bin', 'Game.cue']
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_failed_cue_rename_is_rolled_back(two_track_game, monkeypatch):
+    cue_path, data_track, _ = two_track_game
+    real_replace = binmerge.replace
+
+    def failing_replace(src, dst):
+        if src.endswith('.cue.partial'):
+            raise OSError('Disk full')
+        real_replace(src, dst)
+
+    monkeypatch.setattr(binmerge, 'replace', failing_replace)
+
+    assert start_bin_merge(cue_path, 'New', dirname(cue_path), in_place=True) is None
+    _assert_restored(dirname(cue_path), data_track)
+# ************************************************************************************
+
+
+# ************************************************************************************
+@pytest.mark.parametrize('hash_output', (False, True))
+def test_failed_append_is_truncated(two_track_game, monkeypatch, hash_output):
+    cue_path, data_track, _ = two_track_game
+    real_copy = binmerge._pipelined_copy
+
+    def failing_copy(sources, out_file, hasher=None, block_size=None):
+        if out_file is None:
+            return real_copy(sources, out_file, hasher, block_size)
+
+        # Part of the track is written before the copy fails
+        out_file.write(b'\xff' * 1000)
+        raise OSError('Read error')
+
+    monkeypatch.setattr(binmerge, '_zero_copy_supported', lambda: False)
+    monkeypatch.setattr(binmerge, '_pipelined_copy', failing_copy)
+
+    assert start_bin_merge(cue_path, 'New', dirname(cue_path), in_place=True, hash_output=hash_output) is None
+    _assert_restored(dirname(cue_path), data_track)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_pipelined_copy_hashes_each_track(two_track_game, tmp_path):
+    cue_path, data_track, audio_track = two_track_game
+    sources = [join(dirname(cue_path), 'Game (Track 1).bin'), join(dirname(cue_path), 'Game (Track 2).bin')]
+    hasher = MergeHasher()
+
+    with open(tmp_path / 'Merged.bin', 'wb') as out_file:
+        binmerge._pipelined_copy(sources, out_file, hasher, TEST_BLOCK_SIZE)
+
+    assert (tmp_path / 'Merged.bin').read_bytes() == data_track + audio_track
+    result = hasher.result('Merged.bin', 'Merged.cue')
+    assert result.md5 == md5(data_track + audio_track).hexdigest()
+    assert [(track.file_name, track.md5) for track in result.tracks] == [
+        ('Game (Track 1).bin', md5(data_track).hexdigest()), ('Game (Track 2).bin', md5(audio_track).hexdigest())]
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_pipelined_copy_raises_reader_errors(two_track_game, tmp_path, monkeypatch):
+    """An error on the reader thread is raised by the writer, rather than ending the copy early"""
+    cue_path, _, _ = two_track_game
+    sources = [join(dirname(cue_path), 'Game (Track 1).bin'), join(dirname(cue_path), 'Game (Track 2).bin')]
+    real_source_range = binmerge._source_range
+
+    def failing_source_range(source):
+        if source.endswith('(Track 2).bin'):
+            raise ValueError('Bad WAVE header')
+        return real_source_range(source)
+
+    monkeypatch.setattr(binmerge, '_source_range', failing_source_range)
+    threads = active_count()
+
+    with open(tmp_path / 'Merged.bin', 'wb') as out_file:
+        with pytest.raises(ValueError):
+            binmerge._pipelined_copy(sources, out_file, MergeHasher(), TEST_BLOCK_SIZE)
+    assert active_count() == threads
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_pipelined_copy_stops_reader_on_write_error(two_track_game):
+    """The reader thread is stopped when a write fails, even while it is waiting for a free buffer"""
+    cue_path, _, _ = two_track_game
+    threads = active_count()
+
+    class FailingFile:
+        def write(self, data):
+            raise OSError('Disk full')
+
+    with pytest.raises(OSError):
+        binmerge._pipelined_copy([join(dirname(cue_path), 'Game (Track 1).bin')], FailingFile(), block_size=4096)
+    assert active_count() == threads
+# ************************************************************************************
+
+
+# ************************************************************************************
+@pytest.mark.parametrize('in_place', (False, True))
+def test_failed_read_leaves_no_merged_file(two_track_game, monkeypatch, in_place):
+    cue_path, data_track, _ = two_track_game
+    real_source_range = binmerge._source_range
+
+    def failing_source_range(source):
+        if binmerge._source_path(source).endswith('(Track 2).bin'):
+            raise ValueError('Bad WAVE header')
+        return real_source_range(source)
+
+    monkeypatch.setattr(binmerge, '_source_range', failing_source_range)
+
+    assert start_bin_merge(cue_path, 'New', dirname(cue_path), in_place=in_place, hash_output=True) is None
+    _assert_restored(dirname(cue_path), data_track)
+# ************************************************************************************
+
+
+# ************************************************************************************
+@pytest.mark.parametrize('strategy', MERGE_STRATEGIES)
+@pytest.mark.parametrize('in_place, hash_output', [(False, False), (False, True), (True, False), (True, True)])
+def test_wave_track_is_padded_in_merge(wave_game, strategy, in_place, hash_output):
+    cue_path, merged_image = wave_game
+
+    result = start_bin_merge(cue_path, 'Game', dirname(cue_path), in_place=in_place, hash_output=hash_output,
+                             strategy=MergeStrategy(strategy, TEST_BLOCK_SIZE))
+
+    assert result.size == len(merged_image)
+    with open(result.bin_path, 'rb') as bin_file:
+        assert bin_file.read() == merged_image
+    if hash_output:
+        assert result.md5 == md5(merged_image).hexdigest()
+# ************************************************************************************
@@ -0,0 +1,108 @@
+'''
+Tests for the library catalog and its file fingerprints
+'''
+
+from os import stat, utime
+
+from catalog import LibraryCatalog, file_fingerprint
+from dir_snapshot import DirectorySnapshot
+
+
+# ************************************************************************************
+def _stored_catalog(tmp_path, cue_path, bin_paths, details):
+    """Store a game in a new catalog, save it and load it back"""
+    catalog_path = str(tmp_path / 'catalog.db')
+    catalog = LibraryCatalog(catalog_path)
+    catalog.load('source')
+    catalog.store(cue_path, details, bin_paths)
+    catalog.save(str(tmp_path))
+
+    catalog = LibraryCatalog(catalog_path)
+    catalog.load('source')
+    return catalog
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_lookup_after_save(tmp_path, two_track_game):
+    cue_path, _, _ = two_track_game
+    bin_paths = [str(tmp_path / 'Game (Track 1).bin'), str(tmp_path / 'Game (Track 2).bin')]
+    catalog = _stored_catalog(tmp_path, cue_path, bin_paths, {'id': 'SLUS_00743'})
+
+    assert catalog.lookup(cue_path) == {'id': 'SLUS_00743'}
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_size_change_invalidates_entry(tmp_path, two_track_game):
+    cue_path, _, _ = two_track_game
+    bin_path = tmp_path / 'Game (Track 2).bin'
+    catalog = _stored_catalog(tmp_path, cue_path, [str(bin_path)], {'id': 'SLUS_00743'})
+
+    # Keep the modification time, so only the size differs
+    st = stat(bin_path)
+    with open(bin_path, 'ab') as bin_file:
+        bin_file.write(b'\0')
+    utime(bin_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert catalog.lookup(cue_path) is None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_mtime_change_invalidates_entry(tmp_path, two_track_game):
+    cue_path, _, _ = two_track_game
+    catalog = _stored_catalog(tmp_path, cue_path, [], {'id': 'SLUS_00743'})
+
+    st = stat(cue_path)
+    utime(cue_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+    assert catalog.lookup(cue_path) is None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_missing_bin_file_is_not_stored(tmp_path, two_track_game):
+    cue_path, _, _ = two_track_game
+    catalog = _stored_catalog(tmp_path, cue_path, [str(tmp_path / 'Missing.bin')], {'id': 'SLUS_00743'})
+
+    assert catalog.lookup(cue_path) is None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_source_change_clears_catalog(tmp_path, two_track_game):
+    cue_path, _, _ = two_track_game
+    _stored_catalog(tmp_path, cue_path, [], {'id': 'SLUS_00743'})
+
+    catalog = LibraryCatalog(str(tmp_path / 'catalog.db'))
+    catalog.load('new source')
+    assert catalog.lookup(cue_path) is None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_fingerprint_is_size_and_mtime(two_track_game):
+    cue_path, _, _ = two_track_game
+    st = stat(cue_path)
+
+    assert file_fingerprint(cue_path) == [st.st_size, st.st_mtime_ns]
+    assert file_fingerprint(cue_path + '.missing') is None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_snapshot_fingerprint_matches_stat(tmp_path, two_track_game):
+    """An entry stored from a directory snapshot is still valid when looked up with os.stat"""
+    cue_path, _, _ = two_track_game
+    bin_path = str(tmp_path / 'Game (Track 1).bin')
+    snapshot = DirectorySnapshot(str(tmp_path))
+    assert file_fingerprint(bin_path, snapshot) == file_fingerprint(bin_path)
+
+    catalog = LibraryCatalog(str(tmp_path / 'catalog.db'))
+    catalog.load('source')
+    catalog.store(cue_path, {'id': 'SLUS_00743'}, [bin_path], snapshot)
+    catalog.save(str(tmp_path))
+    catalog.load('source')
+    assert catalog.lookup(cue_path) == {'id': 'SLUS_00743'}
+# ************************************************************************************
@@ -0,0 +1,98 @@
+'''
+Tests for the single pass cue sheet parser
+'''
+
+from os.path import basename
+
+from conftest import RAW_SECTOR_SIZE, write_wave
+from cue_parser import cuestamp_to_sectors, parse_cue_sheet, read_wave_header, sectors_to_cuestamp
+
+
+# ************************************************************************************
+def test_cuestamp_round_trip():
+    assert cuestamp_to_sectors('00:02:00') == 150
+    assert cuestamp_to_sectors('01:00:74') == 60 * 75 + 74
+    assert sectors_to_cuestamp(60 * 75 + 74) == '01:00:74'
+    assert sectors_to_cuestamp(cuestamp_to_sectors('12:34:56')) == '12:34:56'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_parse_multi_track_cue(two_track_game):
+    cue_path, data_track, audio_track = two_track_game
+    cue_data = parse_cue_sheet(cue_path)
+
+    assert cue_data.complete
+    assert cue_data.block_size == RAW_SECTOR_SIZE
+    assert [basename(f.filename) for f in cue_data.files] == ['Game (Track 1).bin', 'Game (Track 2).bin']
+    assert [f.size for f in cue_data.files] == [len(data_track), len(audio_track)]
+    assert cue_data.uses_cdda and cue_data.is_mode2_2352
+    assert cue_data.file_start_sectors() == (0, len(data_track) // RAW_SECTOR_SIZE)
+    assert cue_data.tracks[1].get_index(1).file_offset == 150
+    assert cue_data.get_game_name() == 'Game'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_track_01_fallback(tmp_path):
+    """A single track game whose bin file has lost the ' (Track 01)' suffix referenced by its cue sheet"""
+    (tmp_path / 'Game.bin').write_bytes(bytes(RAW_SECTOR_SIZE * 4))
+    cue_path = tmp_path / 'Game.cue'
+    cue_path.write_text('FILE "Game (Track 01).bin" BINARY\n  TRACK 01 MODE2/2352\n    INDEX 01 00:00:00\n')
+
+    cue_data = parse_cue_sheet(str(cue_path))
+    assert cue_data.complete
+    assert basename(cue_data.files[0].filename) == 'Game.bin'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_missing_bin_file(two_track_game, tmp_path):
+    cue_path, _, _ = two_track_game
+    (tmp_path / 'Game (Track 2).bin').unlink()
+
+    cue_data = parse_cue_sheet(cue_path)
+    assert not cue_data.complete
+    assert cue_data.missing_files == ('Game (Track 2).bin',)
+    assert cue_data.get_game_name() == ''
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_wave_header_skips_odd_chunks(tmp_path):
+    pcm = b'\x01\x02' * 1000
+    wave_path = tmp_path / 'Track.wav'
+    write_wave(wave_path, pcm, extra_chunk=True)
+
+    wave_info = read_wave_header(str(wave_path))
+    assert wave_info.is_cd_audio
+    assert wave_info.data_size == len(pcm)
+    assert wave_path.read_bytes()[wave_info.data_offset:] == pcm
+    assert read_wave_header(str(tmp_path / 'Missing.wav')) is None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_wave_file_is_padded_to_whole_sectors(wave_game):
+    cue_path, merged_image = wave_game
+    cue_data = parse_cue_sheet(cue_path)
+
+    assert cue_data.complete
+    wave_file = cue_data.files[1]
+    assert wave_file.file_type == 'WAVE'
+    assert wave_file.size % RAW_SECTOR_SIZE == 0
+    assert cue_data.files[0].size + wave_file.size == len(merged_image)
+    assert wave_file.data_size == RAW_SECTOR_SIZE * 3 + 1000
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_wave_file_that_is_not_cd_audio(tmp_path):
+    write_wave(tmp_path / 'Track.wav', bytes(1000), channels=1)
+    cue_path = tmp_path / 'Game.cue'
+    cue_path.write_text('FILE "Track.wav" WAVE\n  TRACK 01 AUDIO\n    INDEX 01 00:00:00\n')
+
+    cue_data = parse_cue_sheet(str(cue_path))
+    assert not cue_data.complete
+    assert cue_data.invalid_files == ('Track.wav',)
+# ************************************************************************************
@@ -0,0 +1,137 @@
+'''
+Tests for importing a Redump DAT into the local database
+'''
+
+from sqlite3 import connect
+from xml.etree.ElementTree import ParseError
+from zipfile import ZipFile
+
+import pytest
+
+import dat_import
+import db
+from dat_import import import_redump_dat, iter_dat_games
+
+DAT_FILE = '''<?xml version="1.0"?>
+<datafile>
+  <header><name>Sony - PlayStation</name></header>
+  <game name="Zeta Game Renamed (USA)">
+    <serial>SLUS-00743</serial>
+    <rom name="Zeta Game Renamed (USA).cue" size="100" crc="AA"/>
+    <rom name="Zeta Game Renamed (USA) (Track 1).bin" size="4704" crc="DEADBEEF" md5="ABC" sha1="F00"/>
+    <rom name="Zeta Game Renamed (USA) (Track 2).bin" size="2352" crc="01020304"/>
+  </game>
+  <game name="Alpha Game (Europe)">
+    <rom name="Alpha Game (Europe).bin" size="10" crc="11111111"/>
+    <rom name="Alpha Game (Europe).sbi" size="10"/>
+  </game>
+  <game name="Mid Game (USA)">
+    <serial>SLUS-00907</serial>
+  </game>
+  <game name="Unknown Game (Japan)">
+    <rom name="Unknown Game (Japan).bin" size="10" crc="1"/>
+  </game>
+  <game name="New Game (Japan) (Disc 2)">
+    <serial>SLPS-01234, SLPS-91234</serial>
+  </game>
+</datafile>
+'''
+
+
+# ************************************************************************************
+def _rows(database_file: str, query: str, parameters=()):
+    conn = connect(database_file)
+    try:
+        return conn.execute(query, parameters).fetchall()
+    finally:
+        conn.close()
+# ************************************************************************************
+
+
+# ************************************************************************************
+@pytest.fixture
+def dat_file(tmp_path):
+    dat_path = tmp_path / 'redump.dat'
+    dat_path.write_text(DAT_FILE, encoding='utf-8')
+    return str(dat_path)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_read_dat_games(dat_file):
+    games = list(iter_dat_games(dat_file))
+
+    assert [game.name for game in games][:2] == ['Zeta Game Renamed (USA)', 'Alpha Game (Europe)']
+    assert games[0].serials == ('SLUS_00743',)
+    assert games[0].tracks[0] == ('Zeta Game Renamed (USA) (Track 1).bin', 4704, 'deadbeef', 'abc', 'f00')
+    assert games[1].libcrypt and not games[0].libcrypt
+    assert games[4].serials == ('SLPS_01234', 'SLPS_91234') and games[4].disc_number == 2
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_import_matches_by_serial_and_name(game_database, dat_file):
+    summary = import_redump_dat(dat_file)
+
+    assert (summary.games_read, summary.games_updated, summary.games_added, summary.games_skipped) == (5, 3, 2, 1)
+    assert summary.tracks == 3
+
+    # Matched by serial, with the tracks stored for verifying merges
+    assert db.get_redump_name('SLUS-00743') == 'Zeta Game Renamed (USA)'
+    assert [track[:3] for track in db.get_game_tracks('SLUS-00743')] == [
+        ('Zeta Game Renamed (USA) (Track 1).bin', 4704, 'deadbeef'), ('Zeta Game Renamed (USA) (Track 2).bin', 2352, '01020304')]
+
+    # Matched by name, the SBI file marks the game as LibCrypt protected
+    assert db.get_libcrypt_status('SCES-01237') == 1
+
+    # Each serial of a new game is added
+    assert db.get_redump_name('SLPS-91234') == 'New Game (Japan) (Disc 2)'
+    assert db.get_disc_number('SLPS-01234') == 2
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_import_rewrites_disc_sets(game_database, dat_file):
+    assert _rows(game_database, 'SELECT set_id FROM disc_sets WHERE game_key = ?', ('SLUS_00907',)) == [('Mid Game (USA)',)]
+
+    import_redump_dat(dat_file)
+
+    # The disc number is now 0, so the game is no longer part of a set
+    assert _rows(game_database, 'SELECT set_id FROM disc_sets WHERE game_key = ?', ('SLUS_00907',)) == []
+    assert _rows(game_database, 'SELECT set_id, disc_order FROM disc_sets WHERE game_key = ?', ('SLPS_01234',)) == [('New Game (Japan)', 2)]
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_import_rebuilds_name_index(game_database, dat_file):
+    import_redump_dat(dat_file)
+
+    assert db.find_games_by_name('Zeta Game Renamed', 1)[0].game_id == 'SLUS-00743'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_import_from_zip(game_database, tmp_path):
+    zip_path = tmp_path / 'redump.zip'
+    with ZipFile(zip_path, 'w') as archive:
+        archive.writestr('readme.txt', 'not a DAT')
+        archive.writestr('Sony - PlayStation.dat', DAT_FILE)
+
+    assert import_redump_dat(str(zip_path)).games_read == 5
+    assert db.get_redump_name('SLUS-00743') == 'Zeta Game Renamed (USA)'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_failed_import_changes_nothing(game_database, tmp_path, monkeypatch):
+    # Every game is written before the parse error is reached, so they all have to be rolled back
+    monkeypatch.setattr(dat_import, 'IMPORT_BATCH_SIZE', 1)
+    dat_path = tmp_path / 'broken.dat'
+    dat_path.write_text(DAT_FILE.replace('</datafile>', '<game name="Broken"'), encoding='utf-8')
+
+    with pytest.raises(ParseError):
+        import_redump_dat(str(dat_path))
+
+    assert db.get_redump_name('SLUS-00743') == 'Zeta Game (USA)'
+    assert _rows(game_database, 'SELECT COUNT(*) FROM game_tracks') == [(0,)]
+# ************************************************************************************
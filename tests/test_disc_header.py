@@ -0,0 +1,115 @@
+'''
+Tests for the disc header probe, using small synthetic ISO9660 images
+'''
+
+from struct import pack_into
+
+import pytest
+
+from disc_header import ISO_SECTOR_SIZE, RAW_SECTOR_SIZE, parse_boot_file_name, probe_disc_header
+
+REGION_CODES = ('SLUS', 'SCUS', 'SLES')
+ROOT_LBA = 22
+SYSTEM_CNF_LBA = 23
+
+
+# ************************************************************************************
+def _sector(user_data: bytes, block_size: int, mode: int) -> bytes:
+    """Wrap 2048 bytes of user data in a raw sector with a sync pattern and header (and a mode 2 sub-header)"""
+    user_data = user_data.ljust(ISO_SECTOR_SIZE, b'\0')
+    if block_size == ISO_SECTOR_SIZE:
+        return user_data
+
+    header = b'\x00' + b'\xff' * 10 + b'\x00' + b'\x00\x02\x00' + bytes([mode])
+    if mode == 2:
+        header += bytes(8)
+    return (header + user_data).ljust(block_size, b'\0')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _directory_record(name: bytes, lba: int, size: int) -> bytes:
+    record_length = 33 + len(name) + (33 + len(name)) % 2
+    record = bytearray(record_length)
+    record[0] = record_length
+    pack_into('<I', record, 2, lba)
+    pack_into('<I', record, 10, size)
+    record[32] = len(name)
+    record[33:33 + len(name)] = name
+    return bytes(record)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def make_disc_image(path, boot_path: str = 'SLUS_007.43', other_ids=(), block_size: int = RAW_SECTOR_SIZE, mode: int = 2,
+                    sectors: int = 40):
+    """Write a minimal image with a primary volume descriptor, a root directory and SYSTEM.CNF"""
+    image = [_sector(b'', block_size, mode) for _ in range(sectors)]
+
+    volume_descriptor = bytearray(ISO_SECTOR_SIZE)
+    volume_descriptor[0] = 1
+    volume_descriptor[1:6] = b'CD001'
+    volume_descriptor[156:156 + 34] = _directory_record(b'\0', ROOT_LBA, ISO_SECTOR_SIZE)
+    image[16] = _sector(bytes(volume_descriptor), block_size, mode)
+
+    system_cnf = f'BOOT = cdrom:\\{boot_path};1\r\nTCB = 4\r\n'.encode()
+    root_directory = (_directory_record(b'\0', ROOT_LBA, ISO_SECTOR_SIZE) + _directory_record(b'\1', ROOT_LBA, ISO_SECTOR_SIZE)
+                      + _directory_record(b'SYSTEM.CNF;1', SYSTEM_CNF_LBA, len(system_cnf)))
+    image[ROOT_LBA] = _sector(root_directory, block_size, mode)
+    image[SYSTEM_CNF_LBA] = _sector(system_cnf, block_size, mode)
+    image[30] = _sector(b'disc ids ' + b' '.join(disc_id.encode() for disc_id in other_ids), block_size, mode)
+
+    with open(path, 'wb') as image_file:
+        image_file.write(b''.join(image))
+# ************************************************************************************
+
+
+# ************************************************************************************
+@pytest.mark.parametrize('block_size, mode', [(RAW_SECTOR_SIZE, 2), (RAW_SECTOR_SIZE, 1), (ISO_SECTOR_SIZE, 1)])
+def test_probe_reads_boot_file_from_system_cnf(tmp_path, block_size, mode):
+    bin_path = tmp_path / 'Game.bin'
+    make_disc_image(bin_path, block_size=block_size, mode=mode)
+
+    header = probe_disc_header(str(bin_path), REGION_CODES, block_size)
+    assert header.boot_file_name == 'SLUS_007.43'
+    assert header.disc_ids == ('SLUS_00743',)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_probe_finds_the_other_discs_of_a_collection(tmp_path):
+    bin_path = tmp_path / 'Game.bin'
+    make_disc_image(bin_path, other_ids=('SLUS_007.44', 'SLUS_007.45', 'SLUS_007.43', 'SLUS_007.46'))
+
+    # The search stops at the first repeated ID
+    assert probe_disc_header(str(bin_path), REGION_CODES).disc_ids == ('SLUS_00743', 'SLUS_00744', 'SLUS_00745')
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_probe_reads_outside_of_a_short_window(tmp_path):
+    """SYSTEM.CNF beyond the header window is read from the file rather than being missed"""
+    bin_path = tmp_path / 'Game.bin'
+    make_disc_image(bin_path, boot_path='SCUS_944.55')
+
+    assert probe_disc_header(str(bin_path), REGION_CODES, probe_sectors=17).boot_file_name == 'SCUS_944.55'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_probe_without_a_file_system(tmp_path):
+    bin_path = tmp_path / 'Audio.bin'
+    bin_path.write_bytes(bytes(RAW_SECTOR_SIZE * 20))
+
+    header = probe_disc_header(str(bin_path), REGION_CODES)
+    assert header.boot_file_name is None and header.disc_ids == ()
+    assert probe_disc_header(str(tmp_path / 'Missing.bin'), REGION_CODES).boot_file_name is None
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_parse_boot_file_name():
+    assert parse_boot_file_name(b'BOOT = cdrom:\\SLUS_007.43;1\r\n') == 'SLUS_007.43'
+    assert parse_boot_file_name(b'TCB=4\nboot=cdrom:/game/sles_123.45;1\n') == 'SLES_123.45'
+    assert parse_boot_file_name(b'VMODE = NTSC\r\n') is None
+# ************************************************************************************
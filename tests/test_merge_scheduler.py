@@ -0,0 +1,105 @@
+'''
+Tests for the device aware merge scheduler
+'''
+
+from threading import Lock
+from time import sleep
+
+import merge_scheduler
+from merge_scheduler import MergeScheduler, device_ids
+
+
+# ************************************************************************************
+class _ConcurrencyCounter:
+    """Counts the jobs running on each device at the same time, and the highest count seen"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.running = {}
+        self.peak = {}
+
+    def job(self, devices, result=None, error=None):
+        def action():
+            with self._lock:
+                for device in devices:
+                    self.running[device] = self.running.get(device, 0) + 1
+                    self.peak[device] = max(self.peak.get(device, 0), self.running[device])
+            sleep(0.05)
+            with self._lock:
+                for device in devices:
+                    self.running[device] -= 1
+            if error is not None:
+                raise error
+            return result
+        return action
+# ************************************************************************************
+
+
+# ************************************************************************************
+def _scheduler(monkeypatch, jobs_per_device=1, device_limits=None):
+    """A scheduler where each path is the ID of a device, so the tests do not need several disks"""
+    monkeypatch.setattr(merge_scheduler, 'device_ids', lambda paths: tuple(dict.fromkeys(paths)))
+    return MergeScheduler(jobs_per_device, device_limits)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_one_merge_per_device(monkeypatch):
+    counter = _ConcurrencyCounter()
+    scheduler = _scheduler(monkeypatch)
+    for key in range(4):
+        scheduler.add(key, 100, ['sd'], counter.job(['sd'], key))
+    for key in range(4, 8):
+        scheduler.add(key, 100, ['usb'], counter.job(['usb'], key))
+
+    assert scheduler.run() == {key: key for key in range(8)}
+    assert counter.peak == {'sd': 1, 'usb': 1}
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_per_device_limits(monkeypatch):
+    counter = _ConcurrencyCounter()
+    scheduler = _scheduler(monkeypatch, jobs_per_device=3, device_limits={'sd': 1})
+    for key in range(6):
+        device = 'sd' if key % 2 else 'ssd'
+        scheduler.add(key, 100, [device], counter.job([device]))
+
+    scheduler.run()
+    assert counter.peak == {'sd': 1, 'ssd': 3}
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_job_waits_for_every_device(monkeypatch):
+    """A merge from one device to another holds a slot on both devices"""
+    counter = _ConcurrencyCounter()
+    scheduler = _scheduler(monkeypatch)
+    scheduler.add('copy', 100, ['sd', 'usb'], counter.job(['sd', 'usb']))
+    scheduler.add('sd', 100, ['sd'], counter.job(['sd']))
+    scheduler.add('usb', 100, ['usb'], counter.job(['usb']))
+
+    scheduler.run()
+    assert counter.peak == {'sd': 1, 'usb': 1}
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_largest_merge_starts_first_and_errors_are_results(monkeypatch):
+    counter = _ConcurrencyCounter()
+    scheduler = _scheduler(monkeypatch)
+    error = OSError('Disk full')
+    scheduler.add('small', 1, ['sd'], counter.job(['sd'], 'small'))
+    scheduler.add('large', 1000, ['sd'], counter.job(['sd'], error=error))
+
+    done = []
+    results = scheduler.run(on_done=lambda key, result: done.append(key))
+    assert done == ['large', 'small']
+    assert results == {'large': error, 'small': 'small'}
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_device_ids(tmp_path):
+    assert device_ids([str(tmp_path), str(tmp_path / 'missing'), str(tmp_path)]) == (tmp_path.stat().st_dev,)
+# ************************************************************************************
@@ -0,0 +1,57 @@
+'''
+Tests for the trigram index used to identify games by name
+'''
+
+import db
+from db import find_games_by_name, name_trigrams, normalize_game_name
+
+
+# ************************************************************************************
+def test_normalize_game_name():
+    assert normalize_game_name('Final Fantasy IX (Europe) (Disc 1)') == 'final fantasy ix'
+    assert normalize_game_name('Final_Fantasy-IX [v1.1]') == 'final fantasy ix'
+    assert normalize_game_name('Final Fantasy IX (Europe)', keep_tags=True) == 'final fantasy ix europe'
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_short_words_have_trigrams():
+    assert name_trigrams('ix') == {'  i', ' ix', 'ix '}
+    assert name_trigrams('') == set()
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_close_short_name_ranks_first(game_database):
+    """A long name sharing most of the trigrams of the query does not crowd out the closer short name"""
+    matches = find_games_by_name('Final Fantasy IX')
+
+    game_ids = [match.game_id for match in matches]
+    assert set(game_ids[:2]) == {'SLES-02965', 'SLUS-01251'}
+    assert game_ids.index('SCES-02105') == 2
+    assert [match.score for match in matches] == sorted((match.score for match in matches), reverse=True)
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_region_tag_breaks_ties(game_database):
+    matches = find_games_by_name('Final Fantasy IX (Europe)', 2)
+
+    assert [match.game_id for match in matches] == ['SLES-02965', 'SLUS-01251']
+    assert matches[0].score == matches[1].score == 1.0
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_no_match(game_database):
+    assert find_games_by_name('Qwxz') == []
+    assert find_games_by_name('(Europe)') == []
+# ************************************************************************************
+
+
+# ************************************************************************************
+def test_search_needs_name_index(game_database, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_SCHEMA_VERSION', 3)
+
+    assert find_games_by_name('Final Fantasy IX') == []
+# ************************************************************************************